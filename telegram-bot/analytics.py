@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+Analítica offline del historial de PawPlay Bot
+Lee los registros de eventos de cada comedero (game_events.archive y
+game_events.log) en bloques de --chunk registros, así que la memoria no
+depende del tamaño del historial. El cálculo es vectorizado con
+NumPy: los bucles de Python solo recorren grupos (comedero, jugador,
+dificultad) y los eventos poco frecuentes (inicios, paradas, cambios de
+dificultad), nunca los toques.
+
+Para cada grupo:
+  - aciertos, fallos y precisión de los toques
+  - partidas terminadas, percentiles de la precisión por partida y mejor partida
+  - intervalo entre toques seguidos de una misma partida (lo más parecido a
+    un tiempo de reacción que guarda el registro): p50/p90/p99
+  - racha más larga de aciertos seguidos
+  - toques por hora del día (hora local; --utc para UTC)
+
+    python analytics.py                                # por jugador y dificultad
+    python analytics.py --group-by difficulty --json informe.json --csv informes/
+    python analytics.py --since 2025-01-01 --feeder cocina --group-by feeder,player
+
+Los percentiles salen de histogramas de tamaño fijo: intervalos en cubos
+logarítmicos de ~2.5 % entre 1 ms y 1 h, precisión por partida en cubos de 1 %.
+"""
+
+import argparse
+import csv
+import json
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from event_log import (EVENT_CATCH, EVENT_DIFFICULTY, EVENT_MISS, EVENT_NAMES,
+                       EVENT_START, EVENT_STOP, PAYLOAD_SIZE, RECORD_SIZE, TAP_AGGREGATED)
+from sessions import DEFAULT_FEEDER, default_game_data, is_valid_feeder_id
+
+# Misma disposición que event_log.RECORD ('<QdBB26sI', sin relleno)
+RECORD_DTYPE = np.dtype([('seq', '<u8'), ('ts', '<f8'), ('kind', 'u1'), ('length', 'u1'),
+                         ('payload', 'S%d' % PAYLOAD_SIZE), ('crc', '<u4')])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+CHUNK_RECORDS = 1 << 20  # ~48 MB de registro por bloque
+INTERVAL_EDGES = np.geomspace(0.001, 3600.0, 600)  # segundos
+GAME_ACCURACY_BUCKETS = 101  # 0..100 %
+GROUP_FIELDS = ('feeder', 'player', 'difficulty')
+DEFAULT_GROUP_BY = ('player', 'difficulty')
+NO_PLAYER = ''
+_KEY_BITS = 16  # clave de grupo: jugador << 16 | dificultad
+_LAST_EVENT = max(EVENT_NAMES)
+
+
+def accuracy(catches, misses):
+    """calculate_accuracy vectorizado: porcentaje con un decimal (0 si no hay toques)"""
+    catches = np.asarray(catches, dtype=np.float64)
+    total = catches + np.asarray(misses, dtype=np.float64)
+    return np.round(np.divide(catches * 100.0, total, out=np.zeros_like(total), where=total > 0), 1)
+
+
+def histogram_percentile(counts, q, edges=None):
+    """
+    Percentil q (0-1) a partir de un histograma. Con edges (cubos
+    [edges[i-1], edges[i]) y los extremos abiertos) devuelve el centro
+    geométrico del cubo; sin edges, el índice del cubo. None si está vacío.
+    """
+    total = counts.sum()
+    if not total:
+        return None
+    bucket = int(np.searchsorted(np.cumsum(counts), q * total))
+    if edges is None:
+        return bucket
+    if bucket == 0:
+        return float(edges[0])
+    if bucket >= len(edges):
+        return float(edges[-1])
+    return float(np.sqrt(edges[bucket - 1] * edges[bucket]))
+
+
+class _Codes:
+    """Nombres (jugadores, dificultades) numerados para usarlos en arrays"""
+
+    def __init__(self, *names):
+        self.names = []
+        self._codes = {}
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class _FeederState:
+    """Lo que un bloque hereda del anterior en el mismo comedero"""
+
+    def __init__(self, difficulty, player):
+        self.difficulty = difficulty
+        self.player = player
+        self.game = 0
+        self.last_tap_ts = -np.inf
+        self.last_tap_game = -1
+        self.run_length = 0  # racha de aciertos abierta al final del bloque anterior
+        self.run_game = -1
+        self.run_key = -1
+
+
+class GroupStats:
+    """Acumuladores de un grupo; todos se pueden sumar (o tomar el máximo) al agrupar"""
+
+    __slots__ = ('taps', 'catches', 'hourly', 'intervals', 'longest_streak', 'games',
+                 'game_accuracy', 'best_game')
+
+    def __init__(self):
+        self.taps = 0
+        self.catches = 0
+        self.hourly = np.zeros(24, dtype=np.int64)
+        self.intervals = np.zeros(len(INTERVAL_EDGES) + 1, dtype=np.int64)
+        self.longest_streak = 0
+        self.games = 0
+        self.game_accuracy = np.zeros(GAME_ACCURACY_BUCKETS, dtype=np.int64)
+        self.best_game = 0
+
+    def merge(self, other):
+        self.taps += other.taps
+        self.catches += other.catches
+        self.hourly += other.hourly
+        self.intervals += other.intervals
+        self.longest_streak = max(self.longest_streak, other.longest_streak)
+        self.games += other.games
+        self.game_accuracy += other.game_accuracy
+        self.best_game = max(self.best_game, other.best_game)
+
+    def summary(self):
+        """Métricas del grupo para los informes"""
+        misses = self.taps - self.catches
+        intervals = {f"interval_ms_p{int(q * 100)}": histogram_percentile(self.intervals, q, INTERVAL_EDGES)
+                     for q in (0.5, 0.9, 0.99)}
+        return {
+            "taps": self.taps,
+            "catches": self.catches,
+            "misses": misses,
+            "accuracy": float(accuracy(self.catches, misses)),
+            "games": self.games,
+            "game_accuracy_p50": histogram_percentile(self.game_accuracy, 0.5),
+            "game_accuracy_p90": histogram_percentile(self.game_accuracy, 0.9),
+            "best_game": self.best_game,
+            **{name: round(value * 1000, 1) if value is not None else None
+               for name, value in intervals.items()},
+            "longest_streak": self.longest_streak,
+            "peak_hour": int(self.hourly.argmax()) if self.taps else None,
+            "hourly": self.hourly.tolist(),
+        }
+
+
+class HistoryAnalyzer:
+    """Recorre los registros de eventos por bloques y acumula GroupStats por (comedero, jugador, dificultad)"""
+
+    def __init__(self, since=None, until=None, utc=False, chunk_records=CHUNK_RECORDS, verify_crc=False):
+        """since/until: timestamps (None = sin límite)"""
+        self.since = since
+        self.until = until
+        self.utc = utc
+        self.chunk_records = chunk_records
+        self.verify_crc = verify_crc
+        self.groups = {}
+        self.records = 0
+        self.taps = 0
+        self.players = _Codes(NO_PLAYER)
+        self.difficulties = _Codes(default_game_data()['difficulty'])
+        self._utc_offsets = {}  # día -> segundos de diferencia con UTC
+
+    # =================== LECTURA ===================
+    def add_feeder(self, feeder, paths):
+        """Analizar los archivos de un comedero en orden (histórico y después el registro activo)"""
+        state = _FeederState(difficulty=0, player=0)
+        for path in paths:
+            self.add_file(feeder, path, state)
+
+    def add_file(self, feeder, path, state):
+        path = Path(path)
+        if not path.exists():
+            return
+        count = path.stat().st_size // RECORD_SIZE
+        if not count:
+            return
+        with open(path, 'rb') as f:
+            for start in range(0, count, self.chunk_records):
+                chunk = np.fromfile(f, dtype=RECORD_DTYPE, count=min(self.chunk_records, count - start))
+                valid = self._valid_prefix(chunk)
+                self._process(feeder, chunk[:valid], state)
+                self.records += valid
+                if valid < len(chunk):
+                    print(f"⚠️ {path}: registro {start + valid} no válido, se ignora el resto del archivo")
+                    break
+
+    def _valid_prefix(self, chunk):
+        """Registros válidos al principio del bloque (tipo y longitud coherentes; CRC con --verify-crc)"""
+        kind = chunk['kind']
+        bad = (kind < EVENT_CATCH) | (kind > _LAST_EVENT) | (chunk['length'] > PAYLOAD_SIZE)
+        if self.verify_crc:
+            raw = chunk.view(np.uint8).reshape(-1, RECORD_SIZE)
+            crc = np.fromiter((zlib.crc32(row[:RECORD_SIZE - 4]) for row in raw), dtype=np.uint32, count=len(chunk))
+            bad |= crc != chunk['crc']
+        first_bad = np.flatnonzero(bad)
+        return int(first_bad[0]) if len(first_bad) else len(chunk)
+
+    # =================== CÁLCULO ===================
+    def _process(self, feeder, chunk, state):
+        n = len(chunk)
+        if not n:
+            return
+        kind = np.asarray(chunk['kind'])
+        ts = np.asarray(chunk['ts'])
+
+        # Dificultad y jugador vigentes en cada registro, heredando los del bloque anterior
+        difficulty = self._forward_fill(chunk, kind == EVENT_DIFFICULTY, state.difficulty, self.difficulties)
+        player = self._forward_fill(chunk, kind == EVENT_START, state.player, self.players)
+        state.difficulty, state.player = int(difficulty[-1]), int(player[-1])
+        game = state.game + np.cumsum(kind == EVENT_START)
+        state.game = int(game[-1])
+
+        in_range = np.ones(n, dtype=bool)
+        if self.since is not None:
+            in_range &= ts >= self.since
+        if self.until is not None:
+            in_range &= ts < self.until
+
+        taps = np.flatnonzero(((kind == EVENT_CATCH) | (kind == EVENT_MISS)) & in_range)
+        if len(taps):
+            aggregated = ((chunk['length'][taps] == len(TAP_AGGREGATED))
+                          & (chunk['payload'][taps] == TAP_AGGREGATED))
+            self._process_taps(feeder, ts[taps], kind[taps] == EVENT_CATCH, aggregated, game[taps],
+                               (player[taps].astype(np.int64) << _KEY_BITS) | difficulty[taps], state)
+        stops = np.flatnonzero((kind == EVENT_STOP) & in_range)
+        if len(stops):
+            self._process_games(feeder, chunk, stops, player[stops])
+
+    def _forward_fill(self, chunk, mask, carry, codes):
+        """Código del último evento `mask` anterior a cada registro (o `carry` si no hay)"""
+        positions = np.flatnonzero(mask)
+        if not len(positions):
+            return np.full(len(chunk), carry, dtype=np.int64)
+        values = np.array([codes.code(text) for text in _payload_texts(chunk, positions)], dtype=np.int64)
+        marker = np.full(len(chunk), -1, dtype=np.int64)
+        marker[positions] = np.arange(len(positions))
+        last = np.maximum.accumulate(marker)
+        return np.where(last >= 0, values[np.maximum(last, 0)], carry)
+
+    def _process_taps(self, feeder, ts, catch, aggregated, game, key, state):
+        m = len(ts)
+        self.taps += m
+        keys, group = np.unique(key, return_inverse=True)
+        size = len(keys)
+        taps = np.bincount(group, minlength=size)
+        catches = np.bincount(group, weights=catch, minlength=size).astype(np.int64)
+        hourly = np.bincount(group * 24 + self._local_hours(ts), minlength=size * 24).reshape(size, 24)
+
+        # Intervalo con el toque anterior de la misma partida (también el último del bloque previo)
+        previous_ts = np.concatenate(([state.last_tap_ts], ts[:-1]))
+        previous_game = np.concatenate(([state.last_tap_game], game[:-1]))
+        delta = ts - previous_ts
+        ok = (game == previous_game) & (delta > 0)  # los toques de un mismo lote pueden compartir hora
+        buckets = len(INTERVAL_EDGES) + 1
+        intervals = np.bincount(group[ok] * buckets + np.searchsorted(INTERVAL_EDGES, delta[ok]),
+                                minlength=size * buckets).reshape(size, buckets)
+        state.last_tap_ts, state.last_tap_game = float(ts[-1]), int(game[-1])
+
+        # Rachas: tramos de toques iguales dentro de la misma partida y grupo. Los
+        # aciertos agregados (modo multiproceso) no tienen orden: ni alargan ni cortan
+        # una racha, igual que en sessions.apply_game_event
+        longest = np.zeros(size, dtype=np.int64)
+        ordered = np.flatnonzero(~(aggregated & catch))
+        if len(ordered):
+            self._longest_runs(catch[ordered], game[ordered], key[ordered], group[ordered], longest, state)
+
+        for index, group_key in enumerate(keys.tolist()):
+            stats = self._group(feeder, group_key >> _KEY_BITS, group_key & ((1 << _KEY_BITS) - 1))
+            stats.taps += int(taps[index])
+            stats.catches += int(catches[index])
+            stats.hourly += hourly[index]
+            stats.intervals += intervals[index]
+            stats.longest_streak = max(stats.longest_streak, int(longest[index]))
+
+    @staticmethod
+    def _longest_runs(catch, game, key, group, longest, state):
+        """Racha de aciertos más larga de cada grupo, continuando la abierta del bloque anterior"""
+        m = len(catch)
+        change = np.ones(m, dtype=bool)
+        change[1:] = (catch[1:] != catch[:-1]) | (game[1:] != game[:-1]) | (key[1:] != key[:-1])
+        starts = np.flatnonzero(change)
+        lengths = np.diff(np.append(starts, m))
+        if state.run_length and catch[0] and game[0] == state.run_game and key[0] == state.run_key:
+            lengths[0] += state.run_length
+        catch_runs = catch[starts]
+        np.maximum.at(longest, group[starts[catch_runs]], lengths[catch_runs])
+        if catch[-1]:
+            state.run_length, state.run_game, state.run_key = int(lengths[-1]), int(game[-1]), int(key[-1])
+        else:
+            state.run_length = 0
+
+    def _process_games(self, feeder, chunk, stops, players):
+        """Partidas terminadas: el payload de parada lleva aciertos, fallos y dificultad"""
+        payload = np.frombuffer(np.ascontiguousarray(chunk['payload'][stops]).tobytes(),
+                                dtype=np.uint8).reshape(-1, PAYLOAD_SIZE)
+        counts = np.ascontiguousarray(payload[:, :8]).view('<u4').astype(np.int64)
+        catches, misses = counts[:, 0], counts[:, 1]
+        lengths = chunk['length'][stops]
+        difficulty = np.array([self.difficulties.code(bytes(row[8:length]).decode('utf-8', 'ignore'))
+                               for row, length in zip(payload, lengths)], dtype=np.int64)
+        key = (players.astype(np.int64) << _KEY_BITS) | difficulty
+        keys, group = np.unique(key, return_inverse=True)
+        size = len(keys)
+        games = np.bincount(group, minlength=size)
+        best = np.zeros(size, dtype=np.int64)
+        np.maximum.at(best, group, catches)
+        played = (catches + misses) > 0
+        percent = (catches[played] * 100 // (catches + misses)[played])
+        game_accuracy = np.bincount(group[played] * GAME_ACCURACY_BUCKETS + percent,
+                                    minlength=size * GAME_ACCURACY_BUCKETS).reshape(size, GAME_ACCURACY_BUCKETS)
+        for index, group_key in enumerate(keys.tolist()):
+            stats = self._group(feeder, group_key >> _KEY_BITS, group_key & ((1 << _KEY_BITS) - 1))
+            stats.games += int(games[index])
+            stats.best_game = max(stats.best_game, int(best[index]))
+            stats.game_accuracy += game_accuracy[index]
+
+    def _group(self, feeder, player, difficulty):
+        key = (feeder, self.players.names[player] or None, self.difficulties.names[difficulty])
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = GroupStats()
+        return stats
+
+    def _local_hours(self, ts):
+        """Hora del día de cada timestamp; el desfase horario se calcula una vez por día (cambios de hora)"""
+        seconds = ts
+        if not self.utc:
+            days = (ts // 86400).astype(np.int64)
+            first = int(days.min())
+            offsets = np.array([self._utc_offset(day) for day in range(first, int(days.max()) + 1)],
+                               dtype=np.float64)
+            seconds = ts + offsets[days - first]
+        return (seconds // 3600 % 24).astype(np.int64)
+
+    def _utc_offset(self, day):
+        offset = self._utc_offsets.get(day)
+        if offset is None:
+            offset = self._utc_offsets[day] = time.localtime(day * 86400 + 43200).tm_gmtoff
+        return offset
+
+    # =================== INFORMES ===================
+    def report(self, group_by=DEFAULT_GROUP_BY):
+        """Filas del informe agrupadas por los campos de group_by (subconjunto de GROUP_FIELDS)"""
+        merged = {}
+        for key, stats in self.groups.items():
+            values = dict(zip(GROUP_FIELDS, key))
+            group = tuple(values[field] for field in group_by)
+            if group not in merged:
+                merged[group] = GroupStats()
+            merged[group].merge(stats)
+        rows = []
+        for group in sorted(merged, key=lambda g: tuple('' if v is None else str(v) for v in g)):
+            rows.append({**dict(zip(group_by, group)), **merged[group].summary()})
+        return rows
+
+
+def _payload_texts(chunk, positions):
+    """Payloads de texto (jugador, dificultad) de unas pocas posiciones"""
+    payloads = chunk['payload'][positions]
+    lengths = chunk['length'][positions]
+    return [bytes(payload)[:length].decode('utf-8', 'ignore') for payload, length in zip(payloads, lengths)]
+
+
+def feeder_logs(data_dir='.', sessions_dir='sessions', archive='game_events.archive', log='game_events.log'):
+    """{comedero: [histórico, registro]} con la misma disposición de archivos que el bot"""
+    data_dir = Path(data_dir)
+    feeders = {DEFAULT_FEEDER: [data_dir / archive, data_dir / log]}
+    directory = data_dir / sessions_dir
+    if directory.is_dir():
+        for entry in sorted(directory.iterdir()):
+            if entry.is_dir() and is_valid_feeder_id(entry.name):
+                feeders[entry.name] = [entry / archive, entry / log]
+    return feeders
+
+
+def write_csv(rows, directory):
+    """groups.csv (una fila por grupo) y hourly.csv (grupo, hora, toques)"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if not rows:
+        return
+    fields = [name for name in rows[0] if name != 'hourly']
+    group_fields = [name for name in fields if name in GROUP_FIELDS]
+    with open(directory / 'groups.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(directory / 'hourly.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(group_fields + ['hour', 'taps'])
+        for row in rows:
+            for hour, taps in enumerate(row['hourly']):
+                writer.writerow([row[name] for name in group_fields] + [hour, taps])
+
+
+def print_report(rows, group_by):
+    """Resumen legible en la terminal"""
+    for row in rows:
+        label = " / ".join(f"{row[field] if row[field] is not None else '-'}" for field in group_by) or "total"
+        print(f"📊 {label}: {row['taps']} toques, precisión {row['accuracy']}%, "
+              f"{row['games']} partidas (mediana {row['game_accuracy_p50']}%, mejor {row['best_game']}), "
+              f"intervalo p50 {row['interval_ms_p50']} ms / p90 {row['interval_ms_p90']} ms, "
+              f"racha {row['longest_streak']}, hora punta {row['peak_hour']}")
+
+
+def parse_moment(value):
+    """Fecha ISO (2025-01-31 o 2025-01-31T18:00) a timestamp"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha no válida: {value!r} (usa AAAA-MM-DD)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analítica offline del historial de PawPlay")
+    parser.add_argument('--data-dir', default='.', help="directorio de datos del bot")
+    parser.add_argument('--sessions-dir', default='sessions')
+    parser.add_argument('--feeder', action='append', help="solo estos comederos (se puede repetir)")
+    parser.add_argument('--since', type=parse_moment, help="desde esta fecha (incluida)")
+    parser.add_argument('--until', type=parse_moment, help="hasta esta fecha (excluida)")
+    parser.add_argument('--group-by', default=','.join(DEFAULT_GROUP_BY),
+                        help=f"campos separados por comas entre {', '.join(GROUP_FIELDS)} (vacío = total)")
+    parser.add_argument('--utc', action='store_true', help="horas en UTC en lugar de la hora local")
+    parser.add_argument('--chunk', type=int, default=CHUNK_RECORDS, help="registros por bloque")
+    parser.add_argument('--verify-crc', action='store_true', help="comprobar el CRC de cada registro (lento)")
+    parser.add_argument('--json', help="guardar el informe en JSON")
+    parser.add_argument('--csv', help="directorio para groups.csv y hourly.csv")
+    args = parser.parse_args()
+
+    group_by = tuple(field for field in args.group_by.replace(' ', '').split(',') if field)
+    unknown = set(group_by) - set(GROUP_FIELDS)
+    if unknown:
+        parser.error(f"campos de agrupación desconocidos: {', '.join(sorted(unknown))}")
+
+    feeders = feeder_logs(args.data_dir, args.sessions_dir)
+    if args.feeder:
+        feeders = {feeder: paths for feeder, paths in feeders.items() if feeder in args.feeder}
+    analyzer = HistoryAnalyzer(args.since, args.until, args.utc, max(1, args.chunk), args.verify_crc)
+    start = time.perf_counter()
+    for feeder, paths in feeders.items():
+        analyzer.add_feeder(feeder, paths)
+    rows = analyzer.report(group_by)
+    elapsed = time.perf_counter() - start
+
+    print(f"🔎 {analyzer.records} registros ({analyzer.taps} toques) de {len(feeders)} comederos "
+          f"en {elapsed:.2f} s")
+    print_report(rows, group_by)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                "generated": datetime.now().isoformat(timespec='seconds'),
+                "records": analyzer.records,
+                "taps": analyzer.taps,
+                "seconds": round(elapsed, 3),
+                "group_by": list(group_by),
+                "groups": rows,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 Informe en {args.json}")
+    if args.csv:
+        write_csv(rows, args.csv)
+        print(f"💾 CSV en {args.csv}/")
+
+
+if __name__ == "__main__":
+    main()
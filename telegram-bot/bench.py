@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de PawPlay Bot sin red
+Arranca PawPlayBot en un directorio temporal con un telepot.Bot simulado y mide:
+
+  http      N clientes simulados de la app (keep-alive) que mezclan sondeos de
+            /game-data con aciertos y fallos: throughput, p50/p95/p99 y
+            escrituras a disco.
+  commands  actualizaciones de Telegram sintéticas por handle_message:
+            comandos por segundo y latencia por comando.
+  startup   arranque en frío del modo headless en un proceso nuevo (import,
+            PawPlayBot() y primera respuesta HTTP), tras un cierre limpio y
+            tras una caída con eventos pendientes de reproducir.
+  analytics analytics.py sobre un historial sintético de --records registros:
+            registros por segundo y memoria máxima del proceso.
+
+    python bench.py all --clients 20 --duration 10 --out bench.json
+    python bench.py http --baseline bench.json   # comparar con una versión anterior
+    python bench.py http --wire binary           # sondeos en application/x-pawplay
+    python bench.py http --processes 4 --client-processes 4   # modo multiproceso
+    python bench.py startup --feeders 50 --events 5000
+    python bench.py analytics --records 20000000
+
+Clientes y servidor comparten proceso (y GIL) salvo con --client-processes:
+los números sirven para comparar versiones entre sí en la misma máquina, no
+como capacidad absoluta.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_TOKEN = '123456:bench'
+WIRE_HEADERS = {'json': {}, 'gzip': {'Accept-Encoding': 'gzip'},
+                'binary': {'Accept': 'application/x-pawplay'}}
+COMMAND_MIX = ['/estado', '/puntuacion', '/iniciar', '/facil', '/actividad', '/estadisticas',
+               '/parar', '/medio', '/comederos', '/ayuda']
+REGRESSION_THRESHOLD = 0.10  # 10 % peor que la referencia
+
+# Se ejecutan en un proceso nuevo (con el directorio de datos como cwd)
+PREPARE_STATE = """
+import os, sys
+sys.path.insert(0, sys.argv[1])
+import pawplay_bot
+from event_log import EVENT_CATCH, EVENT_MISS, EVENT_START, encode_text
+bot = pawplay_bot.PawPlayBot()
+feeders, events, crash = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4] == 'crash'
+for i in range(feeders):
+    session = bot.get_session('default' if i == 0 else f'bench{i}')
+    with session.lock:
+        session.record_event(EVENT_START, encode_text('Bench'))
+        for n in range(events):
+            session.record_event(EVENT_MISS if n % 3 == 0 else EVENT_CATCH)
+if crash:
+    os._exit(0)  # sin instantáneas: el próximo arranque reproduce los registros
+bot.shutdown()
+"""
+STARTUP_PROBE = """
+import http.client, json, os, sys, threading, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import pawplay_bot
+imported = time.perf_counter()
+bot = pawplay_bot.PawPlayBot()
+created = time.perf_counter()
+bot.httpd = pawplay_bot.create_http_server(bot, '127.0.0.1', 0)
+threading.Thread(target=bot.httpd.serve_forever, daemon=True).start()
+conn = http.client.HTTPConnection('127.0.0.1', bot.httpd.server_address[1], timeout=10)
+conn.request('GET', '/game-data')
+status = conn.getresponse().status
+ready = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'init_ms': (created - imported) * 1000,
+                  'ready_ms': (ready - start) * 1000, 'status': status}), flush=True)
+os._exit(0)  # sin shutdown: cada repetición arranca desde el mismo estado
+"""
+
+
+class StubTelepotBot:
+    """telepot.Bot sin red: cuenta los mensajes y simula la latencia de Telegram"""
+
+    latency = 0.0
+
+    def __init__(self, token):
+        self.token = token
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def sendMessage(self, chat_id, text, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent += 1
+        return {"message_id": self.sent, "chat": {"id": chat_id}, "text": text}
+
+    def getMe(self):
+        return {"id": 1, "is_bot": True, "username": "pawplay_bench_bot"}
+
+    def message_loop(self, handler):
+        pass
+
+
+def percentiles(samples):
+    """p50/p95/p99/máx en milisegundos (rango más cercano)"""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(len(ordered) * p + 0.5) - 1))] * 1000, 3)
+
+    return {"p50_ms": rank(0.50), "p95_ms": rank(0.95), "p99_ms": rank(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+def start_bot(args):
+    """Importar el bot con una configuración de benchmark e instanciarlo"""
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': BENCH_TOKEN,
+        'TELEGRAM_TRANSPORT': 'telepot',
+        'HTTP_SERVER_MODE': args.mode,
+        'HTTP_WORKERS': str(args.workers),
+        'HTTP_PROCESSES': str(args.processes),
+        'TELEGRAM_CHAT_INTERVAL': '0',
+        'TELEGRAM_GROUP_INTERVAL': '0',
+        'TELEGRAM_GLOBAL_RATE': '0',
+    })
+    if not args.rate_limit:
+        # Los clientes simulados tocan tan rápido como pueden: medir el servidor, no el límite
+        os.environ.update({'TAP_RATE_LIMIT': '0', 'TAP_MIN_INTERVAL_MS': '0'})
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(tempfile.mkdtemp(prefix="pawplay-bench-"))  # no tocar los datos reales
+
+    import pawplay_bot
+    import telepot
+    StubTelepotBot.latency = args.telegram_latency
+    telepot.Bot = StubTelepotBot  # pawplay_bot importa telepot al crear el bot
+    return pawplay_bot, pawplay_bot.PawPlayBot()
+
+
+def message(chat_id, text):
+    return {'message_id': 1, 'date': int(time.time()), 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f'Bench{chat_id}'}}
+
+
+# =================== HTTP ===================
+def http_client(port, deadline, poll_ratio, miss_ratio, use_etag, wire_format, seed, results):
+    """Un cliente de la app con conexión keep-alive"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    etag = None
+    latencies = {'/game-data': [], '/register-catch': [], '/register-miss': []}
+    errors = not_modified = limited = poll_bytes = 0
+    while time.perf_counter() < deadline:
+        if rng.random() < poll_ratio:
+            path = '/game-data'
+        else:
+            path = '/register-miss' if rng.random() < miss_ratio else '/register-catch'
+        headers = {'X-Device-Id': f'bench-{seed}'}
+        if path == '/game-data':
+            headers.update(WIRE_HEADERS[wire_format])
+            if use_etag and etag:
+                headers['If-None-Match'] = etag
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies[path].append(time.perf_counter() - start)
+        if response.status == 304:
+            not_modified += 1
+        elif response.status == 429:
+            limited += 1
+        elif response.status != 200:
+            errors += 1
+        elif path == '/game-data':
+            etag = response.getheader('ETag')
+            poll_bytes += len(body)
+    conn.close()
+    results.append((latencies, errors, not_modified, poll_bytes, limited))
+
+
+def client_group(port, duration, poll_ratio, miss_ratio, use_etag, wire_format, seeds):
+    """Varios clientes en hilos; con --client-processes, uno de estos grupos por proceso"""
+    results = []
+    start = time.perf_counter()
+    threads = [threading.Thread(target=http_client,
+                                args=(port, start + duration, poll_ratio, miss_ratio,
+                                      use_etag, wire_format, seed, results))
+               for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def bench_http(pawplay_bot, bot, args):
+    if args.processes > 1:
+        httpd = bot.start_http_server('127.0.0.1', 0)
+        time.sleep(1.0)  # dar tiempo a que arranquen los procesos HTTP
+    else:
+        httpd = pawplay_bot.create_http_server(bot, '127.0.0.1', 0, args.mode, args.workers,
+                                               keepalive_timeout=5.0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    bot.httpd = httpd
+
+    bot.handle_message(message(1, '/iniciar'))
+    session = bot.get_session(pawplay_bot.DEFAULT_FEEDER)
+    flushes_before = bot.flush_count()
+    seq_before = session.event_log.last_seq
+    debounced_before = bot.rejected_taps()[1]
+
+    client_args = (port, args.duration, args.poll_ratio, args.miss_ratio, args.etag, args.wire)
+    seeds = list(range(args.clients))
+    if args.client_processes > 1:
+        groups = [seeds[i::args.client_processes] for i in range(args.client_processes)]
+        with ProcessPoolExecutor(len(groups), mp_context=multiprocessing.get_context('spawn')) as pool:
+            outcomes = [future.result() for future in
+                        [pool.submit(client_group, *client_args, group) for group in groups]]
+    else:
+        outcomes = [client_group(*client_args, seeds)]
+    results = [result for group_results, _ in outcomes for result in group_results]
+    elapsed = max(group_elapsed for _, group_elapsed in outcomes)
+    time.sleep(bot.config.persist_flush_interval * 1.5)  # dejar que el flusher escriba lo pendiente
+
+    routes = {}
+    all_samples = []
+    errors = sum(r[1] for r in results)
+    for route in ('/game-data', '/register-catch', '/register-miss'):
+        samples = [s for latencies, *_ in results for s in latencies[route]]
+        all_samples.extend(samples)
+        routes[route] = {"requests": len(samples), **percentiles(samples)}
+    taps = routes['/register-catch']['requests'] + routes['/register-miss']['requests']
+    return {
+        "clients": args.clients,
+        "processes": args.processes,
+        "duration_s": round(elapsed, 3),
+        "requests": len(all_samples),
+        "throughput_rps": round(len(all_samples) / elapsed, 1),
+        "errors": errors,
+        "not_modified": sum(r[2] for r in results),
+        "rate_limited": sum(r[4] for r in results),
+        "debounced": bot.rejected_taps()[1] - debounced_before,
+        "wire": args.wire,
+        "bytes_per_poll": round(sum(r[3] for r in results)
+                                / max(1, routes['/game-data']['requests'] - sum(r[2] for r in results)), 1),
+        **percentiles(all_samples),
+        "routes": routes,
+        "taps": taps,
+        "event_log_appends": session.event_log.last_seq - seq_before,
+        "snapshot_writes": bot.flush_count() - flushes_before,
+        "taps_per_write": round(taps / max(1, bot.flush_count() - flushes_before), 1),
+    }
+
+
+# =================== COMANDOS ===================
+def bench_commands(bot, args):
+    rng = random.Random(42)
+    updates = [message(1000 + rng.randrange(args.chats), rng.choice(COMMAND_MIX))
+               for _ in range(args.updates)]
+    latencies = {}
+    lock = threading.Lock()
+
+    def handle(msg):
+        start = time.perf_counter()
+        bot.handle_message(msg)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.setdefault(msg['text'], []).append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(handle, updates))
+    elapsed = time.perf_counter() - start
+    sent_ok = bot.outbox.wait_idle(60)
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "updates": args.updates,
+        "chats": args.chats,
+        "concurrency": args.concurrency,
+        "telegram_latency_ms": args.telegram_latency * 1000,
+        "duration_s": round(elapsed, 3),
+        "throughput_cps": round(args.updates / elapsed, 1),
+        **percentiles(all_samples),
+        "commands": {command: {"calls": len(samples), **percentiles(samples)}
+                     for command, samples in sorted(latencies.items())},
+        "messages_sent": bot.bot.sent,
+        "messages_merged": bot.outbox.merged,
+        "outbox_drained": sent_ok,
+    }
+
+
+# =================== ARRANQUE ===================
+def startup_runs(source_dir, state_dir, runs):
+    """Arrancar el modo headless `runs` veces y devolver la mediana de cada fase"""
+    env = dict(os.environ, TELEGRAM_TRANSPORT='none', HTTP_PORT='0')
+    env.pop('TELEGRAM_BOT_TOKEN', None)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, source_dir], cwd=state_dir,
+                                env=env, capture_output=True, text=True, timeout=120).stdout
+        process_ms = (time.perf_counter() - start) * 1000
+        result = json.loads(output.strip().splitlines()[-1])
+        if result['status'] != 200:
+            raise RuntimeError(f"GET /game-data devolvió {result['status']}")
+        samples.append({**result, 'process_ms': process_ms})
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return round(values[len(values) // 2], 2)
+
+    return {key: median(key) for key in ('import_ms', 'init_ms', 'ready_ms', 'process_ms')}
+
+
+def bench_startup(args, source_dir):
+    results = {"feeders": args.feeders, "events_per_feeder": args.events, "runs": args.runs}
+    env = dict(os.environ, TELEGRAM_TRANSPORT='none')
+    for state in ('clean', 'crash'):
+        state_dir = tempfile.mkdtemp(prefix=f"pawplay-startup-{state}-")
+        subprocess.run([sys.executable, '-c', PREPARE_STATE, source_dir, str(args.feeders),
+                        str(args.events), state], cwd=state_dir, env=env, check=True,
+                       capture_output=True, timeout=600)
+        for key, value in startup_runs(source_dir, state_dir, args.runs).items():
+            results[f"{state}_{key}"] = value
+    return results
+
+
+# =================== ANALÍTICA ===================
+def write_history(path, records, game_length=250):
+    """Historial sintético por bloques: partidas de game_length registros (inicio, toques, fin), sin CRC"""
+    import numpy as np
+    from analytics import RECORD_DTYPE
+    from event_log import EVENT_CATCH, EVENT_MISS, EVENT_START, EVENT_STOP, encode_stop, encode_text
+
+    players = [encode_text(name) for name in ("Luna", "Michi", "Tom", "")]
+    rng = np.random.default_rng(1)
+    block = game_length * 4000
+    with open(path, 'wb') as f:
+        for start in range(0, records, block):
+            n = min(block, records - start)
+            chunk = np.zeros(n, dtype=RECORD_DTYPE)
+            index = np.arange(start, start + n)
+            position = index % game_length
+            catch = rng.random(n) < 0.65
+            chunk['seq'] = index + 1
+            chunk['ts'] = 1.7e9 + index * 0.5 + rng.random(n) * 0.4
+            chunk['kind'] = np.where(catch, EVENT_CATCH, EVENT_MISS)
+            starts = np.flatnonzero(position == 0)
+            chunk['kind'][starts] = EVENT_START
+            names = [players[(start + i) // game_length % len(players)] for i in starts.tolist()]
+            chunk['payload'][starts] = names
+            chunk['length'][starts] = [len(name) for name in names]
+            stops = np.flatnonzero(position == game_length - 1)
+            chunk['kind'][stops] = EVENT_STOP
+            stop = encode_stop(int(game_length * 0.65), game_length - 2 - int(game_length * 0.65), "medium")
+            chunk['payload'][stops] = stop
+            chunk['length'][stops] = len(stop)
+            chunk.tofile(f)
+
+
+def bench_analytics(args, source_dir):
+    data_dir = tempfile.mkdtemp(prefix="pawplay-analytics-")
+    path = os.path.join(data_dir, 'game_events.log')
+    write_history(path, args.records)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(source_dir, 'analytics.py'), '--data-dir', data_dir,
+                    '--json', os.path.join(data_dir, 'report.json')], check=True, capture_output=True)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    os.remove(path)
+    return {
+        "records": args.records,
+        "file_mb": round(args.records * 48 / 1e6, 1),
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(args.records / elapsed),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }
+
+
+# =================== RESULTADOS ===================
+def git_revision(directory):
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=directory,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline):
+    """Avisar de empeoramientos respecto a un JSON anterior"""
+    checks = [('http', 'throughput_rps', True), ('http', 'p95_ms', False), ('http', 'p99_ms', False),
+              ('commands', 'throughput_cps', True), ('commands', 'p95_ms', False),
+              ('startup', 'clean_ready_ms', False), ('startup', 'crash_ready_ms', False),
+              ('analytics', 'records_per_second', True), ('analytics', 'peak_rss_mb', False)]
+    regressions = 0
+    for section, key, higher_is_better in checks:
+        old = (baseline.get(section) or {}).get(key)
+        new = (results.get(section) or {}).get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "⚠️" if worse > REGRESSION_THRESHOLD else "✅"
+        regressions += worse > REGRESSION_THRESHOLD
+        print(f"{flag} {section}.{key}: {old} → {new} ({change * 100:+.1f}%)")
+    return regressions
+
+
+def save_results(results, args, cwd):
+    if args.out:
+        with open(os.path.join(cwd, args.out), 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {args.out}")
+    if args.baseline:
+        with open(os.path.join(cwd, args.baseline), 'r', encoding='utf-8') as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de PawPlay Bot sin red")
+    parser.add_argument('suite', choices=['http', 'commands', 'startup', 'analytics', 'all'])
+    parser.add_argument('--clients', type=int, default=20, help="clientes HTTP simultáneos")
+    parser.add_argument('--duration', type=float, default=10.0, help="segundos de carga HTTP")
+    parser.add_argument('--poll-ratio', type=float, default=0.5, help="fracción de sondeos /game-data")
+    parser.add_argument('--miss-ratio', type=float, default=0.3, help="fracción de fallos entre los toques")
+    parser.add_argument('--etag', action='store_true', help="sondeos condicionales (If-None-Match)")
+    parser.add_argument('--rate-limit', action='store_true',
+                        help="mantener el límite de toques por cliente (TAP_RATE_LIMIT)")
+    parser.add_argument('--wire', default='json', choices=sorted(WIRE_HEADERS),
+                        help="codificación pedida en los sondeos /game-data")
+    parser.add_argument('--mode', default='threaded', choices=['threaded', 'single'])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--processes', type=int, default=1, help="procesos HTTP (HTTP_PROCESSES)")
+    parser.add_argument('--client-processes', type=int, default=1,
+                        help="procesos para los clientes simulados (para que no compartan GIL con el bot)")
+    parser.add_argument('--updates', type=int, default=5000, help="comandos sintéticos")
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=1, help="hilos que llaman a handle_message")
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help="latencia simulada de sendMessage (s)")
+    parser.add_argument('--feeders', type=int, default=20, help="comederos del estado de arranque")
+    parser.add_argument('--events', type=int, default=2000, help="eventos por comedero del estado de arranque")
+    parser.add_argument('--runs', type=int, default=5, help="arranques medidos (se usa la mediana)")
+    parser.add_argument('--records', type=int, default=20_000_000, help="registros del historial sintético")
+    parser.add_argument('--out', help="guardar resultados en JSON")
+    parser.add_argument('--baseline', help="JSON anterior con el que comparar")
+    args = parser.parse_args()
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    cwd = os.getcwd()  # start_bot() se cambia a un directorio temporal
+    results = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "revision": git_revision(source_dir),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+    if args.suite in ('startup', 'all'):
+        print(f"🚀 Arranque: {args.feeders} comederos x {args.events} eventos, {args.runs} arranques...")
+        results["startup"] = r = bench_startup(args, source_dir)
+        for state, label in (('clean', 'tras cierre limpio'), ('crash', 'tras caída')):
+            print(f"   {label}: listo en {r[f'{state}_ready_ms']} ms (import {r[f'{state}_import_ms']} ms, "
+                  f"PawPlayBot() {r[f'{state}_init_ms']} ms, proceso {r[f'{state}_process_ms']} ms)")
+    if args.suite in ('analytics', 'all'):
+        print(f"🔎 Analítica: {args.records} registros...")
+        results["analytics"] = r = bench_analytics(args, source_dir)
+        print(f"   {r['records_per_second']} registros/s ({r['seconds']} s para {r['file_mb']} MB), "
+              f"memoria máxima {r['peak_rss_mb']} MB")
+    if args.suite in ('startup', 'analytics'):
+        save_results(results, args, cwd)
+        return
+
+    pawplay_bot, bot = start_bot(args)
+    try:
+        if args.suite in ('http', 'all'):
+            print(f"🌐 HTTP: {args.clients} clientes durante {args.duration}s...")
+            results["http"] = bench_http(pawplay_bot, bot, args)
+            r = results["http"]
+            print(f"   {r['throughput_rps']} req/s, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, "
+                  f"p99 {r['p99_ms']} ms, {r['errors']} errores, "
+                  f"{r['snapshot_writes']} escrituras para {r['taps']} toques, "
+                  f"{r['bytes_per_poll']} bytes por sondeo ({r['wire']})")
+        if args.suite in ('commands', 'all'):
+            print(f"🤖 Comandos: {args.updates} actualizaciones, concurrencia {args.concurrency}...")
+            results["commands"] = bench_commands(bot, args)
+            r = results["commands"]
+            print(f"   {r['throughput_cps']} comandos/s, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, "
+                  f"p99 {r['p99_ms']} ms")
+    finally:
+        bot.shutdown()
+    save_results(results, args, cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de comandos de PawPlay Bot
+Cada comando y sus alias (español / inglés) apuntan al mismo manejador con
+una sola búsqueda en un dict. El texto se separa en comando y argumentos
+(admite comillas), se quita el sufijo @nombre_del_bot y se cuentan las
+llamadas y la latencia de cada comando.
+"""
+
+import shlex
+import threading
+import time
+from collections import namedtuple
+
+# Lo que recibe cada manejador
+CommandContext = namedtuple('CommandContext', ['chat_id', 'chat_type', 'user_name', 'command', 'args', 'msg'])
+
+
+class CommandStats:
+    """Llamadas, errores y latencia acumulada de un comando"""
+
+    __slots__ = ('calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class Command:
+    """Comando registrado: nombre principal, alias y manejador"""
+
+    __slots__ = ('name', 'aliases', 'handler', 'description', 'stats')
+
+    def __init__(self, name, aliases, handler, description):
+        self.name = name
+        self.aliases = aliases
+        self.handler = handler
+        self.description = description
+        self.stats = CommandStats()
+
+
+def parse_command(text):
+    """
+    Separar '/Comando@bot arg1 "arg 2"' en ('/comando', 'bot', ['arg1', 'arg 2']).
+    Devuelve None si el texto no es un comando.
+    """
+    text = (text or '').strip()
+    if not text.startswith('/'):
+        return None
+    try:
+        parts = shlex.split(text)
+    except ValueError:
+        parts = text.split()  # comillas sin cerrar: separar por espacios
+    command, _, username = parts[0].partition('@')
+    return command.lower(), username or None, parts[1:]
+
+
+class CommandRegistry:
+    """Tabla alias -> comando con métricas por comando"""
+
+    def __init__(self, bot_username=None):
+        self.bot_username = bot_username
+        self.unknown = 0  # comandos no reconocidos
+        self._commands = []
+        self._by_alias = {}
+        self._lock = threading.Lock()
+
+    def register(self, names, handler, description=None):
+        """
+        Registrar un comando. `names`: nombre principal seguido de sus alias;
+        handler(ctx) recibe un CommandContext.
+        """
+        names = [name.lower() for name in names]
+        command = Command(names[0], names[1:], handler, description)
+        for name in names:
+            if name in self._by_alias:
+                raise ValueError(f"Comando duplicado: {name}")
+            self._by_alias[name] = command
+        self._commands.append(command)
+        return command
+
+    def get(self, name):
+        """Comando de un nombre o alias (None si no existe)"""
+        return self._by_alias.get(name.lower())
+
+    def dispatch(self, chat_id, chat_type, user_name, text, msg=None):
+        """
+        Ejecutar el comando del texto. Devuelve True si se ejecutó, False si no
+        es un comando conocido y None si va dirigido a otro bot.
+        """
+        parsed = parse_command(text)
+        if parsed is None:
+            self._count_unknown()
+            return False
+        name, username, args = parsed
+        if username and self.bot_username and username.lower() != self.bot_username.lower():
+            return None  # /comando@otro_bot en un grupo
+        command = self._by_alias.get(name)
+        if command is None:
+            self._count_unknown()
+            return False
+
+        ctx = CommandContext(chat_id, chat_type, user_name, command.name, args, msg)
+        start = time.perf_counter()
+        failed = True
+        try:
+            command.handler(ctx)
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = command.stats
+                stats.calls += 1
+                stats.errors += failed
+                stats.total_time += elapsed
+                if elapsed > stats.max_time:
+                    stats.max_time = elapsed
+        return True
+
+    def _count_unknown(self):
+        with self._lock:
+            self.unknown += 1
+
+    def commands(self):
+        """Comandos registrados, en orden de registro"""
+        return list(self._commands)
+
+    def slowest(self, limit=10):
+        """Comandos usados, ordenados por latencia media (más lentos primero)"""
+        used = [command for command in self._commands if command.stats.calls]
+        used.sort(key=lambda command: command.stats.mean_time, reverse=True)
+        return used[:limit]
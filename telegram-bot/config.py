@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Configuración de PawPlay Bot
+Todos los ajustes del bot en un objeto `Config` que se pasa a PawPlayBot y
+de ahí a cada componente. Config.from_env() la lee del entorno (y de .env)
+al crear el bot, no al importar los módulos: así se pueden importar sin
+token ni librerías de Telegram, y las pruebas pueden crear Config(...) con
+los valores que necesiten sin tocar os.environ.
+"""
+
+import os
+from dataclasses import dataclass, field
+
+
+def parse_chat_ids(text):
+    """Chats separados por comas o espacios (los valores no numéricos se ignoran)"""
+    return frozenset(int(chat_id) for chat_id in (text or '').replace(',', ' ').split()
+                     if chat_id.lstrip('-').isdigit())
+
+
+@dataclass
+class Config:
+    # Conexión con Telegram: "telepot" (message_loop con hilos), "asyncio" (python-telegram-bot)
+    # o "none" (modo headless: solo la API HTTP, sin token)
+    telegram_token: str = None
+    telegram_transport: str = 'telepot'
+    telegram_api_url: str = None     # p. ej. http://127.0.0.1:8081/bot (servidor local)
+    update_concurrency: int = 8      # comandos procesados a la vez (asyncio)
+
+    http_port: int = 8765
+    # Servidor HTTP: "threaded" (pool acotado + keep-alive) o "single" (un hilo)
+    http_server_mode: str = 'threaded'
+    http_workers: int = 16           # peticiones atendidas a la vez
+    http_backlog: int = 64           # cola de conexiones pendientes
+    http_keepalive_timeout: float = 5.0
+    # Conexiones long-poll/SSE simultáneas (cada una ocupa un hilo del pool); None = http_workers // 2
+    http_max_push: int = None
+    # Procesos HTTP (> 1: toques en memoria compartida, ver multiproc.py) y ms entre sincronizaciones
+    http_processes: int = 1
+    http_sync_interval_ms: float = 20
+
+    # Persistencia write-behind: segundos máximos sin escribir / cambios que fuerzan escritura
+    persist_flush_interval: float = 1.0
+    persist_flush_threshold: int = 500
+
+    # Tamaño a partir del cual se compacta el registro de eventos
+    event_log_max_bytes: int = 1024 * 1024
+    # Historial de segmentos compactados (vacío para descartarlos)
+    event_archive_file: str = "game_events.archive"
+
+    # Lotes de toques: tamaño máximo y cuántos ids recientes se recuerdan para ignorar reintentos
+    batch_max_events: int = 500
+    batch_dedup_size: int = 4096
+
+    # Límite de toques HTTP por cliente (X-Device-Id o IP): toques/s (0 = sin límite), ráfaga
+    # máxima, ms mínimos entre dos toques (más rápido es imposible: se descarta) y clientes recordados
+    tap_rate_limit: float = 20
+    tap_burst: int = 40
+    tap_min_interval_ms: float = 30
+    rate_limit_clients: int = 4096
+
+    # Comederos: el comedero "default" usa los archivos del directorio de trabajo; el resto va en sessions_dir/<id>/
+    sessions_dir: str = "sessions"
+    max_sessions: int = 500
+
+    # Mensajes salientes: hilos de envío y ritmo máximo hacia Telegram
+    outbox_workers: int = 2
+    telegram_chat_interval: float = 1.0    # s entre mensajes a un chat
+    telegram_group_interval: float = 3.0   # s entre mensajes a un grupo
+    telegram_global_rate: float = 30       # mensajes/s en total
+
+    # Marcador en vivo (/marcador): segundos mínimos entre ediciones del mensaje de cada chat
+    scoreboard_interval: float = 3.0
+
+    # Avisos de eventos (/suscribir): hilos de envío, segundos que se agrupan en un resumen y resúmenes/s
+    notify_workers: int = 4
+    notify_digest_seconds: float = 2.0
+    notify_rate: float = 20
+
+    # Minutos sin toques tras los que se para una partida (0 = nunca; /programar inactividad lo cambia por comedero)
+    idle_stop_minutes: int = 0
+
+    # Historial de partidas: "sqlite" para guardar cada partida terminada en history_db_file
+    history_backend: str = 'none'
+    history_db_file: str = "pawplay_history.db"
+
+    # Jugadores que muestra cada ranking de /ranking
+    ranking_size: int = 10
+
+    # Administración: chats que pueden usar /perfil y token del endpoint HTTP /admin/profile
+    admin_chat_ids: frozenset = field(default_factory=frozenset)
+    admin_token: str = None
+    profile_dir: str = "profiles"
+
+    def __post_init__(self):
+        if self.http_max_push is None:
+            self.http_max_push = self.http_workers // 2
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Leer la configuración de `environ` (por defecto os.environ, tras cargar .env)"""
+        if environ is None:
+            from dotenv import load_dotenv
+            load_dotenv()  # las variables ya definidas tienen prioridad
+            environ = os.environ
+        get = environ.get
+        http_workers = int(get('HTTP_WORKERS', cls.http_workers))
+        return cls(
+            telegram_token=get('TELEGRAM_BOT_TOKEN') or None,
+            telegram_transport=get('TELEGRAM_TRANSPORT', cls.telegram_transport),
+            telegram_api_url=get('TELEGRAM_API_URL') or None,
+            update_concurrency=int(get('UPDATE_CONCURRENCY', cls.update_concurrency)),
+            http_port=int(get('HTTP_PORT', cls.http_port)),
+            http_server_mode=get('HTTP_SERVER_MODE', cls.http_server_mode),
+            http_workers=http_workers,
+            http_backlog=int(get('HTTP_BACKLOG', cls.http_backlog)),
+            http_keepalive_timeout=float(get('HTTP_KEEPALIVE_TIMEOUT', cls.http_keepalive_timeout)),
+            http_max_push=int(get('HTTP_MAX_PUSH', http_workers // 2)),
+            http_processes=int(get('HTTP_PROCESSES', cls.http_processes)),
+            http_sync_interval_ms=float(get('HTTP_SYNC_INTERVAL_MS', cls.http_sync_interval_ms)),
+            persist_flush_interval=float(get('PERSIST_FLUSH_INTERVAL', cls.persist_flush_interval)),
+            persist_flush_threshold=int(get('PERSIST_FLUSH_THRESHOLD', cls.persist_flush_threshold)),
+            event_log_max_bytes=int(get('EVENT_LOG_MAX_BYTES', cls.event_log_max_bytes)),
+            event_archive_file=get('EVENT_ARCHIVE_FILE', cls.event_archive_file),
+            batch_max_events=int(get('BATCH_MAX_EVENTS', cls.batch_max_events)),
+            batch_dedup_size=int(get('BATCH_DEDUP_SIZE', cls.batch_dedup_size)),
+            tap_rate_limit=float(get('TAP_RATE_LIMIT', cls.tap_rate_limit)),
+            tap_burst=int(get('TAP_BURST', cls.tap_burst)),
+            tap_min_interval_ms=float(get('TAP_MIN_INTERVAL_MS', cls.tap_min_interval_ms)),
+            rate_limit_clients=int(get('RATE_LIMIT_CLIENTS', cls.rate_limit_clients)),
+            sessions_dir=get('SESSIONS_DIR', cls.sessions_dir),
+            max_sessions=int(get('MAX_SESSIONS', cls.max_sessions)),
+            outbox_workers=int(get('OUTBOX_WORKERS', cls.outbox_workers)),
+            telegram_chat_interval=float(get('TELEGRAM_CHAT_INTERVAL', cls.telegram_chat_interval)),
+            telegram_group_interval=float(get('TELEGRAM_GROUP_INTERVAL', cls.telegram_group_interval)),
+            telegram_global_rate=float(get('TELEGRAM_GLOBAL_RATE', cls.telegram_global_rate)),
+            scoreboard_interval=float(get('SCOREBOARD_INTERVAL', cls.scoreboard_interval)),
+            notify_workers=int(get('NOTIFY_WORKERS', cls.notify_workers)),
+            notify_digest_seconds=float(get('NOTIFY_DIGEST_SECONDS', cls.notify_digest_seconds)),
+            notify_rate=float(get('NOTIFY_RATE', cls.notify_rate)),
+            idle_stop_minutes=int(get('IDLE_STOP_MINUTES', cls.idle_stop_minutes)),
+            history_backend=get('HISTORY_BACKEND', cls.history_backend),
+            history_db_file=get('HISTORY_DB_FILE', cls.history_db_file),
+            ranking_size=int(get('RANKING_SIZE', cls.ranking_size)),
+            admin_chat_ids=parse_chat_ids(get('ADMIN_CHAT_IDS')),
+            admin_token=get('ADMIN_TOKEN') or None,
+            profile_dir=get('PROFILE_DIR', cls.profile_dir),
+        )
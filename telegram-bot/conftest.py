@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Fixtures compartidas de las pruebas: un PawPlayBot headless en un directorio temporal"""
+
+import pytest
+
+import pawplay_bot
+
+
+class BotFactory:
+    """Crea bots headless en el mismo directorio (para simular reinicios) y los cierra al final"""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.bots = []
+
+    def __call__(self, **env):
+        self.monkeypatch.setenv('TELEGRAM_TRANSPORT', 'none')
+        self.monkeypatch.delenv('TELEGRAM_BOT_TOKEN', raising=False)
+        for name, value in env.items():
+            self.monkeypatch.setenv(name, str(value))
+        bot = pawplay_bot.PawPlayBot()
+        bot.sent = []
+        bot.send = lambda chat_id, text, **kwargs: bot.sent.append((chat_id, text))
+        self.bots.append(bot)
+        return bot
+
+    def close(self):
+        for bot in self.bots:
+            bot.shutdown()
+
+
+@pytest.fixture
+def make_bot(tmp_path, monkeypatch):
+    """make_bot(**env) -> PawPlayBot headless con los datos en tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    factory = BotFactory(monkeypatch)
+    yield factory
+    factory.close()
+
+
+@pytest.fixture
+def bot(make_bot):
+    return make_bot()
+
+
+def command(bot, text, chat_id=1, user="Ana"):
+    """Enviar un comando de texto como si llegara de Telegram; devuelve la última respuesta"""
+    bot.sent.clear()
+    bot.handle_message({'chat': {'id': chat_id, 'type': 'private'}, 'from': {'first_name': user},
+                        'text': text})
+    return bot.sent[-1][1] if bot.sent else None
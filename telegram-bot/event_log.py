@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de eventos append-only para PawPlay Bot
+Cada evento (toque, inicio, parada, dificultad, reset) se guarda como un
+registro binario de tamaño fijo. El estado se reconstruye a partir de la
+última instantánea JSON más la cola del registro.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+
+# Tipos de evento
+EVENT_CATCH = 1
+EVENT_MISS = 2
+EVENT_START = 3
+EVENT_STOP = 4
+EVENT_DIFFICULTY = 5
+EVENT_RESET = 6
+
+EVENT_NAMES = {
+    EVENT_CATCH: "catch",
+    EVENT_MISS: "miss",
+    EVENT_START: "start",
+    EVENT_STOP: "stop",
+    EVENT_DIFFICULTY: "difficulty",
+    EVENT_RESET: "reset",
+}
+
+# seq, timestamp, tipo, longitud del payload, payload, crc32 -> 48 bytes
+RECORD = struct.Struct('<QdBB26sI')
+RECORD_SIZE = RECORD.size
+PAYLOAD_SIZE = 26
+_BODY_SIZE = RECORD_SIZE - 4
+
+# Payload de los toques sumados por los procesos HTTP (modo multiproceso): se
+# sabe cuántos aciertos y fallos hubo en el intervalo, pero no en qué orden
+TAP_AGGREGATED = b'\x01'
+
+# Payload del evento de parada: aciertos, fallos + dificultad en texto
+STOP_PAYLOAD = struct.Struct('<II')
+
+
+def encode_text(text):
+    """Codificar texto recortándolo al tamaño del payload sin partir caracteres"""
+    data = (text or "").encode('utf-8')[:PAYLOAD_SIZE]
+    return data.decode('utf-8', 'ignore').encode('utf-8')
+
+
+def encode_stop(catches, misses, difficulty):
+    """Payload autocontenido de fin de partida"""
+    return STOP_PAYLOAD.pack(catches, misses) + difficulty.encode('utf-8')[:PAYLOAD_SIZE - STOP_PAYLOAD.size]
+
+
+def decode_stop(payload):
+    """Inverso de encode_stop -> (aciertos, fallos, dificultad)"""
+    catches, misses = STOP_PAYLOAD.unpack_from(payload)
+    return catches, misses, payload[STOP_PAYLOAD.size:].decode('utf-8', 'ignore')
+
+
+def iter_records(path):
+    """Leer los registros válidos de un registro o histórico sin modificarlo"""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, 'rb') as f:
+        while True:
+            record = f.read(RECORD_SIZE)
+            if len(record) < RECORD_SIZE:
+                return
+            seq, ts, kind, length, payload, crc = RECORD.unpack(record)
+            if zlib.crc32(record[:_BODY_SIZE]) != crc:
+                return
+            yield seq, ts, kind, payload[:length]
+
+
+class EventLog:
+    """Archivo append-only de registros de tamaño fijo"""
+
+    def __init__(self, path, max_bytes=1024 * 1024, archive_path=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.archive_path = Path(archive_path) if archive_path else None
+        self.last_seq = 0
+        self._lock = threading.Lock()
+        self._fd = None
+        self._size = 0
+
+    # ---------- lectura ----------
+    def replay(self, after_seq=0):
+        """
+        Devolver los eventos con seq > after_seq como (seq, ts, tipo, payload).
+        Un registro final incompleto o corrupto (p. ej. tras un corte de luz)
+        se descarta y el archivo se trunca al último registro válido.
+        """
+        events = []
+        valid_size = 0
+        if self.path.exists():
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            valid_size = self._skip_applied(data, after_seq)
+            for offset in range(valid_size, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+                record = data[offset:offset + RECORD_SIZE]
+                seq, ts, kind, length, payload, crc = RECORD.unpack(record)
+                if zlib.crc32(record[:_BODY_SIZE]) != crc:
+                    break
+                valid_size = offset + RECORD_SIZE
+                self.last_seq = max(self.last_seq, seq)
+                if seq > after_seq:
+                    events.append((seq, ts, kind, payload[:length]))
+            if valid_size != len(data):
+                print(f"⚠️ Registro de eventos truncado: {len(data) - valid_size} bytes descartados")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_size)
+        self.last_seq = max(self.last_seq, after_seq)
+        self._size = valid_size
+        return events
+
+    def _skip_applied(self, data, after_seq):
+        """
+        Bytes del principio del registro con seq <= after_seq (ya incluidos en
+        la instantánea), para no decodificarlos al arrancar. Los seq de un
+        registro son consecutivos, así que la posición se calcula; si el
+        registro de esa posición no es el esperado se lee todo.
+        """
+        count = len(data) // RECORD_SIZE
+        if not count or after_seq <= 0:
+            return 0
+        first_seq = RECORD.unpack_from(data, 0)[0]
+        skip = min(count, after_seq - first_seq + 1)
+        if skip <= 0:
+            return 0
+        end = skip * RECORD_SIZE
+        record = data[end - RECORD_SIZE:end]
+        seq, _, _, _, _, crc = RECORD.unpack(record)
+        if seq != first_seq + skip - 1 or zlib.crc32(record[:_BODY_SIZE]) != crc:
+            return 0
+        self.last_seq = max(self.last_seq, seq)
+        return end
+
+    # ---------- escritura ----------
+    def open(self):
+        """Abrir el archivo para añadir registros"""
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self._size = os.fstat(self._fd).st_size
+
+    def append(self, kind, payload=b'', ts=None):
+        """Añadir un evento y devolver su número de secuencia"""
+        if ts is None:
+            ts = time.time()
+        return self.append_many([(kind, payload, ts)])
+
+    def append_many(self, events):
+        """Añadir varios eventos (tipo, payload, ts) con una sola escritura; devuelve el último seq"""
+        with self._lock:
+            self.open()
+            chunks = []
+            for kind, payload, ts in events:
+                self.last_seq += 1
+                body = RECORD.pack(self.last_seq, ts, kind, len(payload), payload, 0)[:_BODY_SIZE]
+                chunks.append(body + struct.pack('<I', zlib.crc32(body)))
+            if chunks:
+                os.write(self._fd, b''.join(chunks))
+                self._size += RECORD_SIZE * len(chunks)
+            return self.last_seq
+
+    @property
+    def size(self):
+        """Tamaño actual del registro en bytes"""
+        return self._size
+
+    def needs_compaction(self):
+        """El registro superó el tamaño máximo"""
+        return self._size >= self.max_bytes
+
+    def compact(self):
+        """
+        Vaciar el registro. Solo debe llamarse cuando todos los eventos ya
+        están incluidos en una instantánea. Si hay archivo histórico, el
+        segmento se conserva ahí en lugar de descartarse.
+        """
+        with self._lock:
+            self.open()
+            if self.archive_path and self._size:
+                with open(self.path, 'rb') as src, open(self.archive_path, 'ab') as dst:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            os.ftruncate(self._fd, 0)
+            self._size = 0
+
+    def close(self):
+        """Cerrar el archivo"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
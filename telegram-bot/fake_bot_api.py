@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita la Bot API de Telegram para PawPlay Bot
+Implementa getMe, getUpdates (long-polling), sendMessage y editMessageText en
+memoria, así que el bot se puede ejecutar y medir sin red:
+
+    python fake_bot_api.py --updates 2000 --chats 50 --latency 0.05
+
+lanza el bot con TELEGRAM_TRANSPORT=asyncio contra este servidor (en un
+directorio temporal), inyecta las actualizaciones y mide cuántos comandos
+por segundo procesa.
+"""
+
+import argparse
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlparse
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "PawPlay", "username": "pawplay_fake_bot"}
+
+
+class FakeBotAPI:
+    """Bot API en memoria: cola de actualizaciones y registro de mensajes enviados"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency  # segundos añadidos a cada sendMessage
+        self.updates = []
+        self.sent = []
+        self.edits = 0
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._cond = threading.Condition()
+        self.httpd = http.server.ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Valor para TELEGRAM_API_URL"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # =================== DATOS ===================
+    def push_message(self, chat_id, text, first_name="Usuario"):
+        """Añadir un mensaje de texto entrante"""
+        with self._cond:
+            self.updates.append({
+                "update_id": self._next_update_id,
+                "message": {
+                    "message_id": self._next_update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+                    "from": {"id": abs(chat_id), "is_bot": False, "first_name": first_name},
+                    "text": text,
+                },
+            })
+            self._next_update_id += 1
+            self._cond.notify_all()
+
+    def wait_for_messages(self, count, timeout):
+        """Esperar a que el bot haya enviado `count` mensajes"""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.sent) >= count, timeout)
+
+    # =================== MÉTODOS DE LA API ===================
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            # offset confirma (y descarta) las actualizaciones anteriores
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.updates[:limit]
+
+    def send_message(self, params):
+        if self.latency:
+            time.sleep(self.latency)
+        chat_id = int(params['chat_id'])
+        with self._cond:
+            message = {
+                "message_id": self._next_message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+                "from": BOT_USER,
+                "text": params.get('text', ''),
+            }
+            self._next_message_id += 1
+            self.sent.append(message)
+            self._cond.notify_all()
+        return message
+
+    def edit_message(self, params):
+        message_id = int(params['message_id'])
+        chat_id = int(params['chat_id'])
+        with self._cond:
+            message = next((m for m in reversed(self.sent)
+                            if m["message_id"] == message_id and m["chat"]["id"] == chat_id), None)
+            if message is None:
+                raise KeyError("message to edit not found")
+            if message["text"] == params.get('text', ''):
+                raise ValueError("message is not modified")
+            message["text"] = params.get('text', '')
+            self.edits += 1
+        return message
+
+    def call(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self.get_updates(params)
+        if method == 'sendMessage':
+            return self.send_message(params)
+        if method == 'editMessageText':
+            return self.edit_message(params)
+        return True
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.handle_call(dict(parse_qsl(urlparse(self.path).query)))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                else:
+                    # python-telegram-bot y telepot envían formularios con valores JSON
+                    params = {}
+                    for key, value in parse_qsl(body.decode('utf-8')):
+                        try:
+                            params[key] = json.loads(value)
+                        except ValueError:
+                            params[key] = value
+                self.handle_call(params)
+
+            def handle_call(self, params):
+                method = urlparse(self.path).path.rsplit('/', 1)[-1]
+                try:
+                    payload = {"ok": True, "result": api.call(method, params)}
+                    status = 200
+                except (KeyError, ValueError) as e:
+                    payload = {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
+                    status = 400
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el bot (asyncio) contra una Bot API local")
+    parser.add_argument('--updates', type=int, default=1000, help="comandos a inyectar")
+    parser.add_argument('--chats', type=int, default=20, help="chats distintos")
+    parser.add_argument('--latency', type=float, default=0.05, help="latencia de sendMessage (s)")
+    parser.add_argument('--concurrency', type=int, default=8, help="UPDATE_CONCURRENCY")
+    parser.add_argument('--command', default='/estado')
+    args = parser.parse_args()
+
+    api = FakeBotAPI(latency=args.latency).start()
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '123456:fake',
+        'TELEGRAM_TRANSPORT': 'asyncio',
+        'TELEGRAM_API_URL': api.base_url,
+        'UPDATE_CONCURRENCY': str(args.concurrency),
+        'HTTP_PORT': '0',
+    })
+    os.chdir(tempfile.mkdtemp(prefix="pawplay-bench-"))  # no tocar los datos reales
+
+    import pawplay_bot
+    bot = pawplay_bot.PawPlayBot()
+    runner = threading.Thread(target=bot.run)
+    runner.start()
+
+    start = time.monotonic()
+    for i in range(args.updates):
+        api.push_message(1000 + i % args.chats, args.command)
+    while bot.telegram.handled < args.updates and time.monotonic() - start < 120:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    handled = bot.telegram.handled
+
+    bot.telegram.stop()
+    runner.join(30)
+    api.close()
+    print(f"📊 {handled}/{args.updates} comandos en {elapsed:.2f}s "
+          f"({handled / elapsed:.0f}/s, concurrencia {args.concurrency}, "
+          f"latencia sendMessage {args.latency * 1000:.0f} ms)")
+    print(f"📤 {len(api.sent)} sendMessage (mensajes unidos: {bot.outbox.merged})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Historial de partidas en SQLite para PawPlay Bot
+Cada partida terminada (/parar) se guarda con jugador, dificultad, aciertos,
+fallos e inicio/fin en tablas indexadas. La base usa WAL y un hilo escritor
+que agrupa las inserciones en transacciones, así que registrar una partida
+nunca espera al disco.
+
+Migración de los datos existentes:
+    python history_store.py migrate [--db pawplay_history.db]
+"""
+
+import argparse
+import json
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from event_log import EVENT_START, EVENT_STOP, decode_stop, iter_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    feeder TEXT NOT NULL,
+    log_seq INTEGER,
+    player TEXT,
+    difficulty TEXT NOT NULL,
+    catches INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    started_at REAL,
+    ended_at REAL NOT NULL,
+    UNIQUE (feeder, log_seq)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_ended ON sessions (ended_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_player ON sessions (player, ended_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_difficulty ON sessions (difficulty, ended_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_feeder ON sessions (feeder, ended_at);
+CREATE TABLE IF NOT EXISTS legacy_totals (
+    source TEXT PRIMARY KEY,
+    total_games INTEGER NOT NULL,
+    total_catches INTEGER NOT NULL,
+    total_misses INTEGER NOT NULL,
+    best_scores TEXT NOT NULL,
+    last_played TEXT,
+    imported_at REAL NOT NULL
+);
+"""
+
+_INSERT_SESSION = """
+INSERT OR IGNORE INTO sessions
+    (feeder, log_seq, player, difficulty, catches, misses, started_at, ended_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()  # Marca de cierre para el hilo escritor
+
+
+class HistoryStore:
+    """Historial de partidas en SQLite con escrituras por lotes"""
+
+    def __init__(self, path, batch_size=200, batch_interval=1.0):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.written = 0
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._reader = self._connect()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # seguro con WAL, sin fsync por transacción
+        return conn
+
+    def start(self):
+        """Iniciar el hilo escritor"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def record_session(self, feeder, log_seq, player, difficulty, catches, misses,
+                       started_at, ended_at):
+        """Encolar una partida terminada (no bloquea)"""
+        self._queue.put((feeder, log_seq, player, difficulty, catches, misses, started_at, ended_at))
+
+    def close(self):
+        """Escribir las partidas pendientes y cerrar"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+            self._thread = None
+        else:
+            self._write_pending()
+        with self._read_lock:
+            self._reader.close()
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = []
+                while item is not _STOP:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=self.batch_interval if len(batch) == 1 else 0)
+                    except queue.Empty:
+                        break
+                self._insert(conn, batch)
+                if item is _STOP:
+                    return
+        finally:
+            conn.close()
+
+    def _write_pending(self):
+        """Escribir lo encolado desde el hilo actual (sin hilo escritor)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        conn = self._connect()
+        try:
+            self._insert(conn, batch)
+        finally:
+            conn.close()
+
+    def _insert(self, conn, batch):
+        if not batch:
+            return
+        try:
+            with conn:  # una transacción por lote
+                conn.executemany(_INSERT_SESSION, batch)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            print(f"Error guardando historial: {e}")
+
+    # =================== CONSULTAS ===================
+    def query(self, player=None, difficulty=None, feeder=None, since=None, until=None):
+        """
+        Resumen de las partidas que cumplen los filtros (since/until en
+        timestamps). Devuelve totales y el desglose por dificultad.
+        """
+        where, params = [], []
+        for column, value in (('player', player), ('difficulty', difficulty), ('feeder', feeder)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("ended_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ended_at < ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with self._read_lock:
+            games, catches, misses, best, first, last = self._reader.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(catches), 0), COALESCE(SUM(misses), 0), "
+                f"COALESCE(MAX(catches), 0), MIN(ended_at), MAX(ended_at) FROM sessions {clause}",
+                params).fetchone()
+            by_difficulty = self._reader.execute(
+                f"SELECT difficulty, COUNT(*), SUM(catches), SUM(misses), MAX(catches) "
+                f"FROM sessions {clause} GROUP BY difficulty ORDER BY difficulty", params).fetchall()
+        return {
+            "games": games,
+            "catches": catches,
+            "misses": misses,
+            "best": best,
+            "first": first,
+            "last": last,
+            "by_difficulty": {
+                row[0]: {"games": row[1], "catches": row[2], "misses": row[3], "best": row[4]}
+                for row in by_difficulty
+            },
+        }
+
+    def count(self):
+        """Número de partidas guardadas"""
+        with self._read_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    # =================== MIGRACIÓN ===================
+    def import_stats_file(self, stats_file):
+        """
+        Importar los totales de game_stats.json. El JSON no guarda partidas
+        individuales, así que se conservan como totales heredados.
+        """
+        path = Path(stats_file)
+        if not path.exists():
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO legacy_totals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(path), stats.get('total_games', 0), stats.get('total_catches', 0),
+                 stats.get('total_misses', 0), json.dumps(stats.get('best_scores', {})),
+                 stats.get('last_played'), datetime.now().timestamp()))
+        return True
+
+    def import_event_log(self, feeder, paths):
+        """
+        Reconstruir partidas a partir de registros de eventos (histórico y
+        registro activo): cada inicio se empareja con la parada siguiente.
+        Es idempotente gracias a la clave (comedero, seq).
+        """
+        rows = []
+        player = started_at = None
+        for path in paths:
+            for seq, ts, kind, payload in iter_records(path):
+                if kind == EVENT_START:
+                    player, started_at = payload.decode('utf-8', 'ignore'), ts
+                elif kind == EVENT_STOP:
+                    catches, misses, difficulty = decode_stop(payload)
+                    rows.append((feeder, seq, player, difficulty, catches, misses, started_at, ts))
+                    player = started_at = None
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(_INSERT_SESSION, rows)
+            return conn.total_changes - before
+
+
+def migrate(db_path, stats_file, feeders):
+    """Importar estadísticas JSON y registros de eventos existentes"""
+    store = HistoryStore(db_path)
+    try:
+        if store.import_stats_file(stats_file):
+            print(f"📥 Totales importados de {stats_file}")
+        for feeder, paths in feeders.items():
+            imported = store.import_event_log(feeder, paths)
+            print(f"📥 {feeder}: {imported} partidas importadas")
+        print(f"🗄️ {store.count()} partidas en {db_path}")
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historial SQLite de PawPlay")
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('--db', default='pawplay_history.db')
+    parser.add_argument('--stats', default='game_stats.json')
+    parser.add_argument('--sessions-dir', default='sessions')
+    args = parser.parse_args()
+
+    feeders = {"default": ["game_events.archive", "game_events.log"]}
+    sessions_dir = Path(args.sessions_dir)
+    if sessions_dir.is_dir():
+        for entry in sorted(sessions_dir.iterdir()):
+            if entry.is_dir():
+                feeders[entry.name] = [entry / "game_events.archive", entry / "game_events.log"]
+    migrate(args.db, args.stats, feeders)
+
+
+if __name__ == "__main__":
+    main()
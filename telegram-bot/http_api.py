@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP de PawPlay Bot para la app
+Modo "threaded" (por defecto): pool acotado de hilos con keep-alive HTTP/1.1;
+las conexiones keep-alive inactivas esperan en un selector, no en un hilo.
+Modo "single": el socketserver.TCPServer original de un solo hilo.
+
+Además del sondeo de /game-data, los clientes pueden recibir cambios por
+long-poll (/game-data/poll?since=<versión>) o Server-Sent Events
+(/game-data/stream). Ambos solo están disponibles en modo threaded.
+
+Todas las rutas de juego se refieren a un comedero, indicado con
+?feeder=<id> o la cabecera X-Feeder-Id ("default" si falta).
+GET /metrics expone las métricas del proceso en formato Prometheus.
+
+El formato por defecto es JSON. Con `Accept: application/x-pawplay` el estado
+y los resultados de /register-batch van en el formato binario de wire.py
+(y los lotes se pueden enviar así), y las respuestas JSON grandes se
+comprimen con gzip si Accept-Encoding lo permite.
+/admin/profile (con ADMIN_TOKEN) inicia y consulta perfiles de CPU/memoria.
+"""
+
+import http.server
+import json
+import math
+import selectors
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+import metrics
+import wire
+from event_log import EVENT_CATCH, EVENT_MISS
+from ratelimit import ALLOWED, DEBOUNCED
+from sessions import DEFAULT_FEEDER
+
+_JSON_SUCCESS = b'{"status": "success"}'
+_JSON_DEBOUNCED = b'{"status": "ignored", "reason": "debounce"}'
+_BUSY_RESPONSE = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                  b'Content-Length: 0\r\nConnection: close\r\nRetry-After: 1\r\n\r\n')
+
+LONG_POLL_DEFAULT_TIMEOUT = 25.0
+LONG_POLL_MAX_TIMEOUT = 60.0
+STREAM_HEARTBEAT = 15.0  # comentario SSE periódico para detectar clientes caídos
+MAX_BODY_BYTES = 256 * 1024  # cuerpo máximo de POST /register-batch
+_SESSION_GET_ROUTES = {'/game-data', '/game-data/poll', '/game-data/stream',
+                       '/register-catch', '/register-miss', '/stats/timeseries'}
+_TAP_ROUTES = {'/register-catch', '/register-miss'}
+MAX_DEVICE_ID = 64
+
+# Latencia por ruta (el stream SSE no se mide: dura lo que el cliente esté conectado)
+HTTP_LATENCY = metrics.histogram('pawplay_http_request_duration_seconds',
+                                 'Duración de las peticiones HTTP por ruta', ('route',),
+                                 metrics.LATENCY_BUCKETS + (10.0, 30.0, 60.0))
+_ROUTE_LATENCY = {route: HTTP_LATENCY.labels(route)
+                  for route in (_SESSION_GET_ROUTES | {'/register-batch', '/metrics'}) - {'/game-data/stream'}}
+_OTHER_LATENCY = HTTP_LATENCY.labels('other')
+
+# Bytes enviados en los cuerpos de respuesta según su codificación
+RESPONSE_BYTES = metrics.counter('pawplay_http_response_bytes_total',
+                                 'Bytes de cuerpo enviados por codificación', ('encoding',))
+_BYTES_IDENTITY = RESPONSE_BYTES.labels('identity')
+_BYTES_GZIP = RESPONSE_BYTES.labels('gzip')
+_BYTES_BINARY = RESPONSE_BYTES.labels('binary')
+_COMPRESSIBLE = {'application/json', metrics.CONTENT_TYPE}
+
+
+class GameDataHandler(http.server.BaseHTTPRequestHandler):
+    """Rutas HTTP de la app; game_bot se asigna en make_handler"""
+
+    game_bot = None
+    rate_limited = True  # False en el servidor interno del modo multiproceso (ya limitan los procesos HTTP)
+    # Cabeceras y cuerpo van en dos escrituras: sin esto Nagle + ACK diferido
+    # añaden ~40 ms a cada respuesta en conexiones keep-alive
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        """
+        Atender las peticiones de la conexión que ya han llegado. En un
+        PooledHTTPServer la conexión keep-alive que queda a la espera se
+        devuelve al servidor (parked) en lugar de bloquear el hilo en readline.
+        """
+        self.parked = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if getattr(self.server, 'park_idle', False) and not self.request_pending():
+                self.parked = not self.close_connection
+                return
+            self.handle_one_request()
+
+    def request_pending(self):
+        """¿Hay ya bytes de otra petición en el buffer o en el socket? No bloquea"""
+        timeout = self.connection.gettimeout()
+        self.connection.setblocking(False)
+        try:
+            # Sin datos (o con el cliente ya desconectado) peek devuelve b''
+            return bool(self.rfile.peek(1))
+        except OSError:
+            self.close_connection = True
+            return False
+        finally:
+            self.connection.settimeout(timeout)
+
+    def do_GET(self):
+        """Manejar requests GET"""
+        start = time.perf_counter()
+        parsed_path = urlparse(self.path)
+        try:
+            self.route_get(parsed_path)
+        finally:
+            self.observe_latency(parsed_path.path, start)
+
+    def observe_latency(self, path, start):
+        if path != '/game-data/stream':
+            _ROUTE_LATENCY.get(path, _OTHER_LATENCY).observe(time.perf_counter() - start)
+
+    def route_get(self, parsed_path):
+        query = parse_qs(parsed_path.query)
+
+        if parsed_path.path == '/metrics':
+            self.send_body(200, metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+            return
+        if parsed_path.path == '/admin/profile':
+            if self.check_admin():
+                self.send_profile_status()
+            return
+        if parsed_path.path not in _SESSION_GET_ROUTES:
+            self.send_body(404, b'', content_type=None)
+            return
+        if parsed_path.path in _TAP_ROUTES and not self.allow_tap():
+            return
+        session = self.resolve_session(query)
+        if session is None:
+            return
+
+        if parsed_path.path == '/game-data':
+            # Devolver datos del juego (304 si el cliente ya tiene esta versión)
+            self.send_snapshot(session.get_game_snapshot())
+
+        elif parsed_path.path == '/game-data/poll':
+            self.handle_long_poll(session, query)
+
+        elif parsed_path.path == '/game-data/stream':
+            self.handle_stream(session)
+
+        elif parsed_path.path == '/register-catch':
+            # Registrar acierto
+            session.register_tap(EVENT_CATCH)
+            self.send_body(200, _JSON_SUCCESS)
+
+        elif parsed_path.path == '/register-miss':
+            # Registrar fallo
+            session.register_tap(EVENT_MISS)
+            self.send_body(200, _JSON_SUCCESS)
+
+        elif parsed_path.path == '/stats/timeseries':
+            self.handle_timeseries(session, query)
+
+    def do_POST(self):
+        """Manejar requests POST"""
+        start = time.perf_counter()
+        parsed_path = urlparse(self.path)
+        try:
+            self.route_post(parsed_path)
+        finally:
+            self.observe_latency(parsed_path.path, start)
+
+    def route_post(self, parsed_path):
+        if parsed_path.path == '/register-batch':
+            # Un lote cuenta como una petición: sus toques ya se aplican con una sola escritura
+            if not self.allow_tap(tap=False):
+                self.read_body()
+                return
+            session = self.resolve_session(parse_qs(parsed_path.query))
+            if session is None:
+                self.read_body()
+                return
+            self.handle_batch(session)
+        elif parsed_path.path == '/admin/profile':
+            self.read_body()
+            if self.check_admin():
+                self.handle_start_profile(parse_qs(parsed_path.query))
+        else:
+            self.read_body()  # vaciar el cuerpo para poder reutilizar la conexión
+            self.send_body(404, b'', content_type=None)
+
+    def resolve_session(self, query):
+        """Sesión del comedero de la petición; si no es válido responde el error y devuelve None"""
+        feeder_id = (query.get('feeder', [None])[0] or self.headers.get('X-Feeder-Id')
+                     or DEFAULT_FEEDER)
+        try:
+            return self.game_bot.get_session(feeder_id)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode())
+        except OverflowError as e:
+            self.send_body(503, json.dumps({"error": str(e)}).encode())
+        return None
+
+    def client_id(self):
+        """Cliente para el límite de toques: X-Device-Id de la app o, si falta, la IP"""
+        device_id = self.headers.get('X-Device-Id')
+        if device_id:
+            return device_id.strip()[:MAX_DEVICE_ID]
+        return self.client_address[0]
+
+    def allow_tap(self, tap=True):
+        """
+        Aplicar el límite de toques del cliente. Si se rechaza, responde 429 con
+        Retry-After (o 200 "ignored" si es un rebote, para que la app no lo
+        reintente) y devuelve False.
+        """
+        if not self.rate_limited:
+            return True
+        verdict, retry_after = self.game_bot.tap_limiter.check(self.client_id(), tap)
+        if verdict == ALLOWED:
+            return True
+        if verdict == DEBOUNCED:
+            self.send_body(200, _JSON_DEBOUNCED)
+            return False
+        seconds = max(1, math.ceil(retry_after))
+        self.send_body(429, json.dumps({"error": "demasiados toques", "retry_after": seconds}).encode(),
+                       headers={'Retry-After': str(seconds)})
+        return False
+
+    def do_OPTIONS(self):
+        """Preflight CORS para los POST con JSON"""
+        self.send_body(204, b'', content_type=None, headers={
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Accept, Content-Type, If-None-Match, X-Device-Id, X-Feeder-Id',
+            'Access-Control-Max-Age': '86400',
+        })
+
+    def read_body(self):
+        """Leer el cuerpo de la petición (None si supera MAX_BODY_BYTES)"""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return None
+        return self.rfile.read(length) if length else b''
+
+    def check_admin(self):
+        """Validar el token de administración; si no es válido responde el error"""
+        if not self.game_bot.admin_enabled:
+            self.send_body(404, b'', content_type=None)
+            return False
+        token = self.headers.get('X-Admin-Token')
+        authorization = self.headers.get('Authorization', '')
+        if token is None and authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):].strip()
+        if not self.game_bot.check_admin_token(token):
+            self.send_body(403, json.dumps({"error": "token de administración no válido"}).encode())
+            return False
+        return True
+
+    def handle_start_profile(self, query):
+        """POST /admin/profile?seconds=N: perfil en segundo plano, resumen a los administradores"""
+        try:
+            seconds = float(query.get('seconds', [self.game_bot.profile_default_seconds])[0])
+        except ValueError:
+            self.send_body(400, json.dumps({"error": "seconds no válido"}).encode())
+            return
+        if not self.game_bot.start_profile(seconds):
+            self.send_body(409, json.dumps({"error": "ya hay un perfil en curso"}).encode())
+            return
+        self.send_body(202, json.dumps({"status": "started", "seconds": seconds}).encode())
+
+    def send_profile_status(self):
+        profiler = self.game_bot.profiler
+        report = profiler.last_report
+        self.send_body(200, json.dumps({
+            "running": profiler.running,
+            "last_report": str(report) if report else None,
+            "last_summary": profiler.last_summary,
+        }).encode())
+
+    def handle_batch(self, session):
+        """
+        POST /register-batch: {"events": [{"type": "catch"|"miss", "ts": ms, "id": "..."}]}
+        o el mismo lote en binario con Content-Type: application/x-pawplay
+        """
+        body = self.read_body()
+        if body is None:
+            self.send_body(413, b'{"error": "body too large"}')
+            return
+        try:
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type == wire.CONTENT_TYPE:
+                events = wire.decode_batch(body)
+            else:
+                payload = json.loads(body or b'null')
+                events = payload.get('events') if isinstance(payload, dict) else payload
+            if not isinstance(events, list):
+                raise ValueError("events debe ser una lista")
+            applied, duplicates, ignored = session.register_batch(events, self.game_bot.batch_max_events)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode())
+            return
+        if self.wants_binary():
+            self.send_body(200, wire.encode_batch_result(applied, duplicates, ignored, session.state_version),
+                           content_type=wire.CONTENT_TYPE, headers={'Vary': 'Accept'})
+            return
+        response = {"status": "success", "applied": applied, "duplicates": duplicates,
+                    "ignored": ignored, "version": session.state_version}
+        self.send_body(200, json.dumps(response).encode())
+
+    def handle_timeseries(self, session, query):
+        """GET /stats/timeseries?resolution=minute|hour|day&points=N"""
+        try:
+            points = query.get('points', [None])[0]
+            data = session.get_timeseries(query.get('resolution', ['minute'])[0],
+                                          int(points) if points else None)
+        except ValueError as e:
+            self.send_body(400, json.dumps({"error": str(e)}).encode())
+            return
+        self.send_body(200, json.dumps(data).encode())
+
+    def send_snapshot(self, snapshot):
+        """
+        Enviar la instantánea del estado con ETag fuerte y soporte de If-None-Match.
+        Cada codificación (JSON, gzip, binaria) tiene su propio ETag.
+        """
+        headers = {'X-State-Version': str(snapshot.version), 'Cache-Control': 'no-cache',
+                   'Vary': 'Accept, Accept-Encoding'}
+        content_type = 'application/json'
+        if self.wants_binary():
+            body, etag, content_type = snapshot.binary, snapshot.etag[:-1] + '.bin"', wire.CONTENT_TYPE
+        elif len(snapshot.body) >= wire.GZIP_MIN_BYTES and self.accepts_gzip():
+            body, etag = snapshot.gzip, snapshot.etag[:-1] + '.gz"'
+            headers['Content-Encoding'] = 'gzip'
+        else:
+            body, etag = snapshot.body, snapshot.etag
+        headers['ETag'] = etag
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            headers.pop('Content-Encoding', None)
+            self.send_body(304, b'', content_type=None, headers=headers)
+        else:
+            self.send_body(200, body, content_type=content_type, headers=headers)
+
+    def handle_long_poll(self, session, query):
+        """Responder en cuanto cambie la versión o 204 al agotar el timeout"""
+        try:
+            since = int(query.get('since', ['-1'])[0])
+            timeout = float(query.get('timeout', [LONG_POLL_DEFAULT_TIMEOUT])[0])
+        except ValueError:
+            self.send_body(400, b'{"error": "invalid since/timeout"}')
+            return
+        timeout = min(max(timeout, 0.0), LONG_POLL_MAX_TIMEOUT)
+
+        waiting = self.acquire_push_slot()
+        if not waiting:
+            # Sin hilos de espera disponibles: degradar a sondeo normal
+            timeout = 0.0
+        try:
+            version = session.wait_for_change(since, timeout, self.server.closing.is_set
+                                              if waiting else None)
+        finally:
+            if waiting:
+                self.server.release_push_slot()
+
+        if version == since:
+            self.send_body(204, b'', content_type=None, headers={'X-State-Version': str(version)})
+            return
+        self.send_snapshot(session.get_game_snapshot())
+
+    def handle_stream(self, session):
+        """Server-Sent Events: un evento `state` por cada cambio de versión"""
+        if not self.acquire_push_slot():
+            self.send_body(503, b'{"error": "stream unavailable"}', headers={'Retry-After': '3'})
+            return
+        try:
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(b'retry: 3000\n\n')
+
+            last_sent = self.headers.get('Last-Event-ID')
+            last_sent = int(last_sent) if last_sent and last_sent.isdigit() else None
+            closing = self.server.closing
+            while not closing.is_set():
+                snapshot = session.get_game_snapshot()
+                if snapshot.version != last_sent:
+                    self.wfile.write(b'id: %d\nevent: state\ndata: %s\n\n' % (snapshot.version, snapshot.body))
+                    last_sent = snapshot.version
+                if session.wait_for_change(snapshot.version, STREAM_HEARTBEAT,
+                                           closing.is_set) == snapshot.version:
+                    self.wfile.write(b': keepalive\n\n')
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass  # Cliente desconectado
+        finally:
+            self.server.release_push_slot()
+
+    def acquire_push_slot(self):
+        """Reservar un hilo para long-poll/SSE (nunca en modo single)"""
+        acquire = getattr(self.server, 'acquire_push_slot', None)
+        return acquire is not None and acquire()
+
+    def wants_binary(self):
+        """¿Pidió el cliente el formato binario (Accept: application/x-pawplay)?"""
+        return wire.accepts(self.headers.get('Accept'), wire.CONTENT_TYPE)
+
+    def accepts_gzip(self):
+        return wire.accepts(self.headers.get('Accept-Encoding'), 'gzip')
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        """
+        Enviar respuesta completa con Content-Length (necesario para keep-alive).
+        Los cuerpos JSON o de métricas grandes se comprimen si el cliente acepta gzip.
+        """
+        encoded = headers is not None and 'Content-Encoding' in headers
+        if (not encoded and len(body) >= wire.GZIP_MIN_BYTES and content_type in _COMPRESSIBLE
+                and self.accepts_gzip()):
+            body = wire.compress(body)
+            headers = {**(headers or {}), 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'}
+            encoded = True
+        if content_type == wire.CONTENT_TYPE:
+            _BYTES_BINARY.inc(len(body))
+        elif encoded:
+            _BYTES_GZIP.inc(len(body))
+        else:
+            _BYTES_IDENTITY.inc(len(body))
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-type', content_type)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Silenciar logs del servidor HTTP
+        pass
+
+
+def etag_matches(if_none_match, etag):
+    """Comparar la cabecera If-None-Match con un ETag (admite listas y *)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """
+    TCPServer que atiende las conexiones en un pool acotado de hilos.
+    Como máximo `workers` peticiones se atienden a la vez y `max_pending` más
+    esperan turno; el resto recibe 503. Entre petición y petición, una
+    conexión keep-alive no ocupa hilo: espera en un selector (hasta
+    `max_idle` conexiones) y vuelve al pool cuando llega la siguiente
+    petición, o se cierra tras `keepalive_timeout` segundos inactiva.
+    Las conexiones long-poll/SSE sí ocupan un hilo mientras esperan, así que
+    se limitan a `max_push` para que siempre queden hilos para los toques.
+    """
+
+    allow_reuse_address = True
+    park_idle = True
+
+    def __init__(self, server_address, handler_class, workers=16, backlog=64, max_pending=64,
+                 max_push=None, max_idle=1024, bind_and_activate=True):
+        self.request_queue_size = backlog  # cola de conexiones del socket (listen)
+        self.workers = workers
+        if max_push is None:
+            max_push = workers // 2
+        self.push_slots = threading.BoundedSemaphore(max_push) if max_push > 0 else None
+        self.closing = threading.Event()
+        self.connections = 0       # peticiones atendidas ahora mismo
+        self.push_clients = 0      # clientes long-poll/SSE en espera
+        self.idle_connections = 0  # conexiones keep-alive esperando su siguiente petición
+        self.max_idle = max_idle
+        self.keepalive_timeout = getattr(handler_class, 'timeout', None) or 5.0
+        self._counts_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._parking = []  # conexiones que el selector aún no vigila
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name="http-idle", daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            # Saturado: rechazar sin bloquear el hilo que acepta conexiones
+            self._reject(request)
+            return
+        try:
+            self._pool.submit(self._process, request, client_address)
+        except RuntimeError:  # pool cerrado: el servidor se está apagando
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _reject(self, request):
+        try:
+            request.sendall(_BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def finish_request(self, request, client_address):
+        """Atender la conexión; True si quedó esperando la siguiente petición en el selector"""
+        handler = self.RequestHandlerClass(request, client_address, self)
+        return getattr(handler, 'parked', False) and self._park(request, client_address)
+
+    def _process(self, request, client_address):
+        with self._counts_lock:
+            self.connections += 1
+        parked = False
+        try:
+            parked = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if not parked:
+                self.shutdown_request(request)
+            with self._counts_lock:
+                self.connections -= 1
+            self._slots.release()
+
+    # =================== CONEXIONES KEEP-ALIVE INACTIVAS ===================
+    def _park(self, request, client_address):
+        """Pasar una conexión inactiva al selector; False si no cabe y hay que cerrarla"""
+        with self._counts_lock:
+            if self.closing.is_set() or self.idle_connections >= self.max_idle:
+                return False
+            self.idle_connections += 1
+            self._parking.append((request, client_address))
+        self._wake()
+        return True
+
+    def _wake(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass  # buffer lleno: el selector ya tiene un aviso pendiente
+
+    def _watch_idle(self):
+        """
+        Hilo del selector: devuelve al pool las conexiones con una petición nueva
+        y cierra las que superan keepalive_timeout sin actividad.
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        idle = {}  # socket -> (dirección, vencimiento); mismo timeout para todas: orden de llegada
+        try:
+            while not self.closing.is_set():
+                with self._counts_lock:
+                    parking, self._parking = self._parking, []
+                deadline = time.monotonic() + self.keepalive_timeout
+                for request, client_address in parking:
+                    try:
+                        selector.register(request, selectors.EVENT_READ)
+                    except (ValueError, OSError):  # ya cerrada por el cliente
+                        self._drop_idle(request)
+                        continue
+                    idle[request] = (client_address, deadline)
+
+                timeout = None
+                if idle:
+                    timeout = max(0.0, next(iter(idle.values()))[1] - time.monotonic())
+                for key, _ in selector.select(timeout):
+                    if key.fileobj is self._wakeup_r:
+                        try:
+                            while self._wakeup_r.recv(4096):
+                                pass
+                        except OSError:
+                            pass
+                        continue
+                    request = key.fileobj
+                    selector.unregister(request)
+                    client_address, _ = idle.pop(request)
+                    with self._counts_lock:
+                        self.idle_connections -= 1
+                    self.process_request(request, client_address)
+
+                now = time.monotonic()
+                while idle:
+                    request, (_, deadline) = next(iter(idle.items()))
+                    if deadline > now:
+                        break
+                    del idle[request]
+                    selector.unregister(request)
+                    self._drop_idle(request)
+        finally:
+            for request in idle:
+                self._drop_idle(request)
+            with self._counts_lock:
+                parking, self._parking = self._parking, []
+            for request, _ in parking:
+                self._drop_idle(request)
+            selector.close()
+
+    def _drop_idle(self, request):
+        with self._counts_lock:
+            self.idle_connections -= 1
+        self.shutdown_request(request)
+
+    # =================== LONG-POLL / SSE ===================
+    def acquire_push_slot(self):
+        if self.push_slots is None or not self.push_slots.acquire(blocking=False):
+            return False
+        with self._counts_lock:
+            self.push_clients += 1
+        return True
+
+    def release_push_slot(self):
+        with self._counts_lock:
+            self.push_clients -= 1
+        self.push_slots.release()
+
+    def server_close(self):
+        # Despertar a los clientes long-poll/SSE para que liberen sus hilos
+        self.closing.set()
+        game_bot = getattr(self.RequestHandlerClass, 'game_bot', None)
+        if game_bot is not None:
+            game_bot.wake_waiters()
+        self._wake()
+        self._idle_thread.join(timeout=5)
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+
+def make_handler(game_bot, keep_alive=True, keepalive_timeout=5.0, rate_limited=True,
+                 handler_class=GameDataHandler):
+    """Crear la clase de handler ligada a una instancia de PawPlayBot"""
+    attrs = {'game_bot': game_bot, 'rate_limited': rate_limited}
+    if keep_alive:
+        attrs['protocol_version'] = 'HTTP/1.1'
+        attrs['timeout'] = keepalive_timeout  # cierre de conexiones inactivas
+    return type('Bound' + handler_class.__name__, (handler_class,), attrs)
+
+
+def create_http_server(game_bot, host, port, mode='threaded', workers=16, backlog=64,
+                       keepalive_timeout=5.0, max_push=None, rate_limited=True):
+    """Crear el servidor HTTP en el modo indicado (sin arrancarlo)"""
+    if mode == 'single':
+        # Un solo hilo: sin keep-alive para que un cliente no acapare el servidor
+        return socketserver.TCPServer((host, port), make_handler(game_bot, keep_alive=False))
+    if mode != 'threaded':
+        raise ValueError(f"Modo de servidor HTTP desconocido: {mode}")
+    handler = make_handler(game_bot, keepalive_timeout=keepalive_timeout, rate_limited=rate_limited)
+    server = PooledHTTPServer((host, port), handler, workers=workers, backlog=backlog,
+                              max_pending=backlog, max_push=max_push)
+    metrics.gauge('pawplay_http_connections', 'Peticiones HTTP en curso', lambda: server.connections)
+    metrics.gauge('pawplay_http_idle_connections', 'Conexiones keep-alive esperando su siguiente petición',
+                  lambda: server.idle_connections)
+    metrics.gauge('pawplay_push_clients', 'Clientes long-poll/SSE esperando cambios',
+                  lambda: server.push_clients)
+    return server
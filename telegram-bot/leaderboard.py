@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Clasificaciones y agregados por jugador de PawPlay Bot
+Se actualizan con cada partida terminada en O(K) (K = tamaño del ranking,
+constante), así que /estadisticas y /ranking responden sin recorrer el
+historial por muchas partidas que se jueguen:
+
+  - totales por jugador y por dificultad (y por jugador y dificultad)
+  - récord de cada jugador por dificultad, total de aciertos y mejor racha
+  - rankings top-K de esas tres cosas (listas ordenadas de tamaño fijo)
+  - percentiles de la duración de las partidas con un resumen de cuantiles
+    de memoria acotada (cubos logarítmicos, error relativo del 2 %)
+
+Solo el diccionario de jugadores y los resúmenes se persisten; los rankings
+se reconstruyen al cargar.
+"""
+
+import math
+from bisect import bisect_left, insort
+
+DEFAULT_RANKING_SIZE = 10
+RELATIVE_ACCURACY = 0.02
+ALL_DIFFICULTIES = 'all'
+
+# Rankings (además del récord de cada dificultad)
+RANKING_CATCHES = 'catches'
+RANKING_STREAK = 'streak'
+
+
+def empty_totals():
+    return {"games": 0, "catches": 0, "misses": 0, "best": 0}
+
+
+class QuantileSketch:
+    """
+    Cuantiles aproximados de valores positivos: cada valor cuenta en el cubo
+    ceil(log_gamma(v)), así que el cuantil devuelto tiene como mucho un 2 % de
+    error relativo y el número de cubos crece con el logaritmo del rango
+    (de 1 s a una semana son ~330), no con el número de valores.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, buckets=None, zeros=0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {int(key): count for key, count in (buckets or {}).items()}
+        self.zeros = zeros  # valores <= 0
+        self.count = zeros + sum(self.buckets.values())
+
+    def add(self, value):
+        """Contar un valor (O(1))"""
+        if value <= 0:
+            self.zeros += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+
+    def quantile(self, q):
+        """Valor aproximado del cuantil q (0-1); None si no hay valores"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {"relative_accuracy": self.relative_accuracy, "zeros": self.zeros,
+                "buckets": {str(key): count for key, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('relative_accuracy', RELATIVE_ACCURACY), data.get('buckets'), data.get('zeros', 0))
+
+
+class TopK:
+    """
+    Los K mejores valores (uno por jugador) en una lista ordenada. Los valores
+    de un jugador solo suben (récords, aciertos acumulados, mejor racha), así
+    que quien sale del top-K no puede volver sin superar al último y basta con
+    guardar K entradas.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = []  # (-valor, jugador): el mejor primero, empates por nombre
+        self._values = {}
+
+    def update(self, player, value):
+        """Nuevo valor de un jugador (O(K))"""
+        old = self._values.get(player)
+        if old is not None:
+            if value <= old:
+                return
+            del self._entries[bisect_left(self._entries, (-old, player))]
+            del self._values[player]
+        entry = (-value, player)
+        if len(self._entries) >= self.size:
+            if entry >= self._entries[-1]:
+                return
+            _, dropped = self._entries.pop()
+            del self._values[dropped]
+        insort(self._entries, entry)
+        self._values[player] = value
+
+    def top(self, limit=None):
+        """[(jugador, valor)] de mejor a peor"""
+        return [(player, -value) for value, player in self._entries[:limit]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Leaderboard:
+    """Agregados por jugador y dificultad, rankings y duración de las partidas"""
+
+    def __init__(self, ranking_size=DEFAULT_RANKING_SIZE):
+        self.ranking_size = ranking_size
+        self.players = {}  # jugador -> totales, mejor racha y totales por dificultad
+        self.difficulties = {}  # dificultad -> totales
+        self.durations = {}  # dificultad (y ALL_DIFFICULTIES) -> QuantileSketch (segundos)
+        self.rankings = {RANKING_CATCHES: TopK(ranking_size), RANKING_STREAK: TopK(ranking_size)}
+
+    def record_game(self, player, difficulty, catches, misses, best_streak=0, duration=None, ts=None):
+        """Sumar una partida terminada (O(K))"""
+        totals = self.difficulties.setdefault(difficulty, empty_totals())
+        self._add(totals, catches, misses)
+        if duration is not None and duration >= 0:
+            for key in (difficulty, ALL_DIFFICULTIES):
+                sketch = self.durations.get(key)
+                if sketch is None:
+                    sketch = self.durations[key] = QuantileSketch()
+                sketch.add(duration)
+        if not player:
+            return
+        stats = self.players.get(player)
+        if stats is None:
+            stats = self.players[player] = {**empty_totals(), "best_streak": 0, "last_played": None,
+                                            "difficulties": {}}
+        self._add(stats, catches, misses)
+        by_difficulty = stats['difficulties'].setdefault(difficulty, empty_totals())
+        self._add(by_difficulty, catches, misses)
+        stats['best_streak'] = max(stats['best_streak'], best_streak)
+        if ts is not None:
+            stats['last_played'] = ts
+        self.ranking(difficulty).update(player, by_difficulty['best'])
+        self.rankings[RANKING_CATCHES].update(player, stats['catches'])
+        if stats['best_streak']:
+            self.rankings[RANKING_STREAK].update(player, stats['best_streak'])
+
+    @staticmethod
+    def _add(totals, catches, misses):
+        totals['games'] += 1
+        totals['catches'] += catches
+        totals['misses'] += misses
+        totals['best'] = max(totals['best'], catches)
+
+    def ranking(self, name):
+        """Ranking por nombre: una dificultad (récords), RANKING_CATCHES o RANKING_STREAK"""
+        ranking = self.rankings.get(name)
+        if ranking is None:
+            ranking = self.rankings[name] = TopK(self.ranking_size)
+        return ranking
+
+    def player(self, name):
+        """Agregados de un jugador (sin distinguir mayúsculas) -> (nombre, datos) o None"""
+        if name in self.players:
+            return name, self.players[name]
+        folded = name.casefold()
+        for player, stats in self.players.items():
+            if player.casefold() == folded:
+                return player, stats
+        return None
+
+    def duration_percentiles(self, difficulty=ALL_DIFFICULTIES, quantiles=(0.5, 0.9, 0.99)):
+        """{q: segundos} de la duración de las partidas (vacío si no hay datos)"""
+        sketch = self.durations.get(difficulty)
+        if sketch is None or not sketch.count:
+            return {}
+        return {q: sketch.quantile(q) for q in quantiles}
+
+    # =================== PERSISTENCIA ===================
+    def to_dict(self):
+        return {
+            "players": {player: {**stats, "difficulties": {d: dict(t) for d, t in stats['difficulties'].items()}}
+                        for player, stats in self.players.items()},
+            "difficulties": {difficulty: dict(totals) for difficulty, totals in self.difficulties.items()},
+            "durations": {key: sketch.to_dict() for key, sketch in self.durations.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data, ranking_size=DEFAULT_RANKING_SIZE):
+        """Recuperar los agregados y reconstruir los rankings (una vez, al arrancar)"""
+        leaderboard = cls(ranking_size)
+        leaderboard.difficulties = data.get('difficulties', {})
+        leaderboard.durations = {key: QuantileSketch.from_dict(sketch)
+                                 for key, sketch in data.get('durations', {}).items()}
+        leaderboard.players = data.get('players', {})
+        for player, stats in leaderboard.players.items():
+            for difficulty, totals in stats.get('difficulties', {}).items():
+                leaderboard.ranking(difficulty).update(player, totals['best'])
+            leaderboard.rankings[RANKING_CATCHES].update(player, stats['catches'])
+            if stats.get('best_streak'):
+                leaderboard.rankings[RANKING_STREAK].update(player, stats['best_streak'])
+        return leaderboard
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas de PawPlay Bot en formato de texto de Prometheus (GET /metrics)
+Contadores e histogramas de buckets fijos pensados para el camino de los
+toques: cada hilo suma en su propio fragmento (threading.local), así que
+observar un valor no toma ningún lock; los fragmentos se suman al exportar.
+"""
+
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Buckets en segundos
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LONG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """
+    Valores repartidos por hilo: escribir no necesita lock, leer suma todos.
+    Los fragmentos de hilos terminados (p. ej. el de cada compactación) se
+    suman a una base común y se liberan.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._shards = []  # (hilo, fragmento)
+        self._base = [0] * size  # lo sumado por hilos ya terminados
+        self._lock = threading.Lock()  # solo al crear el fragmento de un hilo nuevo y al leer
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = [0] * self._size
+            with self._lock:
+                self._fold_dead_threads()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead_threads(self):
+        """Pasar a la base los fragmentos de hilos terminados (requiere self._lock)"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                # El hilo ya no puede escribir: su fragmento es definitivo
+                for i, value in enumerate(shard):
+                    self._base[i] += value
+        self._shards = alive
+
+    def _totals(self):
+        with self._lock:
+            self._fold_dead_threads()
+            totals = list(self._base)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class CounterChild(_Sharded):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    @property
+    def value(self):
+        return self._totals()[0]
+
+
+class HistogramChild(_Sharded):
+    def __init__(self, bounds):
+        # [bucket_0 .. bucket_n, +Inf, suma]
+        super().__init__(len(bounds) + 2)
+        self._bounds = bounds
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[bisect_left(self._bounds, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """(conteos acumulados por bucket, total, suma)"""
+        totals = self._totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Serie de unos valores de etiqueta (conviene guardarla fuera del camino caliente)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for values, child in self._items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self):
+        lines = self._header()
+        bounds = [_format_value(float(b)) for b in self.buckets] + ["+Inf"]
+        for values, child in self._items():
+            cumulative, count, total = child.snapshot()
+            for bound, value in zip(bounds, cumulative):
+                labels = _format_labels(self.labelnames, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {value}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Valor leído al exportar: callback() -> número o {(etiquetas...): número}.
+    Para datos que ya se cuentan en otro sitio (sesiones, conexiones, comandos).
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind='gauge'):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error leyendo métrica {self.name}: {e}")
+            return lines
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for values, number in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(number)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas que se exportan juntas"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric, replace=False):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not replace:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Métrica duplicada: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        """Registrar (o sustituir) un gauge calculado al exportar"""
+        return self._add(CallbackMetric(name, documentation, callback, labelnames), replace=True)
+
+    def callback_counter(self, name, documentation, callback, labelnames=()):
+        """Registrar (o sustituir) un contador mantenido fuera del registro"""
+        return self._add(CallbackMetric(name, documentation, callback, labelnames, 'counter'),
+                         replace=True)
+
+    def render(self):
+        """Texto de exposición de Prometheus"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+# Registro del proceso, compartido por todos los módulos
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+callback_counter = REGISTRY.callback_counter
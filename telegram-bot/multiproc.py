@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+Modo multiproceso del servidor HTTP de PawPlay Bot (HTTP_PROCESSES > 1)
+Con un solo proceso todos los toques compiten por el GIL con Telegram y la
+persistencia. En este modo:
+
+- N procesos HTTP comparten el socket de escucha y atienden las rutas
+  calientes: /game-data (también long-poll y SSE) y los toques.
+- Cada toque solo suma 1 en un contador de memoria compartida
+  (multiprocessing.shared_memory) propio del proceso y del comedero: un
+  único escritor por contador, sin locks entre procesos ni RPC.
+- El proceso principal (el propietario) suma los contadores cada
+  HTTP_SYNC_INTERVAL_MS, aplica los toques a las sesiones (registro de
+  eventos, estadísticas, avisos, persistencia y Telegram siguen en un solo
+  sitio) y publica el JSON del estado en memoria compartida, de donde lo
+  leen los procesos HTTP para responder /game-data.
+- Las rutas poco frecuentes (/register-batch, /stats/timeseries, /metrics,
+  /admin/profile) se reenvían al servidor HTTP interno del propietario en
+  127.0.0.1: una petición por lote, nunca por toque.
+
+Cada bloque de estado se publica con un seqlock: el propietario incrementa
+`seq` (impar) antes de escribir y otra vez (par) al terminar; un lector que
+ve `seq` impar o distinto al final vuelve a leer. La app ve los toques con
+un retraso de como mucho un intervalo de sincronización.
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+
+import metrics
+from event_log import EVENT_CATCH
+from http_api import GameDataHandler, PooledHTTPServer, make_handler
+from ratelimit import TapLimiter
+from sessions import GameSnapshot, is_valid_feeder_id
+
+FEEDER_ID_SIZE = 32   # FEEDER_ID_PATTERN admite como mucho 32 caracteres ASCII
+ETAG_SIZE = 96
+BODY_SIZE = 1024      # JSON del estado; si no cabe, el proceso HTTP lo pide al propietario
+WAIT_STEP = 0.05      # s entre comprobaciones de versión en long-poll/SSE
+OWNER_TIMEOUT = 30.0
+RESPAWN_CHECK = 1.0   # s entre comprobaciones de procesos HTTP caídos
+
+# Palabras de 8 bytes: cabecera, bloque de cada proceso y bloque de cada comedero
+_MAGIC = 0x5057504C4159  # "PWPLAY"
+_HEADER_WORDS = 4        # magic, procesos, comederos máximos, comederos publicados
+_WORKER_WORDS = 4        # pid, toques, rechazados por ritmo, rebotes
+_SLOT_WORDS = 5          # seq, versión, flags, long. del cuerpo, long. del ETag
+_SLOT_BYTES = _SLOT_WORDS * 8 + FEEDER_ID_SIZE + ETAG_SIZE + BODY_SIZE
+_FLAG_ACTIVE = 0x01
+
+# Rutas que el proceso HTTP reenvía al propietario y cabeceras que viajan con ellas
+_PROXIED_GET = {'/metrics', '/admin/profile', '/stats/timeseries'}
+_FORWARDED_HEADERS = ('Accept', 'Accept-Encoding', 'Authorization', 'Content-Type', 'If-None-Match',
+                      'X-Admin-Token', 'X-Device-Id', 'X-Feeder-Id')
+_RETURNED_HEADERS = {name.lower(): name for name in ('Cache-Control', 'Content-Encoding', 'ETag',
+                                                     'Retry-After', 'Vary', 'X-State-Version')}
+
+
+class SharedGameState:
+    """
+    Región de memoria compartida entre el propietario y los procesos HTTP.
+    El propietario la crea (name=None) y registra sus sesiones; los procesos
+    HTTP se conectan por nombre.
+    """
+
+    def __init__(self, max_feeders, processes, name=None):
+        self.max_feeders = max_feeders
+        self.processes = processes
+        self._workers_at = _HEADER_WORDS
+        self._counters_at = self._workers_at + processes * _WORKER_WORDS
+        slots_at = (self._counters_at + max_feeders * processes * 2) * 8
+        self._slots_at = slots_at
+        size = slots_at + max_feeders * _SLOT_BYTES
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.buf = self.shm.buf
+        self.words = self.buf[:slots_at + max_feeders * _SLOT_BYTES].cast('Q')
+        if self.owner:
+            self.words[1], self.words[2] = processes, max_feeders
+            self.words[0] = _MAGIC
+            self.sessions = []   # comedero publicado en cada bloque (solo en el propietario)
+            self._published = []
+            self._seen = [0] * (max_feeders * processes * 2)
+            self._totals = [0] * processes
+            self._lock = threading.Lock()
+        elif self.words[0] != _MAGIC or self.words[1] != processes or self.words[2] != max_feeders:
+            self.close()
+            raise ValueError(f"Memoria compartida {name} con otro formato")
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        """Soltar la región (unlink=True además la borra: solo el propietario, al salir)"""
+        if self.buf is None:
+            return
+        self.words.release()
+        self.buf = self.words = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def _slot_offset(self, slot):
+        return self._slots_at + slot * _SLOT_BYTES
+
+    def _counter(self, slot, worker):
+        return self._counters_at + (slot * self.processes + worker) * 2
+
+    # =================== PROPIETARIO ===================
+    def register(self, session):
+        """Publicar un comedero nuevo (al crear su sesión); OverflowError si no cabe"""
+        feeder_id = session.feeder_id.encode('ascii')
+        with self._lock:
+            slot = len(self.sessions)
+            if slot >= self.max_feeders:
+                raise OverflowError(f"Máximo de {self.max_feeders} comederos en memoria compartida")
+            offset = self._slot_offset(slot) + _SLOT_WORDS * 8
+            self.buf[offset:offset + FEEDER_ID_SIZE] = feeder_id.ljust(FEEDER_ID_SIZE, b'\0')
+            self._published.append(None)
+            self._publish(slot, session)
+            self.sessions.append(session)
+            self.words[3] = slot + 1  # a partir de aquí los procesos HTTP lo ven
+
+    def collect(self):
+        """
+        Toques contados por los procesos HTTP desde la última llamada:
+        [(sesión, aciertos, fallos)]. Solo recorre los comederos si algún
+        proceso ha registrado toques nuevos.
+        """
+        words = self.words
+        changed = []
+        for worker in range(self.processes):
+            total = words[self._workers_at + worker * _WORKER_WORDS + 1]
+            if total != self._totals[worker]:
+                self._totals[worker] = total
+                changed.append(worker)
+        if not changed:
+            return []
+        seen = self._seen
+        result = []
+        for slot, session in enumerate(self.sessions[:]):
+            catches = misses = 0
+            for worker in changed:
+                index = self._counter(slot, worker)
+                seen_index = index - self._counters_at
+                catch_count, miss_count = words[index], words[index + 1]
+                catches += catch_count - seen[seen_index]
+                misses += miss_count - seen[seen_index + 1]
+                seen[seen_index], seen[seen_index + 1] = catch_count, miss_count
+            if catches or misses:
+                result.append((session, catches, misses))
+        return result
+
+    def publish_changes(self):
+        """Publicar el estado de los comederos cuya versión cambió; devuelve cuántos"""
+        published = 0
+        for slot, session in enumerate(self.sessions[:]):
+            if session.state_version != self._published[slot]:
+                self._publish(slot, session)
+                published += 1
+        return published
+
+    def _publish(self, slot, session):
+        snapshot = session.get_game_snapshot()
+        words = self.words
+        base = self._slot_offset(slot) // 8
+        offset = self._slot_offset(slot) + _SLOT_WORDS * 8 + FEEDER_ID_SIZE
+        etag = snapshot.etag.encode('ascii')[:ETAG_SIZE]
+        body = snapshot.body if len(snapshot.body) <= BODY_SIZE else b''
+        seq = words[base]
+        words[base] = seq + 1
+        words[base + 2] = _FLAG_ACTIVE if session.game_data.get('game_active', False) else 0
+        words[base + 3] = len(body)
+        words[base + 4] = len(etag)
+        self.buf[offset:offset + len(etag)] = etag
+        self.buf[offset + ETAG_SIZE:offset + ETAG_SIZE + len(body)] = body
+        words[base + 1] = snapshot.version
+        words[base] = seq + 2
+        self._published[slot] = snapshot.version
+
+    def worker_stats(self, worker):
+        """(pid, toques, rechazados por ritmo, rebotes) de un proceso HTTP"""
+        at = self._workers_at + worker * _WORKER_WORDS
+        return tuple(self.words[at:at + _WORKER_WORDS].tolist())
+
+    # =================== PROCESOS HTTP ===================
+    def feeder_count(self):
+        return self.words[3]
+
+    def feeder_id(self, slot):
+        offset = self._slot_offset(slot) + _SLOT_WORDS * 8
+        return bytes(self.buf[offset:offset + FEEDER_ID_SIZE]).rstrip(b'\0').decode('ascii')
+
+    def version(self, slot):
+        return self.words[self._slot_offset(slot) // 8 + 1]
+
+    def read(self, slot):
+        """(versión, activo, etag, cuerpo) consistentes; el cuerpo es b'' si no cupo"""
+        words = self.words
+        base = self._slot_offset(slot) // 8
+        offset = self._slot_offset(slot) + _SLOT_WORDS * 8 + FEEDER_ID_SIZE
+        while True:
+            seq = words[base]
+            if seq & 1:
+                time.sleep(0)  # el propietario está escribiendo
+                continue
+            version, flags, body_len, etag_len = words[base + 1:base + _SLOT_WORDS].tolist()
+            etag = bytes(self.buf[offset:offset + etag_len])
+            body = bytes(self.buf[offset + ETAG_SIZE:offset + ETAG_SIZE + body_len])
+            if words[base] == seq:
+                return version, bool(flags & _FLAG_ACTIVE), etag.decode('ascii'), body
+
+    def active(self, slot):
+        return bool(self.words[self._slot_offset(slot) // 8 + 2] & _FLAG_ACTIVE)
+
+    def add_tap(self, slot, worker, kind):
+        """Sumar un toque (el llamador serializa los hilos de su proceso)"""
+        index = self._counter(slot, worker) + (0 if kind == EVENT_CATCH else 1)
+        self.words[index] += 1
+        self.words[self._workers_at + worker * _WORKER_WORDS + 1] += 1
+
+    def set_worker_stats(self, worker, pid=None, limited=None, debounced=None):
+        at = self._workers_at + worker * _WORKER_WORDS
+        for offset, value in ((0, pid), (2, limited), (3, debounced)):
+            if value is not None:
+                self.words[at + offset] = value
+
+
+# =================== PROCESO PRINCIPAL ===================
+class WorkerPool:
+    """
+    Procesos HTTP del modo multiproceso, vistos desde el bot como un servidor
+    HTTP más (shutdown/server_close). Un hilo suma los toques, publica el
+    estado y vuelve a lanzar los procesos que se caen.
+    """
+
+    def __init__(self, shared, internal_server, host, port, backlog=64, sync_interval=0.02, options=None):
+        """
+        internal_server: servidor HTTP del propietario en 127.0.0.1 para las rutas reenviadas
+        options: configuración de cada proceso HTTP (hilos, keep-alive, límite de toques)
+        """
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.options = options or {}
+        self.internal = internal_server
+        self.socket = socket.create_server((host, port), backlog=backlog)
+        self.server_address = self.socket.getsockname()
+        self.applied = 0  # toques de los procesos HTTP aplicados a las sesiones
+        self._context = multiprocessing.get_context('spawn')  # sin heredar hilos ni locks del propietario
+        self._processes = []
+        self._stopping = threading.Event()
+        self._sync_lock = threading.Lock()  # sync() llega del hilo de sincronización y de los comandos
+        self._thread = None
+
+    def start(self):
+        """Lanzar los procesos HTTP y el hilo de sincronización"""
+        threading.Thread(target=self.internal.serve_forever, name="http-internal", daemon=True).start()
+        self._processes = [self._spawn(worker) for worker in range(self.shared.processes)]
+        self._thread = threading.Thread(target=self._run, name="shm-sync", daemon=True)
+        self._thread.start()
+        metrics.gauge('pawplay_http_processes', 'Procesos HTTP vivos', lambda: self.alive)
+        metrics.callback_counter('pawplay_worker_taps_total', 'Toques contados por cada proceso HTTP',
+                                 lambda: {(str(worker),): self.shared.worker_stats(worker)[1]
+                                          for worker in range(self.shared.processes)}, ('worker',))
+
+    @property
+    def alive(self):
+        return sum(1 for process in self._processes if process.is_alive())
+
+    def rejected(self):
+        """(por ritmo, por rebote) sumados de todos los procesos HTTP"""
+        stats = [self.shared.worker_stats(worker) for worker in range(self.shared.processes)]
+        return sum(s[2] for s in stats), sum(s[3] for s in stats)
+
+    def _spawn(self, worker):
+        process = self._context.Process(
+            target=worker_main, name=f"pawplay-http-{worker}", daemon=True,
+            args=(worker, self.socket, self.shared.name, self.shared.max_feeders, self.shared.processes,
+                  self.internal.server_address[1], os.getpid(), self.options))
+        process.start()
+        return process
+
+    def sync(self):
+        """Aplicar los toques pendientes y publicar los estados que cambiaron"""
+        with self._sync_lock:
+            now = time.time()
+            for session, catches, misses in self.shared.collect():
+                self.applied += session.register_taps(catches, misses, now)
+            self.shared.publish_changes()
+
+    def _run(self):
+        next_check = time.monotonic() + RESPAWN_CHECK
+        while not self._stopping.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error sincronizando los procesos HTTP: {e}")
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + RESPAWN_CHECK
+                for worker, process in enumerate(self._processes):
+                    if not process.is_alive() and not self._stopping.is_set():
+                        print(f"⚠️ Proceso HTTP {worker} terminado (código {process.exitcode}), relanzando")
+                        self._processes[worker] = self._spawn(worker)
+
+    def shutdown(self):
+        """Parar los procesos HTTP y aplicar sus últimos toques"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+        self.sync()
+        self.internal.shutdown()
+
+    def server_close(self):
+        self.socket.close()
+        self.internal.server_close()
+
+
+# =================== PROCESOS HTTP ===================
+class SharedSession:
+    """Vista de solo lectura de un comedero publicada por el propietario (proceso HTTP)"""
+
+    def __init__(self, worker, slot, feeder_id):
+        self.worker = worker
+        self.slot = slot
+        self.feeder_id = feeder_id
+        self._snapshot = None
+
+    @property
+    def state_version(self):
+        return self.worker.shared.version(self.slot)
+
+    def get_game_snapshot(self):
+        """Instantánea publicada; se reutiliza mientras no cambie la versión"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.state_version:
+            return snapshot
+        version, _, etag, body = self.worker.shared.read(self.slot)
+        if not body:
+            return self.worker.fetch_snapshot(self.feeder_id)  # demasiado grande para el bloque
+        snapshot = self._snapshot = GameSnapshot(version, body, etag)
+        return snapshot
+
+    def register_tap(self, kind):
+        """Contar un toque si el juego está activo (el propietario lo aplica en la próxima sincronización)"""
+        if not self.worker.shared.active(self.slot):
+            return False
+        with self.worker.taps_lock:
+            self.worker.shared.add_tap(self.slot, self.worker.index, kind)
+        return True
+
+    def wait_for_change(self, since, timeout, cancelled=None):
+        """Como GameSession.wait_for_change, comprobando la versión publicada cada WAIT_STEP"""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.state_version
+            if version != since or (cancelled is not None and cancelled()):
+                return version
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return version
+            time.sleep(min(WAIT_STEP, remaining))
+
+
+class WorkerBot:
+    """Lo que GameDataHandler necesita de PawPlayBot, dentro de un proceso HTTP"""
+
+    def __init__(self, index, shared, owner_port, options):
+        self.index = index
+        self.shared = shared
+        self.owner_port = owner_port
+        self.tap_limiter = TapLimiter(options.get('tap_rate', 20.0), options.get('tap_burst', 40),
+                                      options.get('tap_min_interval', 0.03), options.get('rate_limit_clients', 4096))
+        self.taps_lock = threading.Lock()
+        self._sessions = {}
+        self._scanned = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_session(self, feeder_id):
+        """Comedero publicado; si aún no existe, se pide al propietario que lo cree"""
+        session = self._sessions.get(feeder_id)
+        if session is not None:
+            return session
+        if not is_valid_feeder_id(feeder_id):
+            raise ValueError(f"Id de comedero inválido: {feeder_id!r}")
+        session = self._scan(feeder_id)
+        if session is None:
+            self.fetch_snapshot(feeder_id)  # el propietario crea y publica la sesión
+            session = self._scan(feeder_id)
+            if session is None:
+                raise OverflowError(f"Comedero {feeder_id} no publicado")
+        return session
+
+    def _scan(self, feeder_id):
+        """Leer los comederos publicados desde la última vez"""
+        with self._lock:
+            count = self.shared.feeder_count()
+            for slot in range(self._scanned, count):
+                name = self.shared.feeder_id(slot)
+                self._sessions[name] = SharedSession(self, slot, name)
+            self._scanned = count
+        return self._sessions.get(feeder_id)
+
+    def fetch_snapshot(self, feeder_id):
+        """GET /game-data al propietario; ValueError/OverflowError con su mensaje de error"""
+        status, headers, body = self.owner_request('GET', f'/game-data?feeder={feeder_id}')
+        if status != 200:
+            try:
+                error = json.loads(body).get('error')
+            except (ValueError, AttributeError):
+                error = None
+            raise (ValueError if status == 400 else OverflowError)(error or f"HTTP {status}")
+        headers = {name.lower(): value for name, value in headers}
+        return GameSnapshot(int(headers.get('x-state-version', 0)), body, headers.get('etag', ''))
+
+    def owner_request(self, method, path, headers=None, body=None):
+        """Petición al servidor interno del propietario (conexión keep-alive por hilo)"""
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.owner_port,
+                                                                      timeout=OWNER_TIMEOUT)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                return response.status, response.getheaders(), response.read()
+            except (OSError, http.client.HTTPException):
+                # Lo normal es una conexión keep-alive que el propietario ya cerró: reintentar una vez
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def wake_waiters(self):
+        pass  # los long-poll/SSE de este proceso comprueban server.closing en cada paso
+
+
+class WorkerHandler(GameDataHandler):
+    """Rutas calientes desde la memoria compartida; el resto se reenvía al propietario"""
+
+    def route_get(self, parsed_path):
+        if parsed_path.path in _PROXIED_GET:
+            self.proxy()
+        else:
+            super().route_get(parsed_path)
+
+    def route_post(self, parsed_path):
+        if parsed_path.path == '/register-batch' and not self.allow_tap(tap=False):
+            self.read_body()
+            return
+        body = self.read_body()
+        if body is None:
+            self.send_body(413, b'{"error": "body too large"}')
+            return
+        self.proxy(body)
+
+    def proxy(self, body=None):
+        headers = {name: self.headers[name] for name in _FORWARDED_HEADERS if name in self.headers}
+        try:
+            status, response_headers, data = self.game_bot.owner_request(self.command, self.path, headers, body)
+        except (OSError, http.client.HTTPException):
+            self.send_body(502, b'{"error": "proceso principal no disponible"}')
+            return
+        content_type = None
+        headers = {}
+        for name, value in response_headers:
+            lower = name.lower()
+            if lower == 'content-type':
+                content_type = value
+            elif lower in _RETURNED_HEADERS:
+                headers[_RETURNED_HEADERS[lower]] = value
+        self.send_body(status, data, content_type=content_type, headers=headers)
+
+
+class WorkerHTTPServer(PooledHTTPServer):
+    """PooledHTTPServer sobre el socket compartido; se cierra si el propietario desaparece"""
+
+    def __init__(self, listen_socket, handler_class, owner_pid, shared, bot, **kwargs):
+        super().__init__(listen_socket.getsockname(), handler_class, bind_and_activate=False, **kwargs)
+        self.socket.close()
+        # Varios procesos esperan en el mismo socket: el que pierde la carrera
+        # por accept() recibe EAGAIN en lugar de quedarse bloqueado
+        listen_socket.setblocking(False)
+        self.socket = listen_socket
+        self.owner_pid = owner_pid
+        self.shared = shared
+        self.bot = bot
+
+    def service_actions(self):
+        """Cada vuelta de serve_forever: publicar los rechazos y vigilar al propietario"""
+        limiter = self.bot.tap_limiter
+        self.shared.set_worker_stats(self.bot.index, limited=limiter.limited, debounced=limiter.debounced)
+        if os.getppid() != self.owner_pid:
+            raise KeyboardInterrupt
+
+
+def stop_worker(signum, frame):
+    raise KeyboardInterrupt
+
+
+def worker_main(index, listen_socket, shm_name, max_feeders, processes, owner_port, owner_pid, options):
+    """Punto de entrada de un proceso HTTP"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C lo gestiona el propietario
+    signal.signal(signal.SIGTERM, stop_worker)
+    shared = SharedGameState(max_feeders, processes, name=shm_name)
+    bot = WorkerBot(index, shared, owner_port, options)
+    handler = make_handler(bot, keepalive_timeout=options.get('keepalive_timeout', 5.0),
+                           handler_class=WorkerHandler)
+    server = WorkerHTTPServer(listen_socket, handler, owner_pid, shared, bot,
+                              workers=options.get('threads', 16), max_pending=options.get('backlog', 64),
+                              max_push=options.get('max_push'))
+    shared.set_worker_stats(index, pid=os.getpid())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        shared.close()
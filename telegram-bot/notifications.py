@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Avisos de eventos de juego para PawPlay Bot (/suscribir)
+Los chats suscritos reciben los inicios y finales de partida, los cambios de
+dificultad, los récords nuevos y los hitos de aciertos de un comedero (o de
+todos). Publicar un aviso solo encola una línea (O(1), sin locks de
+sesión ni red); un hilo la reparte entre los suscriptores y agrupa las
+ráfagas en un resumen por chat cada `digest_seconds`, y un pool acotado de
+hilos envía los resúmenes con turnos del outbox (mismo ritmo por chat y
+global que el resto de mensajes). Los chats que fallan se reintentan con
+espera exponencial y se dan de baja tras varios rechazos seguidos.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from outbox import RetryAfter, SendRejected
+
+# Tipos de aviso y sus nombres en /suscribir
+KIND_GAMES = 'partidas'
+KIND_RECORDS = 'records'
+KIND_MILESTONES = 'hitos'
+KIND_DIFFICULTY = 'dificultad'
+KINDS = (KIND_GAMES, KIND_RECORDS, KIND_MILESTONES, KIND_DIFFICULTY)
+KIND_ALIASES = {
+    'partidas': KIND_GAMES, 'games': KIND_GAMES,
+    'records': KIND_RECORDS, 'récords': KIND_RECORDS, 'record': KIND_RECORDS,
+    'hitos': KIND_MILESTONES, 'milestones': KIND_MILESTONES,
+    'dificultad': KIND_DIFFICULTY, 'difficulty': KIND_DIFFICULTY,
+}
+ALL_FEEDERS = '*'
+
+MAX_QUEUE = 10000        # avisos sin repartir; los más antiguos se descartan
+MAX_DIGEST_LINES = 20    # líneas por resumen; el resto se cuenta al final
+
+DELIVERED = metrics.counter('pawplay_notifications_sent_total', 'Resúmenes de avisos enviados')
+FAILURES = metrics.counter('pawplay_notifications_failures_total',
+                           'Envíos de avisos fallidos por motivo', ('reason',))
+_FAILED_RETRY_AFTER = FAILURES.labels('retry_after')
+_FAILED_REJECTED = FAILURES.labels('rejected')
+_FAILED_ERROR = FAILURES.labels('error')
+
+
+class _Subscription:
+    __slots__ = ('feeder_id', 'kinds')
+
+    def __init__(self, feeder_id, kinds):
+        self.feeder_id = feeder_id
+        self.kinds = frozenset(kinds)
+
+
+class _ChatDigest:
+    """Líneas pendientes de un chat y estado de sus envíos"""
+
+    __slots__ = ('lines', 'extra', 'due', 'sending', 'failures', 'retry_at')
+
+    def __init__(self):
+        self.lines = []
+        self.extra = 0         # líneas que no cupieron en el resumen
+        self.due = None        # instante de envío programado
+        self.sending = False
+        self.failures = 0      # fallos seguidos
+        self.retry_at = 0.0
+
+
+class Notifier:
+    """Reparto de avisos a los chats suscritos con resúmenes y espera por chat"""
+
+    def __init__(self, transport, workers=4, digest_seconds=2.0, rate=20.0, max_failures=5,
+                 backoff_base=30.0, backoff_max=3600.0, on_unsubscribe=None, pacer=None):
+        """
+        transport: send(chat_id, text) (mismo transporte que el outbox)
+        rate: resúmenes por segundo como máximo entre todos los chats (dentro del ritmo global del pacer)
+        on_unsubscribe(chat_id): llamado al dar de baja un chat que rechaza los mensajes
+        pacer: OutboundQueue cuyos turnos (reserve/retry_after) se respetan
+        """
+        self.transport = transport
+        self.pacer = pacer
+        self.workers = max(1, workers)
+        self.digest_seconds = digest_seconds
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.max_failures = max_failures
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_unsubscribe = on_unsubscribe
+
+        self.published = 0   # avisos publicados con algún suscriptor
+        self.dropped = 0     # avisos descartados por cola llena
+        self.delivered = 0   # resúmenes enviados
+        self.failed = 0      # resúmenes perdidos
+
+        self._subscriptions = {}  # chat_id -> _Subscription
+        self._by_feeder = {}      # feeder_id (o '*') -> set(chat_id)
+        self._queue = deque()     # (feeder_id, tipo, texto) sin repartir
+        self._digests = {}        # chat_id -> _ChatDigest
+        self._due = []            # heap de (instante, orden, chat_id)
+        self._order = itertools.count()
+        self._next_slot = 0.0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="notify")
+            self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Detener el reparto; los resúmenes pendientes se descartan"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # =================== SUSCRIPCIONES ===================
+    def subscribe(self, chat_id, feeder_id=ALL_FEEDERS, kinds=KINDS):
+        """Suscribir (o cambiar la suscripción de) un chat"""
+        with self._cond:
+            self._remove(chat_id)
+            self._subscriptions[chat_id] = _Subscription(feeder_id, kinds or KINDS)
+            self._by_feeder.setdefault(feeder_id, set()).add(chat_id)
+
+    def unsubscribe(self, chat_id):
+        """Dar de baja un chat; devuelve False si no estaba suscrito"""
+        with self._cond:
+            return self._remove(chat_id)
+
+    def subscription(self, chat_id):
+        """(comedero, tipos) de la suscripción del chat o None"""
+        subscription = self._subscriptions.get(chat_id)
+        if subscription is None:
+            return None
+        return subscription.feeder_id, sorted(subscription.kinds)
+
+    def subscriptions(self):
+        """Copia serializable de las suscripciones"""
+        with self._cond:
+            return {str(chat_id): {'feeder': s.feeder_id, 'kinds': sorted(s.kinds)}
+                    for chat_id, s in self._subscriptions.items()}
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def _remove(self, chat_id):
+        """(requiere self._cond)"""
+        subscription = self._subscriptions.pop(chat_id, None)
+        if subscription is None:
+            return False
+        chats = self._by_feeder.get(subscription.feeder_id)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self._by_feeder[subscription.feeder_id]
+        digest = self._digests.get(chat_id)
+        if digest is not None and not digest.sending:
+            del self._digests[chat_id]
+        return True
+
+    # =================== PUBLICACIÓN ===================
+    def publish(self, feeder_id, kind, text):
+        """Encolar un aviso (no bloquea: se puede llamar con el lock de una sesión tomado)"""
+        if not self._subscriptions:
+            return
+        with self._cond:
+            if self._stopped:
+                return
+            if len(self._queue) >= MAX_QUEUE:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((feeder_id, kind, text))
+            self.published += 1
+            self._cond.notify()
+
+    # =================== REPARTO ===================
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    if self._queue:
+                        break
+                    now = time.monotonic()
+                    if self._due and self._due[0][0] <= now:
+                        break
+                    self._cond.wait(self._due[0][0] - now if self._due else None)
+                events = list(self._queue)
+                self._queue.clear()
+                for feeder_id, kind, text in events:
+                    self._fan_out(feeder_id, kind, text)
+                self._submit_due()
+
+    def _fan_out(self, feeder_id, kind, text):
+        """Añadir el aviso al resumen de cada chat interesado (requiere self._cond)"""
+        now = time.monotonic()
+        for key in (feeder_id, ALL_FEEDERS):
+            for chat_id in self._by_feeder.get(key, ()):
+                if kind not in self._subscriptions[chat_id].kinds:
+                    continue
+                digest = self._digests.get(chat_id)
+                if digest is None:
+                    digest = self._digests[chat_id] = _ChatDigest()
+                if len(digest.lines) < MAX_DIGEST_LINES:
+                    digest.lines.append(text)
+                else:
+                    digest.extra += 1
+                if digest.due is None and not digest.sending:
+                    self._schedule(chat_id, digest, max(now + self.digest_seconds, digest.retry_at))
+
+    def _schedule(self, chat_id, digest, when):
+        digest.due = when
+        heapq.heappush(self._due, (when, next(self._order), chat_id))
+
+    def _submit_due(self):
+        """Pasar al pool los resúmenes cuyo momento llegó (requiere self._cond)"""
+        now = time.monotonic()
+        while self._due and self._due[0][0] <= now:
+            when, _, chat_id = heapq.heappop(self._due)
+            digest = self._digests.get(chat_id)
+            if digest is None or digest.sending or digest.due != when:
+                continue  # entrada antigua del heap
+            digest.due = None
+            if not digest.lines:
+                continue
+            lines, extra = digest.lines, digest.extra
+            digest.lines, digest.extra = [], 0
+            digest.sending = True
+            # Turno global: como mucho `rate` resúmenes por segundo
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            self._pool.submit(self._deliver, chat_id, lines, extra, slot)
+
+    @staticmethod
+    def _format(lines, extra):
+        if len(lines) == 1 and not extra:
+            return lines[0]
+        text = ["🔔 **Novedades:**"] + [f"• {line}" for line in lines]
+        if extra:
+            text.append(f"… y {extra} avisos más")
+        return "\n".join(text)
+
+    def _deliver(self, chat_id, lines, extra, slot):
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        retry_in = None
+        outcome = 'sent'
+        wait = self.pacer.chat_wait(chat_id) if self.pacer is not None else 0.0
+        try:
+            if wait > 0:
+                # El chat acaba de recibir otro mensaje: el resumen espera a su turno sin ocupar el hilo
+                outcome = 'retry'
+                retry_in = wait
+            else:
+                if self.pacer is not None:
+                    delay = self.pacer.reserve(chat_id)
+                    if delay > 0:
+                        time.sleep(delay)
+                self.transport.send(chat_id, self._format(lines, extra))
+                DELIVERED.inc()
+        except RetryAfter as e:
+            _FAILED_RETRY_AFTER.inc()
+            outcome = 'retry'
+            retry_in = float(e.retry_after)
+            if self.pacer is not None:
+                self.pacer.retry_after(chat_id, retry_in)
+        except SendRejected as e:
+            _FAILED_REJECTED.inc()
+            outcome = 'rejected'
+            print(f"Aviso rechazado por {chat_id}: {e}")
+        except Exception as e:
+            _FAILED_ERROR.inc()
+            outcome = 'error'
+            print(f"Error enviando aviso a {chat_id}: {e}")
+
+        unsubscribed = False
+        with self._cond:
+            digest = self._digests.get(chat_id)
+            if digest is None:
+                return
+            digest.sending = False
+            now = time.monotonic()
+            if outcome == 'sent':
+                self.delivered += 1
+                digest.failures = 0
+                digest.retry_at = 0.0
+            elif outcome == 'retry':
+                # 429: las mismas líneas vuelven delante de las nuevas
+                merged = lines + digest.lines
+                digest.extra += extra + max(0, len(merged) - MAX_DIGEST_LINES)
+                digest.lines = merged[:MAX_DIGEST_LINES]
+                digest.retry_at = now + retry_in
+            else:
+                self.failed += 1
+                digest.failures += 1
+                digest.retry_at = now + min(self.backoff_base * 2 ** (digest.failures - 1), self.backoff_max)
+                if outcome == 'rejected' and digest.failures >= self.max_failures:
+                    unsubscribed = self._remove(chat_id)
+
+            if chat_id not in self._subscriptions:
+                self._digests.pop(chat_id, None)
+            elif digest.lines:
+                self._schedule(chat_id, digest, max(now + self.digest_seconds, digest.retry_at))
+                self._cond.notify()
+            elif not digest.failures:
+                del self._digests[chat_id]  # sin pendientes ni fallos: no guardar estado
+        if unsubscribed:
+            print(f"🔕 Chat {chat_id} dado de baja de los avisos tras {self.max_failures} rechazos")
+            if self.on_unsubscribe is not None:
+                self.on_unsubscribe(chat_id)
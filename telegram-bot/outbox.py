@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de mensajes salientes de PawPlay Bot
+Los comandos solo encolan sus respuestas; un pequeño pool de hilos las envía
+respetando los límites de Telegram (por chat y global), une mensajes
+consecutivos al mismo chat y reintenta con espera ante errores 429 o de red.
+Así, un sendMessage lento no frena el procesamiento de los comandos.
+
+El envío real lo hace un transporte con un método
+send(chat_id, text, **kwargs); en pruebas se puede sustituir por uno local.
+Quien llama a Telegram por su cuenta (el marcador en vivo, los avisos) pide
+turno con reserve() y avisa de los 429 con retry_after(), de modo que el
+ritmo por chat y global se controla en un solo sitio.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+import metrics
+
+MAX_MESSAGE_LENGTH = 4096  # límite de Telegram por mensaje
+MERGE_SEPARATOR = "\n\n"
+MAX_IDLE_CHATS = 1024  # a partir de aquí se olvidan los chats sin mensajes pendientes
+
+SEND_SECONDS = metrics.histogram('pawplay_telegram_send_duration_seconds',
+                                 'Duración de cada intento de sendMessage',
+                                 buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+SEND_FAILURES = metrics.counter('pawplay_telegram_send_failures_total',
+                                'Intentos de sendMessage fallidos por motivo', ('reason',))
+_FAILED_RETRY_AFTER = SEND_FAILURES.labels('retry_after')
+_FAILED_REJECTED = SEND_FAILURES.labels('rejected')
+_FAILED_ERROR = SEND_FAILURES.labels('error')
+
+
+class RetryAfter(Exception):
+    """Telegram pidió esperar `retry_after` segundos (HTTP 429)"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SendRejected(Exception):
+    """Telegram rechazó el mensaje (chat inexistente, bot bloqueado...): no se reintenta"""
+
+
+class TelepotTransport:
+    """Transporte real: sendMessage de telepot con sus errores traducidos"""
+
+    def __init__(self, bot):
+        from telepot.exception import TelegramError, TooManyRequestsError
+        self.bot = bot
+        self._telegram_error = TelegramError
+        self._too_many_requests = TooManyRequestsError
+
+    def send(self, chat_id, text, **kwargs):
+        return self._call(self.bot.sendMessage, chat_id, text, **kwargs)
+
+    def edit(self, chat_id, message_id, text, **kwargs):
+        """editMessageText; un texto idéntico al actual no es un error"""
+        try:
+            return self._call(self.bot.editMessageText, (chat_id, message_id), text, **kwargs)
+        except SendRejected as e:
+            if 'not modified' in str(e):
+                return None
+            raise
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except self._too_many_requests as e:
+            parameters = (getattr(e, 'json', None) or {}).get('parameters', {})
+            raise RetryAfter(parameters.get('retry_after', 1))
+        except self._telegram_error as e:
+            if (getattr(e, 'error_code', 0) or 0) >= 500:
+                raise  # error del servidor de Telegram: reintentar
+            raise SendRejected(str(e))
+
+
+class _ChatOutbox:
+    """Mensajes pendientes de un chat y cuándo puede recibir el siguiente"""
+
+    __slots__ = ('messages', 'next_send', 'scheduled', 'busy')
+
+    def __init__(self):
+        self.messages = deque()  # (texto, kwargs, intento)
+        self.next_send = 0.0
+        self.scheduled = False
+        self.busy = False
+
+
+class OutboundQueue:
+    """Cola de envío con pool de hilos y control de ritmo por chat y global"""
+
+    def __init__(self, transport, workers=2, chat_interval=1.0, group_interval=3.0,
+                 global_rate=30.0, max_retries=5, backoff_base=0.5, backoff_max=30.0):
+        """
+        chat_interval / group_interval: segundos mínimos entre envíos al mismo
+        chat privado / grupo (Telegram: ~1 msg/s por chat, 20 msg/min por grupo)
+        global_rate: mensajes por segundo como máximo entre todos los chats
+        """
+        self.transport = transport
+        self.workers = max(1, workers)
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.sent = 0        # envíos correctos a Telegram
+        self.merged = 0      # mensajes unidos a otro anterior
+        self.retries = 0
+        self.failed = 0      # mensajes descartados
+        self._pending = 0    # mensajes encolados o en envío
+
+        self._chats = {}
+        self._ready = []  # heap de (instante, orden, chat_id)
+        self._order = itertools.count()
+        self._global_next = 0.0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Iniciar los hilos de envío"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def send(self, chat_id, text, **kwargs):
+        """Encolar un mensaje (no bloquea)"""
+        with self._cond:
+            if not self._stopped:
+                box = self._box(chat_id)
+                box.messages.append((text, kwargs, 0))
+                self._pending += 1
+                if not box.scheduled and not box.busy:
+                    self._schedule(chat_id, box)
+                return
+        # Tras close() ya no quedan hilos: enviar directamente
+        self._deliver(chat_id, text, kwargs, self.max_retries)
+
+    # =================== ENVÍOS FUERA DE LA COLA ===================
+    def chat_wait(self, chat_id):
+        """Segundos hasta que el chat puede recibir otro mensaje (0 si ya puede)"""
+        with self._cond:
+            box = self._chats.get(chat_id)
+            return max(0.0, box.next_send - time.monotonic()) if box is not None else 0.0
+
+    def reserve(self, chat_id):
+        """
+        Tomar el próximo turno del chat y el global para un envío que no pasa
+        por la cola (sendMessage o editMessageText); devuelve los segundos que
+        hay que esperar antes de hacerlo.
+        """
+        with self._cond:
+            box = self._box(chat_id)
+            now = time.monotonic()
+            slot = max(now, box.next_send, self._global_next)
+            self._global_next = slot + self.global_interval
+            box.next_send = slot + self._interval(chat_id)
+        return slot - now
+
+    def retry_after(self, chat_id, seconds):
+        """Telegram pidió esperar (429) a un envío fuera de la cola: el chat espera también aquí"""
+        with self._cond:
+            box = self._box(chat_id)
+            box.next_send = max(box.next_send, time.monotonic() + seconds)
+
+    @property
+    def pending(self):
+        """Mensajes aún no enviados"""
+        return self._pending
+
+    def wait_idle(self, timeout=None):
+        """Esperar a que se hayan enviado todos los mensajes encolados"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=5.0):
+        """Enviar lo pendiente (hasta `timeout` segundos) y detener los hilos"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        if self._pending:
+            print(f"⚠️ {self._pending} mensajes sin enviar al cerrar")
+
+    # =================== HILOS DE ENVÍO ===================
+    def _box(self, chat_id):
+        """Estado del chat, creado si falta (requiere self._cond)"""
+        box = self._chats.get(chat_id)
+        if box is None:
+            if len(self._chats) >= MAX_IDLE_CHATS:
+                self._forget_idle_chats()
+            box = self._chats[chat_id] = _ChatOutbox()
+        return box
+
+    def _schedule(self, chat_id, box):
+        """Poner el chat en la cola de listos (requiere self._cond)"""
+        box.scheduled = True
+        heapq.heappush(self._ready, (box.next_send, next(self._order), chat_id))
+        self._cond.notify()
+
+    def _forget_idle_chats(self):
+        """Quitar los chats sin pendientes cuyo intervalo ya pasó (requiere self._cond)"""
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, box in self._chats.items()
+                        if not box.messages and not box.busy and box.next_send <= now]:
+            del self._chats[chat_id]
+
+    def _interval(self, chat_id):
+        # Los grupos y canales tienen id negativo
+        return self.group_interval if chat_id < 0 else self.chat_interval
+
+    def _take(self, box):
+        """Sacar el siguiente mensaje, unido a los consecutivos compatibles"""
+        text, kwargs, attempt = box.messages.popleft()
+        count = 1
+        while box.messages:
+            next_text, next_kwargs, next_attempt = box.messages[0]
+            if (next_kwargs != kwargs or next_attempt
+                    or len(text) + len(MERGE_SEPARATOR) + len(next_text) > MAX_MESSAGE_LENGTH):
+                break
+            box.messages.popleft()
+            text = text + MERGE_SEPARATOR + next_text
+            count += 1
+        return text, kwargs, attempt, count
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._ready and self._ready[0][0] <= now:
+                        _, _, chat_id = heapq.heappop(self._ready)
+                        box = self._chats[chat_id]
+                        if box.next_send <= now:
+                            break
+                        # reserve() o retry_after() movieron el turno del chat después de encolarlo
+                        heapq.heappush(self._ready, (box.next_send, next(self._order), chat_id))
+                        continue
+                    if self._stopped and not self._ready:
+                        return
+                    self._cond.wait(self._ready[0][0] - now if self._ready else None)
+                box.scheduled = False
+                box.busy = True
+                text, kwargs, attempt, count = self._take(box)
+                self.merged += count - 1
+                # Turno global: como máximo global_rate envíos por segundo entre todos los hilos
+                slot = max(now, self._global_next)
+                self._global_next = slot + self.global_interval
+                box.next_send = slot + self._interval(chat_id)  # visible para reserve() durante el envío
+
+            delay = slot - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            retry_in = self._deliver(chat_id, text, kwargs, attempt)
+
+            with self._cond:
+                box.busy = False
+                now = time.monotonic()
+                if retry_in is None:
+                    self._pending -= count
+                    box.next_send = max(box.next_send, now + self._interval(chat_id))
+                else:
+                    # El mensaje unido se reintenta tal cual, delante de los demás
+                    self._pending -= count - 1
+                    box.messages.appendleft((text, kwargs, attempt + 1))
+                    box.next_send = max(box.next_send, now + retry_in)
+                if box.messages:
+                    self._schedule(chat_id, box)
+                if self._pending == 0:
+                    self._cond.notify_all()
+
+    def _deliver(self, chat_id, text, kwargs, attempt):
+        """Enviar un mensaje; devuelve None si terminó o los segundos hasta reintentar"""
+        start = time.perf_counter()
+        try:
+            self.transport.send(chat_id, text, **kwargs)
+            SEND_SECONDS.observe(time.perf_counter() - start)
+            with self._cond:  # contadores compartidos por los hilos de envío
+                self.sent += 1
+            return None
+        except RetryAfter as e:
+            _FAILED_RETRY_AFTER.inc()
+            if attempt >= self.max_retries:
+                error = e
+            else:
+                with self._cond:
+                    self.retries += 1
+                return max(float(e.retry_after), self.backoff_base)
+        except SendRejected as e:
+            _FAILED_REJECTED.inc()
+            with self._cond:
+                self.failed += 1
+            print(f"Error enviando mensaje a {chat_id}: {e}")
+            return None
+        except Exception as e:
+            SEND_SECONDS.observe(time.perf_counter() - start)
+            _FAILED_ERROR.inc()
+            if attempt >= self.max_retries:
+                error = e
+            else:
+                with self._cond:
+                    self.retries += 1
+                return min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        with self._cond:
+            self.failed += 1
+        print(f"Error enviando mensaje a {chat_id} tras {attempt + 1} intentos: {error}")
+        return None
@@ -8,81 +8,339 @@ Autores: Santiago Escobar y Jojhan Perez Arroyave
 Universidad de Caldas - Automatización y Control de Procesos
 """
 
+import copy
+import hmac
 import json
-import os
+import signal
+import sys
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
-import telepot
-from dotenv import load_dotenv
-
-# Cargar variables de entorno
-load_dotenv()
+import metrics
+from commands import CommandRegistry
+from config import Config
+from event_log import (EVENT_CATCH, EVENT_DIFFICULTY, EVENT_MISS, EVENT_RESET,
+                       EVENT_START, EVENT_STOP, decode_stop, encode_stop,
+                       encode_text)
+from http_api import create_http_server
+from leaderboard import RANKING_CATCHES, RANKING_STREAK, Leaderboard
+from notifications import (ALL_FEEDERS, KIND_ALIASES, KIND_DIFFICULTY, KIND_GAMES,
+                           KIND_MILESTONES, KIND_RECORDS, KINDS, Notifier)
+from outbox import OutboundQueue, TelepotTransport
+from persistence import SnapshotFlusher, SnapshotStore
+from profiling import Profiler
+from ratelimit import DEBOUNCED, LIMITED, TapLimiter
+from scheduler import REPEAT_ALIASES, REPEAT_DAILY, STOP_IDLE, PlayScheduler, Timers
+from scoreboard import LiveScoreboard
+from sessions import (DEFAULT_FEEDER, GAME_CONTEXT_KEY, LOG_SEQ_KEY, GameSession, SessionRegistry,
+                      apply_game_event, default_game_data, game_context, is_valid_feeder_id)
+from timeseries import sparkline
 
 # =================== CONFIGURACIÓN ===================
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-if not TELEGRAM_TOKEN:
-    raise ValueError("❌ Error: TELEGRAM_BOT_TOKEN no encontrado en .env")
-
-HTTP_PORT = int(os.getenv('HTTP_PORT', 8765))
+# Archivos de datos (relativos al directorio de trabajo)
 GAME_DATA_FILE = "game_data.json"
 STATS_FILE = "game_stats.json"
+EVENT_LOG_FILE = "game_events.log"  # registro append-only, se compacta en las instantáneas
+CHAT_FEEDERS_FILE = "chat_feeders.json"
+SCOREBOARDS_FILE = "scoreboards.json"
+NOTIFICATIONS_FILE = "notifications.json"
+SCHEDULES_FILE = "schedules.json"
 
-# Servidor HTTP simple para la app
-import http.server
-import json
-import socketserver
-from urllib.parse import parse_qs, urlparse
+# Aciertos de una partida que generan un aviso de hito (después, cada 1000)
+CATCH_MILESTONES = frozenset((10, 25, 50, 100, 250, 500, 1000))
+PROFILE_DEFAULT_SECONDS = 30
+
+
+# Argumentos de /dificultad
+DIFFICULTY_NAMES = {
+    'facil': 'easy', 'fácil': 'easy', 'easy': 'easy',
+    'medio': 'medium', 'medium': 'medium',
+    'dificil': 'hard', 'difícil': 'hard', 'hard': 'hard',
+}
+
+# Argumentos de /ranking además de las dificultades
+RANKING_NAMES = {
+    'aciertos': RANKING_CATCHES, 'catches': RANKING_CATCHES, 'total': RANKING_CATCHES,
+    'racha': RANKING_STREAK, 'rachas': RANKING_STREAK, 'streak': RANKING_STREAK,
+}
+RANKING_MEDALS = ("🥇", "🥈", "🥉")
+
+# Filtros de /estadisticas (español / inglés)
+STATS_FILTERS = {
+    'jugador': 'player', 'player': 'player',
+    'dificultad': 'difficulty', 'difficulty': 'difficulty',
+    'comedero': 'feeder', 'feeder': 'feeder',
+    'desde': 'since', 'from': 'since',
+    'hasta': 'until', 'to': 'until',
+}
 
 
 # =================== CLASE PRINCIPAL ===================
+# Tipos de contenido de un mensaje de Telegram (mismo orden que telepot.glance)
+CONTENT_TYPES = ['text', 'audio', 'document', 'game', 'photo', 'sticker', 'video', 'voice',
+                 'video_note', 'contact', 'location', 'venue', 'new_chat_member',
+                 'left_chat_member', 'new_chat_title', 'new_chat_photo', 'delete_chat_photo',
+                 'group_chat_created', 'supergroup_chat_created', 'channel_chat_created',
+                 'migrate_to_chat_id', 'migrate_from_chat_id', 'pinned_message',
+                 'new_chat_members', 'invoice', 'successful_payment']
+
+
+def glance(msg):
+    """(tipo de contenido, tipo de chat, chat_id) de un mensaje, con cualquier transporte"""
+    content_type = next((key for key in CONTENT_TYPES if msg.get(key)), None)
+    return content_type, msg['chat']['type'], msg['chat']['id']
+
+
 class PawPlayBot:
-    def __init__(self):
-        self.bot = telepot.Bot(TELEGRAM_TOKEN)
-        self.game_data = self.load_game_data()
-        self.stats = self.load_stats()
+    def __init__(self, config=None):
+        """config: Config del bot (por defecto, Config.from_env() con el entorno y .env)"""
+        init_start = time.perf_counter()
+        self.config = config = config if config is not None else Config.from_env()
+        self.httpd = None
+        self.worker_pool = None
+        self.closed = False
+        # Sin transporte de Telegram solo se sirve la API HTTP con el estado local
+        self.headless = config.telegram_transport == 'none'
+        self.bot = None
+        self.telegram = None
+        transport = None
+        if not self.headless:
+            if not config.telegram_token:
+                raise ValueError("❌ Error: TELEGRAM_BOT_TOKEN no encontrado en .env")
+            # Las librerías de Telegram se importan solo si se usan (arranque más rápido)
+            if config.telegram_transport == 'asyncio':
+                from telegram_async import AsyncTelegram
+                self.telegram = transport = AsyncTelegram(config.telegram_token, config.telegram_api_url,
+                                                          config.update_concurrency)
+            else:
+                import telepot
+                self.bot = telepot.Bot(config.telegram_token)
+                transport = TelepotTransport(self.bot)
+        # Las respuestas se encolan; los hilos del outbox las envían a Telegram
+        self.outbox = OutboundQueue(transport, config.outbox_workers, config.telegram_chat_interval,
+                                    config.telegram_group_interval, config.telegram_global_rate)
+        if not self.headless:
+            self.outbox.start()
+        # Marcadores en vivo: un hilo propio edita los mensajes (editMessageText) con los turnos del outbox
+        self.scoreboard = LiveScoreboard(transport, self.render_scoreboard, config.scoreboard_interval,
+                                         pacer=self.outbox)
+        # Avisos a los chats suscritos: reparto y resúmenes fuera del camino de los toques, con los turnos del outbox
+        self.notifier = Notifier(transport, config.notify_workers, config.notify_digest_seconds,
+                                 config.notify_rate,
+                                 on_unsubscribe=lambda chat_id: self.notifications_store.mark_dirty(),
+                                 pacer=self.outbox)
+        # Partidas programadas y paradas por inactividad: un solo hilo para todos los temporizadores
+        self.timers = Timers()
+        self.scheduler = PlayScheduler(self.timers, self.run_scheduled_start, self.run_scheduled_stop,
+                                       config.idle_stop_minutes,
+                                       on_change=lambda: self.schedules_store.mark_dirty())
+        self.game_chats = {}  # comedero -> chat que inició la partida en curso (aviso de inactividad)
+        self.batch_max_events = config.batch_max_events
+        self.tap_limiter = TapLimiter(config.tap_rate_limit, config.tap_burst,
+                                      config.tap_min_interval_ms / 1000, config.rate_limit_clients)
         self.authorized_users = set()  # Para futuras mejoras de seguridad
-        
-    def load_game_data(self):
-        """Cargar datos del juego desde archivo"""
+        self.commands = self.build_commands()
+        self.profiler = Profiler(config.profile_dir)  # sin hilos ni hooks hasta que se pide un perfil
+        self.admin_enabled = config.admin_token is not None
+        self.profile_default_seconds = PROFILE_DEFAULT_SECONDS
+        self.flusher = SnapshotFlusher(config.persist_flush_interval)
+        self.history = None
+        if config.history_backend == 'sqlite':
+            from history_store import HistoryStore
+            self.history = HistoryStore(config.history_db_file)
+            self.history.start()
+
+        # Estadísticas globales: lock propio (orden de locks: sesión -> estadísticas)
+        self.stats_lock = threading.RLock()
+        self.stats = self.load_stats()
+        self.stats_store = SnapshotStore(STATS_FILE, self.snapshot_stats, config.persist_flush_interval,
+                                         config.persist_flush_threshold, self.flusher)
+
+        # Comedero asignado a cada chat
+        self.chat_feeders = self.load_chat_feeders()
+        self.chat_feeders_store = SnapshotStore(CHAT_FEEDERS_FILE, self.snapshot_chat_feeders,
+                                                config.persist_flush_interval, config.persist_flush_threshold,
+                                                self.flusher)
+
+        # Modo multiproceso: los procesos HTTP leen el estado de memoria compartida
+        self.shared = None
+        if config.http_processes > 1:
+            from multiproc import SharedGameState
+            self.shared = SharedGameState(config.max_sessions, config.http_processes)
+        self.sessions = SessionRegistry(self.create_session, config.max_sessions)
+        self.sessions.get(DEFAULT_FEEDER)
+        self.load_sessions()
+
+        self.scoreboards_store = SnapshotStore(SCOREBOARDS_FILE, self.scoreboard.subscriptions,
+                                               config.persist_flush_interval, config.persist_flush_threshold,
+                                               self.flusher)
+        self.notifications_store = SnapshotStore(NOTIFICATIONS_FILE, self.notifier.subscriptions,
+                                                 config.persist_flush_interval, config.persist_flush_threshold,
+                                                 self.flusher)
+        self.schedules_store = SnapshotStore(SCHEDULES_FILE, self.scheduler.snapshot,
+                                             config.persist_flush_interval, config.persist_flush_threshold,
+                                             self.flusher)
+        self.load_schedules()
+        self.timers.start()
+        if not self.headless:
+            # Sin Telegram no hay a quién enviar marcadores ni avisos
+            self.load_scoreboards()
+            self.scoreboard.start()
+            self.load_notifications()
+            self.notifier.start()
+        self.flusher.start()
+        self.register_metrics()
+        self.init_seconds = time.perf_counter() - init_start
+
+    def register_metrics(self):
+        """Métricas calculadas al exportar /metrics (no cuestan nada en el camino de los toques)"""
+        metrics.gauge('pawplay_sessions', 'Comederos cargados', lambda: len(self.sessions))
+        metrics.gauge('pawplay_games_active', 'Comederos con partida en curso',
+                      lambda: sum(1 for s in self.sessions.all() if s.game_data.get('game_active')))
+        metrics.gauge('pawplay_outbox_pending', 'Mensajes de Telegram en cola', lambda: self.outbox.pending)
+        metrics.gauge('pawplay_scheduler_timers', 'Temporizadores de horarios e inactividad armados',
+                      lambda: len(self.timers))
+        metrics.gauge('pawplay_players', 'Jugadores con partidas terminadas', lambda: len(self.leaderboard.players))
+        metrics.callback_counter('pawplay_telegram_messages_sent_total', 'Mensajes enviados a Telegram',
+                                 lambda: self.outbox.sent)
+        metrics.callback_counter('pawplay_taps_rejected_total',
+                                 'Toques HTTP rechazados por límite de ritmo o rebote',
+                                 lambda: dict(zip(((LIMITED,), (DEBOUNCED,)), self.rejected_taps())), ('reason',))
+        metrics.callback_counter('pawplay_commands_total', 'Comandos ejecutados', lambda: {
+            (c.name,): c.stats.calls for c in self.commands.commands() if c.stats.calls}, ('command',))
+        metrics.callback_counter('pawplay_command_seconds_total', 'Tiempo total en cada comando', lambda: {
+            (c.name,): c.stats.total_time for c in self.commands.commands() if c.stats.calls}, ('command',))
+
+    def send(self, chat_id, text, **kwargs):
+        """Encolar un mensaje para el chat (no espera a Telegram)"""
+        if self.headless:
+            return  # modo headless: solo la API HTTP
+        self.outbox.send(chat_id, text, **kwargs)
+
+    # =================== SESIONES POR COMEDERO ===================
+    def create_session(self, feeder_id):
+        """Crear la sesión de un comedero y recuperar su registro de eventos"""
+        config = self.config
+        if feeder_id == DEFAULT_FEEDER:
+            data_file, log_file, archive_file = GAME_DATA_FILE, EVENT_LOG_FILE, config.event_archive_file
+        else:
+            directory = Path(config.sessions_dir) / feeder_id
+            directory.mkdir(parents=True, exist_ok=True)
+            data_file = directory / GAME_DATA_FILE
+            log_file = directory / EVENT_LOG_FILE
+            archive_file = directory / config.event_archive_file if config.event_archive_file else None
+        session = GameSession(feeder_id, data_file, log_file, archive_file, config.event_log_max_bytes,
+                              config.persist_flush_interval, config.persist_flush_threshold, self.flusher,
+                              config.batch_dedup_size, on_event=self.on_session_event,
+                              on_compact=lambda: self.stats_store.flush(force=True))
+        with self.stats_lock:
+            stats_seq = self.stats_seqs.get(feeder_id, 0)
+            context = self.replay_context(session)
+        # Las estadísticas pueden ir por detrás de la instantánea del comedero: cada
+        # partida terminada se registra con el estado que tenía el comedero al pararla
+        for seq, ts, kind, payload in session.replay(stats_seq):
+            apply_game_event(context, kind, payload, ts)
+            if kind in (EVENT_STOP, EVENT_RESET):  # los toques no cambian las estadísticas globales
+                self.apply_stats_event(session, seq, kind, payload, ts, context)
+        if self.shared is not None:
+            self.shared.register(session)
+        return session
+
+    def load_sessions(self):
+        """Cargar los comederos guardados en SESSIONS_DIR"""
+        directory = Path(self.config.sessions_dir)
+        if not directory.is_dir():
+            return
+        for entry in sorted(directory.iterdir()):
+            if entry.is_dir() and is_valid_feeder_id(entry.name):
+                try:
+                    self.sessions.get(entry.name)
+                except Exception as e:
+                    print(f"Error cargando comedero {entry.name}: {e}")
+
+    def get_session(self, feeder_id=DEFAULT_FEEDER):
+        """Sesión de un comedero (se crea la primera vez que aparece)"""
+        return self.sessions.get(feeder_id or DEFAULT_FEEDER)
+
+    def session_for_chat(self, chat_id):
+        """Sesión del comedero asignado a un chat"""
+        return self.get_session(self.chat_feeders.get(str(chat_id), DEFAULT_FEEDER))
+
+    def load_chat_feeders(self):
+        """Cargar la asignación chat -> comedero"""
         try:
-            if Path(GAME_DATA_FILE).exists():
-                with open(GAME_DATA_FILE, 'r', encoding='utf-8') as f:
+            if Path(CHAT_FEEDERS_FILE).exists():
+                with open(CHAT_FEEDERS_FILE, 'r', encoding='utf-8') as f:
                     return json.load(f)
         except Exception as e:
-            print(f"Error cargando datos: {e}")
-        
-        # Datos por defecto
-        return {
-            "difficulty": "medium",
-            "game_active": False,
-            "current_player": None,
-            "session_stats": {
-                "catches": 0,
-                "misses": 0,
-                "start_time": None
-            }
-        }
-    
-    def save_game_data(self):
-        """Guardar datos del juego"""
+            print(f"Error cargando comederos de los chats: {e}")
+        return {}
+
+    def snapshot_chat_feeders(self):
+        """Copia de la asignación chat -> comedero para persistir"""
+        return dict(self.chat_feeders)
+
+    def load_scoreboards(self):
+        """Recuperar las suscripciones al marcador en vivo"""
         try:
-            with open(GAME_DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.game_data, f, indent=2, ensure_ascii=False)
+            if Path(SCOREBOARDS_FILE).exists():
+                with open(SCOREBOARDS_FILE, 'r', encoding='utf-8') as f:
+                    for chat_id, feeder_id in json.load(f).items():
+                        self.scoreboard.subscribe(int(chat_id), feeder_id)
         except Exception as e:
-            print(f"Error guardando datos: {e}")
-    
+            print(f"Error cargando marcadores en vivo: {e}")
+
+    def load_notifications(self):
+        """Recuperar las suscripciones a los avisos"""
+        try:
+            if Path(NOTIFICATIONS_FILE).exists():
+                with open(NOTIFICATIONS_FILE, 'r', encoding='utf-8') as f:
+                    for chat_id, subscription in json.load(f).items():
+                        self.notifier.subscribe(int(chat_id), subscription.get('feeder', ALL_FEEDERS),
+                                                subscription.get('kinds') or KINDS)
+        except Exception as e:
+            print(f"Error cargando suscripciones a avisos: {e}")
+
+    def load_schedules(self):
+        """Recuperar los horarios y armar la inactividad de las partidas en curso"""
+        try:
+            if Path(SCHEDULES_FILE).exists():
+                with open(SCHEDULES_FILE, 'r', encoding='utf-8') as f:
+                    self.scheduler.load(json.load(f))
+        except Exception as e:
+            print(f"Error cargando horarios: {e}")
+        for session in self.sessions.all():
+            if session.game_data.get('game_active', False):
+                self.scheduler.game_started(session.feeder_id)
+
+    # =================== ESTADÍSTICAS GLOBALES ===================
     def load_stats(self):
         """Cargar estadísticas generales"""
         try:
             if Path(STATS_FILE).exists():
                 with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    stats = json.load(f)
+                seqs = stats.pop(LOG_SEQ_KEY, {})
+                # Formato anterior: un solo registro de eventos (el del comedero por defecto)
+                self.stats_seqs = seqs if isinstance(seqs, dict) else {DEFAULT_FEEDER: seqs}
+                # None: formato anterior, sin la partida en curso de cada comedero
+                self.stats_contexts = stats.pop(GAME_CONTEXT_KEY, None)
+                self.leaderboard = Leaderboard.from_dict(stats.pop('leaderboard', {}),
+                                                         self.config.ranking_size)
+                stats.setdefault('best_players', {})
+                return stats
         except Exception as e:
             print(f"Error cargando estadísticas: {e}")
         
+        self.stats_seqs = {}
+        self.stats_contexts = {}
+        self.leaderboard = Leaderboard(self.config.ranking_size)
+        return self.default_stats()
+
+    def default_stats(self):
+        """Estadísticas vacías"""
         return {
             "total_games": 0,
             "total_catches": 0,
@@ -92,57 +350,222 @@ class PawPlayBot:
                 "medium": 0,
                 "hard": 0
             },
+            "best_players": {},  # dificultad -> jugador del récord
             "last_played": None
         }
     
+    def snapshot_stats(self):
+        """Copia consistente de las estadísticas para persistir"""
+        # Con el lock de una sesión tomado todos sus eventos ya están en las
+        # estadísticas: guardar hasta dónde, para que al arrancar no se relea
+        # el registro de los comederos sin partidas terminadas. Sin bloquear:
+        # al compactar ya se tiene el lock de otra sesión.
+        covered = {}
+        for session in self.sessions.all() if hasattr(self, 'sessions') else ():
+            if session.lock.acquire(blocking=False):
+                try:
+                    covered[session.feeder_id] = (session.event_log.last_seq, game_context(session.game_data))
+                finally:
+                    session.lock.release()
+        with self.stats_lock:
+            for feeder_id, (seq, context) in covered.items():
+                if seq > self.stats_seqs.get(feeder_id, 0):
+                    self.stats_seqs[feeder_id] = seq
+                    self.set_game_context(feeder_id, context)
+            stats = copy.deepcopy(self.stats)
+            stats['leaderboard'] = self.leaderboard.to_dict()
+            # Último evento aplicado de cada comedero, para no duplicarlo al recuperar,
+            # y su partida en curso en ese punto (los contextos no se modifican tras guardarlos)
+            stats[LOG_SEQ_KEY] = dict(self.stats_seqs)
+            stats[GAME_CONTEXT_KEY] = dict(self.stats_contexts or {})
+            return stats
+
+    def set_game_context(self, feeder_id, context):
+        """Partida en curso del comedero a la altura de stats_seqs (requiere stats_lock)"""
+        if self.stats_contexts is None:
+            self.stats_contexts = {}
+        if context is None:
+            self.stats_contexts.pop(feeder_id, None)
+        else:
+            self.stats_contexts[feeder_id] = context
+
+    def replay_context(self, session):
+        """Datos de juego de los que parte la recuperación de estadísticas (requiere stats_lock)"""
+        if self.stats_contexts is None:
+            # Formato anterior: la instantánea del comedero es la mejor aproximación
+            return copy.deepcopy(session.game_data)
+        context = self.stats_contexts.get(session.feeder_id)
+        return copy.deepcopy(context) if context is not None else default_game_data()
+
     def save_stats(self):
-        """Guardar estadísticas"""
+        """Guardar estadísticas (escritura atómica inmediata)"""
+        self.stats_store.mark_dirty()
+        self.stats_store.flush()
+
+    def flush_count(self):
+        """Número total de escrituras a disco realizadas"""
+        return (self.stats_store.flush_count + self.chat_feeders_store.flush_count
+                + sum(session.store.flush_count for session in self.sessions.all()))
+
+    def on_session_event(self, session, seq, kind, payload, ts):
+        """Evento registrado en un comedero (llamado con session.lock tomado)"""
+        if kind == EVENT_START:
+            self.scoreboard.game_started(session.feeder_id)
+            self.scheduler.game_started(session.feeder_id)
+        elif kind == EVENT_STOP:
+            self.scoreboard.game_stopped(session.feeder_id)
+            self.scheduler.game_stopped(session.feeder_id)
+        else:
+            self.scoreboard.changed(session.feeder_id)
+            if kind in (EVENT_CATCH, EVENT_MISS):
+                self.scheduler.touch(session.feeder_id)
+        new_record = False
+        if kind in (EVENT_STOP, EVENT_RESET):
+            new_record = self.apply_stats_event(session, seq, kind, payload, ts)
+        if len(self.notifier):
+            self.notify_event(session, kind, payload, new_record)
+
+    def notify_event(self, session, kind, payload, new_record):
+        """Publicar los avisos de un evento (con session.lock tomado: solo encola)"""
+        feeder_id = session.feeder_id
+        game_data = session.game_data
+        if kind == EVENT_CATCH:
+            stats = game_data.get('session_stats', {})
+            catches = stats.get('catches', 0)
+            if catches in CATCH_MILESTONES or (catches > 1000 and catches % 1000 == 0):
+                accuracy = self.calculate_accuracy(catches, stats.get('misses', 0))
+                self.notifier.publish(feeder_id, KIND_MILESTONES,
+                                      f"🎯 {feeder_id}: ¡{catches} aciertos! (precisión {accuracy}%)")
+        elif kind == EVENT_START:
+            difficulty = game_data.get('difficulty', 'medium')
+            self.notifier.publish(feeder_id, KIND_GAMES,
+                                  f"▶️ {payload.decode('utf-8', 'ignore')} empezó una partida en {feeder_id} "
+                                  f"({self.get_difficulty_emoji(difficulty)} {difficulty.upper()})")
+        elif kind == EVENT_STOP:
+            catches, misses, difficulty = decode_stop(payload)
+            self.notifier.publish(feeder_id, KIND_GAMES,
+                                  f"⏸️ Partida terminada en {feeder_id}: {catches} aciertos, {misses} fallos "
+                                  f"({self.calculate_accuracy(catches, misses)}%)")
+            if new_record:
+                self.notifier.publish(feeder_id, KIND_RECORDS,
+                                      f"🏆 ¡Nuevo récord en {difficulty}: {catches} aciertos de "
+                                      f"{game_data.get('current_player', 'N/A')} ({feeder_id})!")
+        elif kind == EVENT_DIFFICULTY:
+            difficulty = payload.decode('utf-8', 'ignore')
+            self.notifier.publish(feeder_id, KIND_DIFFICULTY,
+                                  f"{self.get_difficulty_emoji(difficulty)} {feeder_id}: dificultad {difficulty.upper()}")
+
+    def apply_stats_event(self, session, seq, kind, payload, ts, game_data=None):
+        """
+        Aplicar a las estadísticas globales (y al historial) un evento de un
+        comedero. game_data es el estado del comedero tras el evento (por
+        defecto el actual; al recuperar, el reconstruido hasta ese evento).
+        Devuelve True si la partida batió el récord de su dificultad.
+        """
+        if kind not in (EVENT_STOP, EVENT_RESET):
+            return False
+        if game_data is None:
+            game_data = session.game_data
+        feeder_id = session.feeder_id
+        new_record = False
+        with self.stats_lock:
+            if seq <= self.stats_seqs.get(feeder_id, 0):
+                return False
+            self.stats_seqs[feeder_id] = seq
+            self.set_game_context(feeder_id, game_context(game_data))
+            if kind == EVENT_STOP:
+                catches, misses, difficulty = decode_stop(payload)
+                player = game_data.get('current_player')
+                self.stats['total_games'] += 1
+                self.stats['total_catches'] += catches
+                self.stats['total_misses'] += misses
+                self.stats['last_played'] = datetime.fromtimestamp(ts).isoformat()
+                if catches > self.stats['best_scores'].get(difficulty, 0):
+                    self.stats['best_scores'][difficulty] = catches
+                    self.stats['best_players'][difficulty] = player
+                    new_record = True
+                started_at = self.game_start(game_data)
+                self.leaderboard.record_game(player, difficulty, catches, misses,
+                                             game_data.get('session_stats', {}).get('best_streak', 0),
+                                             ts - started_at if started_at is not None else None, ts)
+            else:
+                self.stats = self.default_stats()
+                self.leaderboard = Leaderboard(self.config.ranking_size)
+        self.stats_store.mark_dirty()
+        if kind == EVENT_STOP and self.history is not None:
+            self.record_history(session, seq, game_data, catches, misses, difficulty, ts)
+        return new_record
+
+    def record_history(self, session, seq, game_data, catches, misses, difficulty, ts):
+        """Encolar la partida terminada en el historial SQLite"""
+        self.history.record_session(session.feeder_id, seq, game_data.get('current_player'),
+                                    difficulty, catches, misses, self.game_start(game_data), ts)
+
+    @staticmethod
+    def game_start(game_data):
+        """Timestamp de inicio de la partida (None si no se sabe)"""
+        start_time = game_data.get('session_stats', {}).get('start_time')
         try:
-            with open(STATS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error guardando estadísticas: {e}")
+            return datetime.fromisoformat(start_time).timestamp() if start_time else None
+        except ValueError:
+            return None
+
+    def build_commands(self):
+        """Tabla de comandos: nombre principal, alias y manejador"""
+        commands = CommandRegistry()
+        table = [
+            (['/start'], lambda ctx: self.cmd_start(ctx.chat_id, ctx.user_name)),
+            (['/menu'], lambda ctx: self.cmd_menu(ctx.chat_id)),
+            (['/facil', '/easy'], lambda ctx: self.cmd_set_difficulty(ctx.chat_id, 'easy')),
+            (['/medio', '/medium'], lambda ctx: self.cmd_set_difficulty(ctx.chat_id, 'medium')),
+            (['/dificil', '/hard'], lambda ctx: self.cmd_set_difficulty(ctx.chat_id, 'hard')),
+            (['/dificultad', '/difficulty'], lambda ctx: self.cmd_difficulty(ctx.chat_id, ctx.args)),
+            # /iniciar [jugador]: sin argumentos juega quien envía el comando
+            (['/iniciar', '/start_game'],
+             lambda ctx: self.cmd_start_game(ctx.chat_id, " ".join(ctx.args) or ctx.user_name)),
+            (['/parar', '/stop_game'], lambda ctx: self.cmd_stop_game(ctx.chat_id)),
+            (['/estado', '/status'], lambda ctx: self.cmd_status(ctx.chat_id)),
+            (['/estadisticas', '/stats'], lambda ctx: self.cmd_statistics(ctx.chat_id, ctx.args)),
+            (['/puntuacion', '/score'], lambda ctx: self.cmd_current_score(ctx.chat_id)),
+            (['/ranking', '/top'], lambda ctx: self.cmd_ranking(ctx.chat_id, ctx.args)),
+            (['/marcador', '/live'], lambda ctx: self.cmd_live_score(ctx.chat_id, ctx.args)),
+            (['/suscribir', '/subscribe'], lambda ctx: self.cmd_subscribe(ctx.chat_id, ctx.args)),
+            (['/desuscribir', '/unsubscribe'], lambda ctx: self.cmd_unsubscribe(ctx.chat_id)),
+            (['/actividad', '/activity'], lambda ctx: self.cmd_activity(ctx.chat_id)),
+            (['/comedero', '/feeder'], lambda ctx: self.cmd_feeder(ctx.chat_id, ctx.args)),
+            (['/comederos', '/feeders'], lambda ctx: self.cmd_list_feeders(ctx.chat_id)),
+            (['/rendimiento', '/perf'], lambda ctx: self.cmd_performance(ctx.chat_id)),
+            (['/perfil', '/profile'], lambda ctx: self.cmd_profile(ctx.chat_id, ctx.args)),
+            (['/programar', '/schedule'], lambda ctx: self.cmd_schedule(ctx.chat_id, ctx.args)),
+            (['/horarios', '/schedules'], lambda ctx: self.cmd_list_schedules(ctx.chat_id)),
+            (['/cancelar', '/unschedule'], lambda ctx: self.cmd_cancel_schedule(ctx.chat_id, ctx.args)),
+            (['/reset'], lambda ctx: self.cmd_reset_stats(ctx.chat_id)),
+            (['/ayuda', '/help'], lambda ctx: self.cmd_help(ctx.chat_id)),
+        ]
+        for names, handler in table:
+            commands.register(names, handler)
+        return commands
+
+    def set_bot_username(self, username):
+        """Nombre del bot, para aceptar /comando@nombre e ignorar los de otros bots"""
+        if username:
+            self.commands.bot_username = username
 
     def handle_message(self, msg):
         """Manejar mensajes del bot"""
-        content_type, chat_type, chat_id = telepot.glance(msg)
+        content_type, chat_type, chat_id = glance(msg)
         
         if content_type != 'text':
-            self.bot.sendMessage(chat_id, "🐱 Solo acepto comandos de texto")
+            self.send(chat_id, "🐱 Solo acepto comandos de texto")
             return
             
-        command = msg['text'].strip().lower()
         user_name = msg.get('from', {}).get('first_name', 'Usuario')
         
         # Registrar usuario
         self.authorized_users.add(chat_id)
         
         # Procesar comandos
-        if command == '/start':
-            self.cmd_start(chat_id, user_name)
-        elif command == '/menu':
-            self.cmd_menu(chat_id)
-        elif command in ['/facil', '/easy']:
-            self.cmd_set_difficulty(chat_id, 'easy')
-        elif command in ['/medio', '/medium']:
-            self.cmd_set_difficulty(chat_id, 'medium')
-        elif command in ['/dificil', '/hard']:
-            self.cmd_set_difficulty(chat_id, 'hard')
-        elif command in ['/iniciar', '/start_game']:
-            self.cmd_start_game(chat_id, user_name)
-        elif command in ['/parar', '/stop_game']:
-            self.cmd_stop_game(chat_id)
-        elif command in ['/estado', '/status']:
-            self.cmd_status(chat_id)
-        elif command in ['/estadisticas', '/stats']:
-            self.cmd_statistics(chat_id)
-        elif command in ['/puntuacion', '/score']:
-            self.cmd_current_score(chat_id)
-        elif command in ['/reset']:
-            self.cmd_reset_stats(chat_id)
-        elif command in ['/ayuda', '/help']:
-            self.cmd_help(chat_id)
-        else:
+        if self.commands.dispatch(chat_id, chat_type, user_name, msg['text'], msg) is False:
             self.cmd_unknown(chat_id)
 
     def cmd_start(self, chat_id, user_name):
@@ -161,18 +584,20 @@ Controla el juego del gato desde Telegram
 
 🚀 Usa /menu para ver todos los comandos
 """
-        self.bot.sendMessage(chat_id, welcome_msg)
+        self.send(chat_id, welcome_msg)
         self.cmd_menu(chat_id)
 
     def cmd_menu(self, chat_id):
         """Mostrar menú principal"""
-        difficulty = self.game_data.get('difficulty', 'medium')
-        status = "🟢 ACTIVO" if self.game_data.get('game_active', False) else "🔴 PAUSADO"
+        session = self.session_for_chat(chat_id)
+        difficulty = session.game_data.get('difficulty', 'medium')
+        status = "🟢 ACTIVO" if session.game_data.get('game_active', False) else "🔴 PAUSADO"
         
         menu_msg = f"""
 🎮 **PAWPLAY CONTROL PANEL**
 
 📊 **Estado actual:**
+• Comedero: {session.feeder_id}
 • Dificultad: {self.get_difficulty_emoji(difficulty)} {difficulty.upper()}
 • Juego: {status}
 
@@ -183,21 +608,28 @@ Controla el juego del gato desde Telegram
 
 ▶️ /iniciar - Comenzar juego
 ⏸️ /parar - Pausar juego
+⏰ /horarios - Partidas programadas
 
 📈 **Información:**
 /estado - Estado del sistema
 /puntuacion - Puntuación actual
+/marcador - Marcador en vivo
 /estadisticas - Estadísticas generales
+/ranking - Mejores jugadores
+/actividad - Actividad reciente
 
+📟 /comedero <id> - Elegir comedero
 ❓ /ayuda - Ayuda completa
 """
-        self.bot.sendMessage(chat_id, menu_msg)
+        self.send(chat_id, menu_msg)
 
     def cmd_set_difficulty(self, chat_id, difficulty):
         """Cambiar dificultad"""
-        old_difficulty = self.game_data.get('difficulty', 'medium')
-        self.game_data['difficulty'] = difficulty
-        self.save_game_data()
+        session = self.session_for_chat(chat_id)
+        with session.lock:
+            old_difficulty = session.game_data.get('difficulty', 'medium')
+            session.record_event(EVENT_DIFFICULTY, encode_text(difficulty))
+        session.save()
         
         emoji = self.get_difficulty_emoji(difficulty)
         msg = f"""
@@ -210,25 +642,59 @@ Controla el juego del gato desde Telegram
 
 🎮 Usa /iniciar para comenzar con la nueva dificultad
 """
-        self.bot.sendMessage(chat_id, msg)
+        self.send(chat_id, msg)
+
+    def cmd_difficulty(self, chat_id, args):
+        """/dificultad <facil|medio|dificil> (también en inglés)"""
+        difficulty = DIFFICULTY_NAMES.get(args[0].lower()) if args else None
+        if difficulty is None:
+            self.send(chat_id, "⚠️ Uso: /dificultad facil|medio|dificil")
+            return
+        self.cmd_set_difficulty(chat_id, difficulty)
+
+    def start_game(self, session, user_name, chat_id=None):
+        """Registrar el inicio de una partida; devuelve la dificultad"""
+        if chat_id is not None:
+            self.game_chats[session.feeder_id] = chat_id
+        self.sync_worker_taps()
+        with session.lock:
+            session.record_event(EVENT_START, encode_text(user_name))
+            # El registro guarda el nombre recortado; en memoria se conserva completo
+            session.game_data['current_player'] = user_name
+            difficulty = session.game_data.get('difficulty', 'medium')
+        session.save()
+        return difficulty
+
+    def stop_game(self, session):
+        """Registrar el fin de la partida; devuelve (aciertos, fallos) o None si no había partida"""
+        self.sync_worker_taps()
+        with session.lock:
+            if not session.game_data.get('game_active', False):
+                return None
+            # Guardar estadísticas de la sesión
+            session_stats = session.game_data.get('session_stats', {})
+            catches = session_stats.get('catches', 0)
+            misses = session_stats.get('misses', 0)
+            difficulty = session.game_data.get('difficulty', 'medium')
+
+            # Pausa + actualización de estadísticas generales
+            session.record_event(EVENT_STOP, encode_stop(catches, misses, difficulty))
+
+        session.save()
+        self.save_stats()
+        return catches, misses
 
     def cmd_start_game(self, chat_id, user_name):
         """Iniciar juego"""
-        self.game_data['game_active'] = True
-        self.game_data['current_player'] = user_name
-        self.game_data['session_stats'] = {
-            "catches": 0,
-            "misses": 0,
-            "start_time": datetime.now().isoformat()
-        }
-        self.save_game_data()
+        session = self.session_for_chat(chat_id)
+        difficulty = self.start_game(session, user_name, chat_id)
         
-        difficulty = self.game_data.get('difficulty', 'medium')
         emoji = self.get_difficulty_emoji(difficulty)
         
         msg = f"""
 🎮 **¡JUEGO INICIADO!**
 
+📟 Comedero: {session.feeder_id}
 👤 Jugador: {user_name}
 {emoji} Dificultad: {difficulty.upper()}
 ⏰ Hora de inicio: {datetime.now().strftime('%H:%M:%S')}
@@ -236,40 +702,22 @@ Controla el juego del gato desde Telegram
 🐱 ¡El gato está listo para jugar!
 📱 Abre la app para comenzar a jugar
 
-📊 Usa /puntuacion para ver tu progreso
+📊 Usa /puntuacion (o /marcador para seguirlo en vivo) para ver tu progreso
 ⏸️ Usa /parar para pausar el juego
 """
-        self.bot.sendMessage(chat_id, msg)
+        self.send(chat_id, msg)
 
     def cmd_stop_game(self, chat_id):
         """Parar juego"""
-        if not self.game_data.get('game_active', False):
-            self.bot.sendMessage(chat_id, "⚠️ No hay ningún juego activo")
+        result = self.stop_game(self.session_for_chat(chat_id))
+        if result is None:
+            self.send(chat_id, "⚠️ No hay ningún juego activo")
             return
-            
-        # Guardar estadísticas de la sesión
-        session = self.game_data.get('session_stats', {})
-        catches = session.get('catches', 0)
-        misses = session.get('misses', 0)
-        
-        self.game_data['game_active'] = False
-        self.save_game_data()
-        
-        # Actualizar estadísticas generales
-        self.stats['total_games'] += 1
-        self.stats['total_catches'] += catches
-        self.stats['total_misses'] += misses
-        self.stats['last_played'] = datetime.now().isoformat()
-        
-        difficulty = self.game_data.get('difficulty', 'medium')
-        if catches > self.stats['best_scores'].get(difficulty, 0):
-            self.stats['best_scores'][difficulty] = catches
-            
-        self.save_stats()
-        
-        msg = f"""
-⏸️ **JUEGO PAUSADO**
+        self.send(chat_id, "\n⏸️ **JUEGO PAUSADO**\n" + self.game_summary(*result))
 
+    def game_summary(self, catches, misses):
+        """Resumen de una partida terminada"""
+        return f"""
 📊 **Resumen de la sesión:**
 🎯 Aciertos: {catches}
 ❌ Fallos: {misses}
@@ -278,23 +726,133 @@ Controla el juego del gato desde Telegram
 💾 Estadísticas guardadas
 🎮 Usa /iniciar para jugar de nuevo
 """
-        self.bot.sendMessage(chat_id, msg)
+
+    # =================== PARTIDAS PROGRAMADAS ===================
+    def run_scheduled_start(self, schedule):
+        """Inicio de una partida programada (hilo de temporizadores); True si empezó"""
+        try:
+            session = self.get_session(schedule.feeder_id)
+        except (ValueError, OverflowError) as e:
+            print(f"Horario {schedule.id}: {e}")
+            return False
+        if session.game_data.get('game_active', False):
+            if schedule.chat_id is not None:
+                self.send(schedule.chat_id, f"⏰ Horario #{schedule.id}: ya hay una partida en curso en "
+                                            f"{schedule.feeder_id}, no se inicia otra")
+            return False
+        player = schedule.player or "Partida programada"
+        difficulty = self.start_game(session, player, schedule.chat_id)
+        if schedule.chat_id is not None:
+            self.send(schedule.chat_id, f"⏰ **PARTIDA PROGRAMADA** #{schedule.id}\n\n"
+                                        f"📟 Comedero: {schedule.feeder_id}\n👤 Jugador: {player}\n"
+                                        f"{self.get_difficulty_emoji(difficulty)} Dificultad: {difficulty.upper()}\n"
+                                        f"⏱️ Duración: {schedule.minutes} min")
+        return True
+
+    def run_scheduled_stop(self, feeder_id, chat_id, reason):
+        """Fin de una partida programada o por inactividad (hilo de temporizadores)"""
+        session = self.sessions.get(feeder_id, create=False)
+        result = self.stop_game(session) if session is not None else None
+        if result is None:
+            return
+        if chat_id is None:
+            chat_id = self.game_chats.get(feeder_id)
+        if chat_id is not None:
+            if reason == STOP_IDLE:
+                header = f"💤 **PARTIDA PARADA** en {feeder_id} tras {self.scheduler.idle_minutes(feeder_id)} min sin toques"
+            else:
+                header = f"⏰ **FIN DE LA PARTIDA PROGRAMADA** en {feeder_id}"
+            self.send(chat_id, header + "\n" + self.game_summary(*result))
+
+    def cmd_schedule(self, chat_id, args):
+        """
+        /programar HH:MM <minutos> [diario|una] [jugador]: partida programada en el comedero del chat
+        /programar inactividad <minutos>: parar las partidas tras N minutos sin toques (0 = nunca)
+        """
+        feeder_id = self.session_for_chat(chat_id).feeder_id
+        usage = ("⚠️ Uso: /programar HH:MM <minutos> [diario|una] [jugador]\n"
+                 "o /programar inactividad <minutos> (0 para desactivar)")
+        if len(args) == 2 and args[0].lower() in ('inactividad', 'idle'):
+            if not args[1].isdigit():
+                self.send(chat_id, usage)
+                return
+            minutes = int(args[1])
+            try:
+                self.scheduler.set_idle_minutes(feeder_id, minutes)
+            except ValueError as e:
+                self.send(chat_id, f"⚠️ {e}")
+                return
+            self.send(chat_id, f"💤 Las partidas de {feeder_id} se pararán tras {minutes} min sin toques"
+                      if minutes else f"💤 Parada por inactividad desactivada en {feeder_id}")
+            return
+        if len(args) < 2 or not args[1].isdigit():
+            self.send(chat_id, usage)
+            return
+        rest = args[2:]
+        repeat = REPEAT_DAILY
+        if rest and rest[0].lower() in REPEAT_ALIASES:
+            repeat = REPEAT_ALIASES[rest[0].lower()]
+            rest = rest[1:]
+        try:
+            schedule = self.scheduler.add(feeder_id, chat_id, args[0], int(args[1]), repeat,
+                                          " ".join(rest) or None)
+        except ValueError as e:
+            self.send(chat_id, f"⚠️ {e}")
+            return
+        when = "todos los días" if repeat == REPEAT_DAILY else schedule.on_date.strftime('%d/%m/%Y')
+        self.send(chat_id, f"⏰ Horario #{schedule.id}: {schedule.minutes} min a las {schedule.at} "
+                           f"({when}) en {feeder_id}\nUsa /horarios para verlos y /cancelar {schedule.id} para borrarlo")
+
+    def cmd_list_schedules(self, chat_id):
+        """/horarios: partidas programadas del comedero del chat"""
+        feeder_id = self.session_for_chat(chat_id).feeder_id
+        lines = []
+        for schedule in self.scheduler.schedules(feeder_id):
+            when = "diario" if schedule.repeat == REPEAT_DAILY else schedule.on_date.strftime('%d/%m')
+            line = f"#{schedule.id} {schedule.at} · {schedule.minutes} min · {when}"
+            if schedule.player:
+                line += f" · {schedule.player}"
+            if schedule.ends_at is not None:
+                line += f" · en curso hasta {datetime.fromtimestamp(schedule.ends_at).strftime('%H:%M')}"
+            lines.append(line)
+        idle = self.scheduler.idle_minutes(feeder_id)
+        self.send(chat_id, f"⏰ **HORARIOS** · 📟 {feeder_id}\n\n"
+                           + ("\n".join(lines) or "Sin partidas programadas")
+                           + f"\n\n💤 Inactividad: {f'{idle} min' if idle else 'desactivada'}\n"
+                           "Usa /programar HH:MM <minutos> para añadir uno")
+
+    def cmd_cancel_schedule(self, chat_id, args):
+        """/cancelar <id>: borrar un horario del comedero del chat"""
+        if len(args) != 1 or not args[0].lstrip('#').isdigit():
+            self.send(chat_id, "⚠️ Uso: /cancelar <id> (los ids aparecen en /horarios)")
+            return
+        schedule_id = int(args[0].lstrip('#'))
+        schedule = self.scheduler.get(schedule_id)
+        if schedule is None or schedule.feeder_id != self.session_for_chat(chat_id).feeder_id:
+            self.send(chat_id, f"⚠️ No hay ningún horario #{schedule_id} en este comedero")
+            return
+        self.scheduler.cancel(schedule_id)
+        self.send(chat_id, f"🗑️ Horario #{schedule_id} ({schedule.at}) borrado"
+                  + (" (la partida en curso sigue hasta /parar)" if schedule.ends_at is not None else ""))
 
     def cmd_status(self, chat_id):
         """Estado del sistema"""
-        difficulty = self.game_data.get('difficulty', 'medium')
-        active = self.game_data.get('game_active', False)
-        player = self.game_data.get('current_player', 'Ninguno')
+        feeder = self.session_for_chat(chat_id)
+        difficulty = feeder.game_data.get('difficulty', 'medium')
+        active = feeder.game_data.get('game_active', False)
+        player = feeder.game_data.get('current_player', 'Ninguno')
         
         status_emoji = "🟢" if active else "🔴"
         status_text = "ACTIVO" if active else "PAUSADO"
         
-        session = self.game_data.get('session_stats', {})
+        session = feeder.game_data.get('session_stats', {})
         start_time = session.get('start_time')
+        limited, debounced = self.rejected_taps()
         
         msg = f"""
 📊 **ESTADO DEL SISTEMA**
 
+📟 **Comedero:** {feeder.feeder_id}
 🎮 **Juego:** {status_emoji} {status_text}
 👤 **Jugador actual:** {player}
 🎯 **Dificultad:** {self.get_difficulty_emoji(difficulty)} {difficulty.upper()}
@@ -306,19 +864,27 @@ Controla el juego del gato desde Telegram
 
 🔧 **Sistema:** Operativo
 📡 **Conexión:** Estable
+💾 **Escrituras a disco:** {self.flush_count()}
+🗂️ **Comederos cargados:** {len(self.sessions)}
+📤 **Mensajes en cola:** {self.outbox.pending} (enviados: {self.outbox.sent}, reintentos: {self.outbox.retries})
+🔔 **Suscritos a avisos:** {len(self.notifier)} (resúmenes enviados: {self.notifier.delivered})
+⏰ **Horarios:** {len(self.scheduler)} ({len(self.timers)} temporizadores)
+🚦 **Toques rechazados:** {limited} por ritmo, {debounced} por rebote
 """
-        self.bot.sendMessage(chat_id, msg)
+        self.send(chat_id, msg)
 
     def cmd_current_score(self, chat_id):
         """Puntuación actual"""
-        if not self.game_data.get('game_active', False):
-            self.bot.sendMessage(chat_id, "⚠️ No hay juego activo. Usa /iniciar para comenzar")
+        feeder = self.session_for_chat(chat_id)
+        if not feeder.game_data.get('game_active', False):
+            self.send(chat_id, "⚠️ No hay juego activo. Usa /iniciar para comenzar")
             return
             
-        session = self.game_data.get('session_stats', {})
+        session = feeder.game_data.get('session_stats', {})
         catches = session.get('catches', 0)
         misses = session.get('misses', 0)
         start_time = session.get('start_time')
+        difficulty = feeder.game_data.get('difficulty', 'medium')
         
         # Calcular tiempo de juego
         duration = "N/A"
@@ -337,19 +903,102 @@ Controla el juego del gato desde Telegram
 📊 **Total toques:** {catches + misses}
 🎪 **Precisión:** {self.calculate_accuracy(catches, misses)}%
 
+🔥 **Racha:** {session.get('streak', 0)} (mejor de la partida: {session.get('best_streak', 0)})
+
 ⏱️ **Tiempo de juego:** {duration}
-👤 **Jugador:** {self.game_data.get('current_player', 'N/A')}
+👤 **Jugador:** {feeder.game_data.get('current_player', 'N/A')}
 
-🏆 Récord en {self.game_data.get('difficulty', 'medium')}: {self.stats.get('best_scores', {}).get(self.game_data.get('difficulty', 'medium'), 0)}
+🏆 Récord en {difficulty}: {self.record_text(difficulty)}
 """
-        self.bot.sendMessage(chat_id, msg)
-
-    def cmd_statistics(self, chat_id):
-        """Estadísticas generales"""
-        total_catches = self.stats.get('total_catches', 0)
-        total_misses = self.stats.get('total_misses', 0)
-        total_games = self.stats.get('total_games', 0)
-        best_scores = self.stats.get('best_scores', {})
+        self.send(chat_id, msg)
+
+    def cmd_live_score(self, chat_id, args):
+        """/marcador [off]: seguir la partida en un mensaje que se actualiza solo"""
+        if args and args[0].lower() in ('off', 'no', 'parar', 'stop'):
+            if self.scoreboard.unsubscribe(chat_id):
+                self.scoreboards_store.mark_dirty()
+                self.send(chat_id, "📡 Marcador en vivo desactivado")
+            else:
+                self.send(chat_id, "⚠️ Este chat no tiene el marcador en vivo activado")
+            return
+        if self.config.scoreboard_interval <= 0:
+            self.send(chat_id, "⚠️ El marcador en vivo está desactivado (SCOREBOARD_INTERVAL=0)")
+            return
+        session = self.session_for_chat(chat_id)
+        active = session.game_data.get('game_active', False)
+        self.scoreboard.subscribe(chat_id, session.feeder_id, active)
+        self.scoreboards_store.mark_dirty()
+        if not active:
+            self.send(chat_id, f"📡 Marcador en vivo activado para {session.feeder_id}: "
+                               "aparecerá al iniciar la próxima partida (/marcador off para quitarlo)")
+
+    def cmd_subscribe(self, chat_id, args):
+        """/suscribir [partidas|records|hitos|dificultad ...] [todos]: avisos de eventos"""
+        kinds, feeder_id = set(), None
+        for arg in args:
+            arg = arg.lower()
+            if arg in ('todos', 'all'):
+                feeder_id = ALL_FEEDERS
+            elif arg in KIND_ALIASES:
+                kinds.add(KIND_ALIASES[arg])
+            else:
+                self.send(chat_id, "⚠️ Uso: /suscribir [partidas] [records] [hitos] [dificultad] [todos]")
+                return
+        if feeder_id is None:
+            feeder_id = self.session_for_chat(chat_id).feeder_id
+        self.notifier.subscribe(chat_id, feeder_id, kinds or KINDS)
+        self.notifications_store.mark_dirty()
+        where = "todos los comederos" if feeder_id == ALL_FEEDERS else f"el comedero {feeder_id}"
+        self.send(chat_id, f"🔔 Avisos de {', '.join(sorted(kinds or KINDS))} en {where}\n"
+                           "Usa /desuscribir para dejar de recibirlos")
+
+    def cmd_unsubscribe(self, chat_id):
+        """/desuscribir: dejar de recibir avisos"""
+        if self.notifier.unsubscribe(chat_id):
+            self.notifications_store.mark_dirty()
+            self.send(chat_id, "🔕 Ya no recibirás avisos")
+        else:
+            self.send(chat_id, "⚠️ Este chat no está suscrito a los avisos")
+
+    def render_scoreboard(self, feeder_id, final):
+        """Texto del marcador en vivo (sin la hora actual, para no editar si no hay cambios)"""
+        game_data = self.get_session(feeder_id).game_data
+        session = game_data.get('session_stats', {})
+        catches = session.get('catches', 0)
+        misses = session.get('misses', 0)
+        difficulty = game_data.get('difficulty', 'medium')
+        start_time = session.get('start_time')
+        header = "🏁 **PARTIDA TERMINADA**" if final else "🔴 **EN VIVO**"
+        return f"""{header} · 📟 {feeder_id}
+
+👤 {game_data.get('current_player', 'N/A')} · {self.get_difficulty_emoji(difficulty)} {difficulty.upper()}
+🎯 Aciertos: {catches}
+❌ Fallos: {misses}
+🎪 Precisión: {self.calculate_accuracy(catches, misses)}%
+⏰ Inicio: {self.format_time(start_time) if start_time else 'N/A'}
+🏆 Récord en {difficulty}: {self.record_text(difficulty)}"""
+
+    def cmd_statistics(self, chat_id, args=None):
+        """Estadísticas generales (por jugador con los agregados; con otros filtros, del historial)"""
+        if args:
+            try:
+                filters = self.parse_stats_filters(args)
+            except ValueError:
+                filters = None
+            if filters and set(filters) == {'player'}:
+                self.cmd_player_statistics(chat_id, filters['player'])
+            else:
+                self.cmd_history_statistics(chat_id, args)
+            return
+        with self.stats_lock:
+            total_catches = self.stats.get('total_catches', 0)
+            total_misses = self.stats.get('total_misses', 0)
+            total_games = self.stats.get('total_games', 0)
+            records = {difficulty: self.record_text(difficulty) for difficulty in ('easy', 'medium', 'hard')}
+            players = len(self.leaderboard.players)
+            streaks = self.leaderboard.ranking(RANKING_STREAK).top(1)
+            durations = self.leaderboard.duration_percentiles()
+            last_played = self.stats.get('last_played')
         
         msg = f"""
 📊 **ESTADÍSTICAS GENERALES**
@@ -359,27 +1008,206 @@ Controla el juego del gato desde Telegram
 🎯 Total aciertos: {total_catches}
 ❌ Total fallos: {total_misses}
 📈 Precisión global: {self.calculate_accuracy(total_catches, total_misses)}%
+👥 Jugadores: {players}
 
 🏆 **Récords por dificultad:**
-🟢 Fácil: {best_scores.get('easy', 0)} aciertos
-🟡 Medio: {best_scores.get('medium', 0)} aciertos  
-🔴 Difícil: {best_scores.get('hard', 0)} aciertos
-
-⏰ **Última partida:** {self.format_time(self.stats.get('last_played'))}
+🟢 Fácil: {records['easy']}
+🟡 Medio: {records['medium']}
+🔴 Difícil: {records['hard']}
+"""
+        if streaks:
+            msg += f"🔥 Mejor racha: {streaks[0][1]} aciertos seguidos ({streaks[0][0]})\n"
+        if durations:
+            msg += ("\n⏱️ **Duración de las partidas:** mediana " + self.format_duration(durations[0.5])
+                    + f" · p90 {self.format_duration(durations[0.9])} · p99 {self.format_duration(durations[0.99])}\n")
+        msg += f"""
+⏰ **Última partida:** {self.format_time(last_played)}
+🏅 Usa /ranking para ver los mejores jugadores
 """
-        self.bot.sendMessage(chat_id, msg)
+        self.send(chat_id, msg)
+
+    def record_text(self, difficulty):
+        """Récord de una dificultad con quien lo consiguió"""
+        best = self.stats.get('best_scores', {}).get(difficulty, 0)
+        player = self.stats.get('best_players', {}).get(difficulty)
+        return f"{best} aciertos ({player})" if best and player else f"{best} aciertos"
+
+    def cmd_player_statistics(self, chat_id, name):
+        """/estadisticas jugador=<nombre>: totales de un jugador sin consultar el historial"""
+        with self.stats_lock:
+            found = self.leaderboard.player(name)
+            if found is None:
+                self.send(chat_id, f"📭 No hay partidas terminadas de {name}")
+                return
+            player, stats = found
+            stats = copy.deepcopy(stats)
+            positions = {}
+            for difficulty in stats['difficulties']:
+                top = [p for p, _ in self.leaderboard.ranking(difficulty).top()]
+                if player in top:
+                    positions[difficulty] = top.index(player) + 1
+        lines = [
+            f"👤 **ESTADÍSTICAS DE {player.upper()}**",
+            "",
+            f"🕹️ Partidas: {stats['games']}",
+            f"🎯 Aciertos: {stats['catches']}",
+            f"❌ Fallos: {stats['misses']}",
+            f"📈 Precisión: {self.calculate_accuracy(stats['catches'], stats['misses'])}%",
+            f"🔥 Mejor racha: {stats['best_streak']} aciertos seguidos",
+            "",
+        ]
+        for difficulty, row in sorted(stats['difficulties'].items()):
+            line = (f"{self.get_difficulty_emoji(difficulty)} {difficulty}: {row['games']} partidas, "
+                    f"{self.calculate_accuracy(row['catches'], row['misses'])}% precisión, récord {row['best']}")
+            if difficulty in positions:
+                line += f" (puesto {positions[difficulty]})"
+            lines.append(line)
+        if stats['last_played']:
+            lines.append("")
+            lines.append(f"⏰ Última partida: {datetime.fromtimestamp(stats['last_played']).strftime('%d/%m/%Y %H:%M')}")
+        self.send(chat_id, "\n".join(lines))
+
+    def cmd_ranking(self, chat_id, args):
+        """/ranking [facil|medio|dificil|aciertos|racha]: mejores jugadores"""
+        if not args:
+            name = self.session_for_chat(chat_id).game_data.get('difficulty', 'medium')
+        else:
+            arg = args[0].lower()
+            name = DIFFICULTY_NAMES.get(arg) or RANKING_NAMES.get(arg)
+            if name is None:
+                self.send(chat_id, "⚠️ Uso: /ranking [facil|medio|dificil|aciertos|racha]")
+                return
+        with self.stats_lock:
+            rows = self.leaderboard.ranking(name).top()
+        if name == RANKING_CATCHES:
+            title, unit = "🎯 **RANKING - ACIERTOS TOTALES**", "aciertos"
+        elif name == RANKING_STREAK:
+            title, unit = "🔥 **RANKING - MEJOR RACHA**", "aciertos seguidos"
+        else:
+            title, unit = f"🏆 **RANKING - {self.get_difficulty_emoji(name)} {name.upper()}**", "aciertos"
+        lines = [title, ""]
+        for position, (player, value) in enumerate(rows, 1):
+            medal = RANKING_MEDALS[position - 1] if position <= len(RANKING_MEDALS) else f"{position}."
+            lines.append(f"{medal} {player} — {value} {unit}")
+        if not rows:
+            lines.append("📭 Aún no hay partidas terminadas")
+        lines.append("")
+        lines.append("Usa /ranking facil|medio|dificil|aciertos|racha")
+        self.send(chat_id, "\n".join(lines))
+
+    def cmd_history_statistics(self, chat_id, args):
+        """/estadisticas jugador=<nombre> dificultad=<easy|medium|hard> desde=<AAAA-MM-DD> hasta=<AAAA-MM-DD>"""
+        if self.history is None:
+            self.send(chat_id, "⚠️ El historial no está activado (HISTORY_BACKEND=sqlite)")
+            return
+        try:
+            filters = self.parse_stats_filters(args)
+        except ValueError as e:
+            self.send(chat_id, f"⚠️ {e}\nEjemplo: /estadisticas jugador=Ana dificultad=hard desde=2026-01-01")
+            return
+
+        result = self.history.query(**filters)
+        lines = [
+            "📊 **HISTORIAL DE PARTIDAS**",
+            "",
+            f"🔎 Filtro: {' '.join(args)}",
+            f"🕹️ Partidas: {result['games']}",
+            f"🎯 Aciertos: {result['catches']}",
+            f"❌ Fallos: {result['misses']}",
+            f"📈 Precisión: {self.calculate_accuracy(result['catches'], result['misses'])}%",
+            f"🏆 Mejor partida: {result['best']} aciertos",
+        ]
+        if result['by_difficulty']:
+            lines.append("")
+            for difficulty, row in result['by_difficulty'].items():
+                lines.append(f"{self.get_difficulty_emoji(difficulty)} {difficulty}: {row['games']} partidas, "
+                             f"{self.calculate_accuracy(row['catches'], row['misses'])}% precisión, récord {row['best']}")
+        if result['last']:
+            lines.append("")
+            lines.append(f"⏰ Última partida: {datetime.fromtimestamp(result['last']).strftime('%d/%m/%Y %H:%M')}")
+        self.send(chat_id, "\n".join(lines))
+
+    def parse_stats_filters(self, args):
+        """Convertir argumentos clave=valor en filtros del historial"""
+        filters = {}
+        for arg in args:
+            key, sep, value = arg.partition('=')
+            name = STATS_FILTERS.get(key.lower())
+            if not sep or not name or not value:
+                raise ValueError(f"Filtro no reconocido: {arg}")
+            if name in ('since', 'until'):
+                try:
+                    moment = datetime.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f"Fecha inválida: {value}")
+                if name == 'until' and len(value) == 10:
+                    moment += timedelta(days=1)  # "hasta" una fecha incluye ese día
+                filters[name] = moment.timestamp()
+            elif name == 'difficulty':
+                filters[name] = value.lower()
+            else:
+                filters[name] = value
+        return filters
 
     def cmd_reset_stats(self, chat_id):
         """Resetear estadísticas (solo para emergencias)"""
-        self.stats = {
-            "total_games": 0,
-            "total_catches": 0,
-            "total_misses": 0,
-            "best_scores": {"easy": 0, "medium": 0, "hard": 0},
-            "last_played": None
-        }
+        session = self.session_for_chat(chat_id)
+        self.sync_worker_taps()
+        with session.lock:
+            session.record_event(EVENT_RESET)
         self.save_stats()
-        self.bot.sendMessage(chat_id, "🔄 Estadísticas reiniciadas")
+        self.send(chat_id, "🔄 Estadísticas reiniciadas")
+
+    def cmd_feeder(self, chat_id, args):
+        """Asignar el chat a un comedero"""
+        if not args:
+            current = self.chat_feeders.get(str(chat_id), DEFAULT_FEEDER)
+            self.send(chat_id, f"📟 Comedero actual: {current}\nUsa /comedero <id> para cambiarlo")
+            return
+        feeder_id = args[0]
+        try:
+            self.get_session(feeder_id)
+        except (ValueError, OverflowError) as e:
+            self.send(chat_id, f"⚠️ {e}")
+            return
+        self.chat_feeders[str(chat_id)] = feeder_id
+        self.chat_feeders_store.mark_dirty()
+        self.chat_feeders_store.flush()
+        if self.scoreboard.subscription(chat_id) is not None:
+            # El marcador en vivo sigue al comedero del chat
+            self.scoreboard.subscribe(chat_id, feeder_id, self.is_game_active(feeder_id))
+            self.scoreboards_store.mark_dirty()
+        self.send(chat_id, f"📟 Chat asignado al comedero {feeder_id}")
+
+    def cmd_activity(self, chat_id):
+        """Resumen de actividad reciente del comedero del chat"""
+        session = self.session_for_chat(chat_id)
+        now = time.time()
+        with session.lock:
+            hour = session.activity.totals('minute', 60, now)
+            day = session.activity.totals('hour', 24, now)
+            week = session.activity.totals('day', 7, now)
+        hourly = session.get_timeseries('hour', 24, now)
+
+        activity_msg = f"""
+📈 **ACTIVIDAD - {session.feeder_id}**
+
+⏱️ Última hora: {hour[0]} aciertos, {hour[1]} fallos ({self.calculate_accuracy(*hour)}%)
+📅 Últimas 24 h: {day[0]} aciertos, {day[1]} fallos ({self.calculate_accuracy(*day)}%)
+🗓️ Últimos 7 días: {week[0]} aciertos, {week[1]} fallos ({self.calculate_accuracy(*week)}%)
+
+🎯 Aciertos por hora (24 h):
+{sparkline(hourly['catches'])}
+"""
+        self.send(chat_id, activity_msg)
+
+    def cmd_list_feeders(self, chat_id):
+        """Listar comederos cargados"""
+        lines = []
+        for session in sorted(self.sessions.all(), key=lambda s: s.feeder_id):
+            status = "🟢" if session.game_data.get('game_active', False) else "🔴"
+            lines.append(f"{status} {session.feeder_id} ({session.game_data.get('difficulty', 'medium')})")
+        self.send(chat_id, "📟 **Comederos:**\n" + "\n".join(lines))
 
     def cmd_help(self, chat_id):
         """Ayuda completa"""
@@ -387,15 +1215,31 @@ Controla el juego del gato desde Telegram
 ❓ **AYUDA COMPLETA - PAWPLAY BOT**
 
 🎮 **Comandos de control:**
-/iniciar - Iniciar una nueva partida
+/iniciar [jugador] - Iniciar una nueva partida
 /parar - Pausar la partida actual
+/programar HH:MM <min> [diario|una] - Programar partidas
+/programar inactividad <min> - Parar tras N minutos sin toques
+/horarios - Ver partidas programadas
+/cancelar <id> - Borrar un horario
 /facil, /medio, /dificil - Cambiar dificultad
+/dificultad <nivel> - Cambiar dificultad (facil, medio, dificil)
 
 📊 **Comandos de información:**
 /estado - Ver estado actual del sistema
 /puntuacion - Ver puntuación de la sesión
+/marcador [off] - Marcador en vivo que se actualiza solo
+/suscribir [tipos] [todos] - Avisos de partidas, récords, hitos y dificultad
+/desuscribir - Dejar de recibir avisos
 /estadisticas - Ver estadísticas generales
+/estadisticas jugador=Ana - Totales, récords y racha de un jugador
+/estadisticas jugador=Ana dificultad=hard desde=2026-01-01 - Consultar el historial
+/ranking [dificultad|aciertos|racha] - Mejores jugadores
+/actividad - Toques de la última hora, día y semana
 /menu - Mostrar menú principal
+/comedero <id> - Controlar otro comedero
+/comederos - Listar comederos
+/rendimiento - Latencia de los comandos
+/perfil [seg] - Perfil de CPU y memoria (administradores)
 
 🔧 **Cómo funciona:**
 1. Selecciona dificultad con /facil, /medio o /dificil
@@ -413,11 +1257,60 @@ Controla el juego del gato desde Telegram
 🤖 **Desarrollado por:** Santiago Escobar y Jojhan Perez
 🏫 **Universidad de Caldas** - Automatización y Control
 """
-        self.bot.sendMessage(chat_id, help_msg)
+        self.send(chat_id, help_msg)
+
+    def cmd_performance(self, chat_id):
+        """Llamadas y latencia de los comandos más lentos"""
+        lines = []
+        for command in self.commands.slowest():
+            stats = command.stats
+            lines.append(f"{command.name}: {stats.calls} llamadas, media {stats.mean_time * 1000:.1f} ms, "
+                         f"máx {stats.max_time * 1000:.1f} ms" + (f", {stats.errors} errores" if stats.errors else ""))
+        if not lines:
+            lines.append("Aún no se ha usado ningún comando")
+        self.send(chat_id, "⏱️ **Rendimiento de comandos:**\n" + "\n".join(lines)
+                  + f"\n\n❓ No reconocidos: {self.commands.unknown}")
+
+    def cmd_profile(self, chat_id, args):
+        """/perfil [segundos]: perfil de CPU y memoria (solo administradores)"""
+        if not self.is_admin(chat_id):
+            self.send(chat_id, "⛔ Solo los administradores pueden usar /perfil")
+            return
+        try:
+            seconds = float(args[0]) if args else PROFILE_DEFAULT_SECONDS
+        except ValueError:
+            self.send(chat_id, "⚠️ Uso: /perfil [segundos]")
+            return
+        if not self.start_profile(seconds, [chat_id]):
+            self.send(chat_id, "⏳ Ya hay un perfil en curso")
+            return
+        seconds = min(max(seconds, 1), self.profiler.max_duration)
+        self.send(chat_id, f"🔬 Perfilando durante {seconds:.0f} s...")
+
+    def is_admin(self, chat_id):
+        return chat_id in self.config.admin_chat_ids
+
+    def check_admin_token(self, token):
+        """Token del endpoint HTTP de administración (desactivado si ADMIN_TOKEN está vacío)"""
+        if self.config.admin_token is None or token is None:
+            return False
+        return hmac.compare_digest(token.encode(), self.config.admin_token.encode())
+
+    def start_profile(self, seconds, chat_ids=None):
+        """Iniciar un perfil; el resumen se envía a chat_ids (por defecto, a los administradores)"""
+        chat_ids = list(self.config.admin_chat_ids if chat_ids is None else chat_ids)
+
+        def on_done(report, summary):
+            if report is not None:
+                print(f"🔬 Perfil guardado en {report}")
+            for chat_id in chat_ids:
+                self.send(chat_id, summary)
+
+        return self.profiler.start(seconds, on_done)
 
     def cmd_unknown(self, chat_id):
         """Comando no reconocido"""
-        self.bot.sendMessage(chat_id, "❓ Comando no reconocido. Usa /menu para ver opciones disponibles")
+        self.send(chat_id, "❓ Comando no reconocido. Usa /menu para ver opciones disponibles")
 
     # =================== UTILIDADES ===================
     def get_difficulty_emoji(self, difficulty):
@@ -441,6 +1334,10 @@ Controla el juego del gato desde Telegram
             return 0
         return round((catches / total) * 100, 1)
 
+    def format_duration(self, seconds):
+        """Formatear una duración en segundos como H:MM:SS"""
+        return str(timedelta(seconds=round(seconds)))
+
     def format_time(self, time_str):
         """Formatear tiempo"""
         if not time_str:
@@ -452,79 +1349,44 @@ Controla el juego del gato desde Telegram
             return "N/A"
 
     # =================== API PARA LA APP ===================
-    def register_catch(self):
+    def register_catch(self, feeder_id=DEFAULT_FEEDER):
         """Registrar acierto (llamado desde la app)"""
-        if self.game_data.get('game_active', False):
-            self.game_data['session_stats']['catches'] += 1
-            self.save_game_data()
-            return True
-        return False
+        return self.get_session(feeder_id).register_tap(EVENT_CATCH)
 
-    def register_miss(self):
+    def register_miss(self, feeder_id=DEFAULT_FEEDER):
         """Registrar fallo (llamado desde la app)"""
-        if self.game_data.get('game_active', False):
-            self.game_data['session_stats']['misses'] += 1
-            self.save_game_data()
-            return True
-        return False
+        return self.get_session(feeder_id).register_tap(EVENT_MISS)
+
+    def register_batch(self, events, feeder_id=DEFAULT_FEEDER):
+        """Registrar un lote de toques; ver GameSession.register_batch"""
+        return self.get_session(feeder_id).register_batch(events, self.config.batch_max_events)
 
-    def get_current_difficulty(self):
+    def get_current_difficulty(self, feeder_id=DEFAULT_FEEDER):
         """Obtener dificultad actual"""
-        return self.game_data.get('difficulty', 'medium')
+        return self.get_session(feeder_id).game_data.get('difficulty', 'medium')
 
-    def is_game_active(self):
+    def is_game_active(self, feeder_id=DEFAULT_FEEDER):
         """Verificar si el juego está activo"""
-        return self.game_data.get('game_active', False)
+        return self.get_session(feeder_id).game_data.get('game_active', False)
+
+    def wake_waiters(self):
+        """Despertar a todos los clientes long-poll/SSE (al cerrar el servidor)"""
+        for session in self.sessions.all():
+            with session.state_changed:
+                session.state_changed.notify_all()
 
     # =================== SERVIDOR HTTP PARA LA APP ===================
-    def start_http_server(self):
+    def start_http_server(self, host="0.0.0.0", port=None):
         """Iniciar servidor HTTP para comunicación con la app"""
-        game_bot = self  # Referencia al bot
-        
-        class GameDataHandler(http.server.BaseHTTPRequestHandler):            
-            def do_GET(self):
-                """Manejar requests GET"""
-                parsed_path = urlparse(self.path)
-                
-                if parsed_path.path == '/game-data':
-                    # Devolver datos del juego
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    
-                    response = json.dumps(game_bot.game_data)
-                    self.wfile.write(response.encode())
-                    
-                elif parsed_path.path == '/register-catch':
-                    # Registrar acierto
-                    game_bot.register_catch()
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(b'{"status": "success"}')
-                    
-                elif parsed_path.path == '/register-miss':
-                    # Registrar fallo
-                    game_bot.register_miss()
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(b'{"status": "success"}')
-                    
-                else:
-                    self.send_response(404)
-                    self.end_headers()
-            
-            def log_message(self, format, *args):
-                # Silenciar logs del servidor HTTP
-                pass
-        
+        config = self.config
+        if port is None:
+            port = config.http_port
         try:
-            httpd = socketserver.TCPServer(("0.0.0.0", HTTP_PORT), GameDataHandler)
-            print(f"🌐 Servidor HTTP iniciado en puerto {HTTP_PORT} (todas las interfaces)")
+            if self.shared is not None:
+                return self.start_worker_pool(host, port)
+            httpd = create_http_server(self, host, port, config.http_server_mode, config.http_workers,
+                                       config.http_backlog, config.http_keepalive_timeout, config.http_max_push)
+            print(f"🌐 Servidor HTTP iniciado en puerto {httpd.server_address[1]} (todas las interfaces, modo {config.http_server_mode})")
             thread = threading.Thread(target=httpd.serve_forever, daemon=True)
             thread.start()
             return httpd
@@ -532,18 +1394,75 @@ Controla el juego del gato desde Telegram
             print(f"❌ Error iniciando servidor HTTP: {e}")
             return None
 
+    def start_worker_pool(self, host, port):
+        """Modo multiproceso: HTTP_PROCESSES procesos HTTP y un servidor interno para las rutas reenviadas"""
+        from multiproc import WorkerPool
+        config = self.config
+        # El servidor interno no limita toques: ya lo hacen los procesos HTTP, y aquí todos llegan de 127.0.0.1
+        internal = create_http_server(self, "127.0.0.1", 0, 'threaded', config.http_workers, config.http_backlog,
+                                      config.http_keepalive_timeout, max_push=0, rate_limited=False)
+        self.worker_pool = WorkerPool(self.shared, internal, host, port, config.http_backlog,
+                                      config.http_sync_interval_ms / 1000, options={
+                                          'threads': config.http_workers,
+                                          'backlog': config.http_backlog,
+                                          'keepalive_timeout': config.http_keepalive_timeout,
+                                          'max_push': config.http_max_push,
+                                          'tap_rate': config.tap_rate_limit,
+                                          'tap_burst': config.tap_burst,
+                                          'tap_min_interval': config.tap_min_interval_ms / 1000,
+                                          'rate_limit_clients': config.rate_limit_clients,
+                                      })
+        self.worker_pool.start()
+        print(f"🌐 Servidor HTTP iniciado en puerto {self.worker_pool.server_address[1]} "
+              f"({config.http_processes} procesos, toques en memoria compartida)")
+        return self.worker_pool
+
+    def sync_worker_taps(self):
+        """
+        Aplicar ya los toques que los procesos HTTP confirmaron y aún no se
+        sumaron, para que cuenten en la partida en la que llegaron y no se
+        pierdan (o pasen a la siguiente) al parar, iniciar o reiniciar.
+        Se llama sin el lock de la sesión: sync() toma los de todas.
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.sync()
+
+    def rejected_taps(self):
+        """Toques rechazados (por ritmo, por rebote), sumando los de los procesos HTTP"""
+        limited, debounced = self.tap_limiter.limited, self.tap_limiter.debounced
+        if self.worker_pool is not None:
+            worker_limited, worker_debounced = self.worker_pool.rejected()
+            limited, debounced = limited + worker_limited, debounced + worker_debounced
+        return limited, debounced
+
     # =================== EJECUCIÓN ===================
     def run(self):
         """Ejecutar el bot"""
-        print("🤖 PawPlay Bot iniciado...")
-        print(f"📁 Archivos de datos: {GAME_DATA_FILE}, {STATS_FILE}")
-        
-        # Iniciar servidor HTTP
-        self.start_http_server()
+        print(f"🤖 PawPlay Bot iniciado ({self.init_seconds * 1000:.0f} ms)...")
+        print(f"📁 Archivos de datos: {GAME_DATA_FILE}, {STATS_FILE} "
+              f"(+{len(self.sessions) - 1} comederos en {self.config.sessions_dir}/)")
         
         try:
-            self.bot.message_loop(self.handle_message)
-            print("🟢 Bot escuchando mensajes...")
+            if self.telegram is not None:
+                # El event loop arranca el servidor HTTP y llama a shutdown() al parar
+                self.telegram.run(self)
+                return
+
+            # Iniciar servidor HTTP
+            self.httpd = self.start_http_server()
+
+            if self.headless:
+                if self.httpd is None:
+                    return
+                print("🟢 Modo headless: solo la API HTTP, sin Telegram")
+            else:
+                try:
+                    self.set_bot_username(self.bot.getMe().get('username'))
+                except Exception as e:
+                    print(f"⚠️ No se pudo obtener el nombre del bot: {e}")
+
+                self.bot.message_loop(self.handle_message)
+                print("🟢 Bot escuchando mensajes...")
             
             while True:
                 time.sleep(10)
@@ -552,8 +1471,48 @@ Controla el juego del gato desde Telegram
             print("\n⏹️ Bot detenido por el usuario")
         except Exception as e:
             print(f"❌ Error en el bot: {e}")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Detener el servidor HTTP y escribir los cambios pendientes antes de salir"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        self.profiler.stop()
+        self.timers.close()
+        self.scoreboard.close()
+        self.notifier.close()
+        self.outbox.close()
+        self.flusher.close()
+        for session in self.sessions.all():
+            session.close()
+        self.stats_store.close()
+        self.chat_feeders_store.close()
+        self.scoreboards_store.close()
+        self.notifications_store.close()
+        self.schedules_store.close()
+        if self.history is not None:
+            self.history.close()
+        if self.shared is not None:
+            self.shared.close(unlink=True)
+        print(f"💾 Datos guardados ({self.flush_count()} escrituras en esta ejecución)")
 
 # =================== EJECUCIÓN PRINCIPAL ===================
+def stop_on_sigterm(signum, frame):
+    """SIGTERM (al desplegar o reiniciar) se trata como Ctrl+C: se guarda todo antes de salir"""
+    raise KeyboardInterrupt
+
+
 if __name__ == "__main__":
-    bot = PawPlayBot()
+    # python pawplay_bot.py --headless: solo la API HTTP con el estado local (sin token)
+    config = Config.from_env()
+    if '--headless' in sys.argv[1:]:
+        config.telegram_transport = 'none'
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    bot = PawPlayBot(config)
     bot.run()
\ No newline at end of file
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Persistencia write-behind para PawPlay Bot
+Las mutaciones solo marcan el estado como sucio; un hilo en segundo plano
+escribe instantáneas coalescidas de forma atómica (archivo temporal + rename).
+Un mismo SnapshotFlusher puede atender muchos documentos (uno por comedero)
+con un único hilo.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import metrics
+
+FLUSH_SECONDS = metrics.histogram('pawplay_snapshot_flush_duration_seconds',
+                                  'Duración de las escrituras de instantáneas JSON', ('document',))
+FLUSH_ERRORS = metrics.counter('pawplay_snapshot_flush_errors_total',
+                               'Escrituras de instantáneas fallidas', ('document',))
+
+
+class SnapshotFlusher:
+    """Hilo único que escribe los documentos pendientes de varios SnapshotStore"""
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self._pending = set()
+        self._urgent = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Iniciar el hilo de escritura en segundo plano"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-flusher", daemon=True)
+            self._thread.start()
+
+    def request(self, store, urgent=False):
+        """Programar la escritura de un documento (urgent: sin esperar el intervalo)"""
+        with self._cond:
+            first = not self._pending
+            self._pending.add(store)
+            if urgent:
+                self._urgent = True
+            if first or urgent:
+                self._cond.notify()
+
+    def close(self):
+        """Detener el hilo (los documentos se cierran por separado)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._urgent and not self._stopped:
+                    # Dar tiempo a que se acumulen más cambios antes de escribir
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+                stores = self._pending
+                self._pending = set()
+                self._urgent = False
+            for store in stores:
+                store.flush()
+
+
+class SnapshotStore:
+    """Documento JSON persistido con escritura diferida y coalescida"""
+
+    def __init__(self, path, snapshot, flush_interval=1.0, flush_threshold=500, flusher=None):
+        """
+        path: archivo destino
+        snapshot: función que devuelve una copia consistente del documento
+        flush_interval: segundos máximos que un cambio puede quedar sin escribir
+        flush_threshold: cambios pendientes que fuerzan una escritura inmediata
+        flusher: SnapshotFlusher compartido (si falta, se crea uno propio)
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.flush_threshold = max(1, flush_threshold)
+        self.flush_count = 0
+        self._snapshot = snapshot
+        self._dirty = 0
+        self._lock = threading.Lock()
+        # Reentrante para que flush() funcione dentro de writing()
+        self._write_lock = threading.RLock()
+        # Por tipo de documento (game_data, game_stats...), no por comedero
+        self._flush_seconds = FLUSH_SECONDS.labels(self.path.stem)
+        self._flush_errors = FLUSH_ERRORS.labels(self.path.stem)
+        self._own_flusher = flusher is None
+        self._flusher = flusher or SnapshotFlusher(flush_interval)
+
+    def start(self):
+        """Iniciar el hilo de escritura en segundo plano"""
+        self._flusher.start()
+
+    def mark_dirty(self, changes=1):
+        """Registrar cambios pendientes de escribir (no toca disco)"""
+        with self._lock:
+            self._dirty += changes
+            dirty = self._dirty
+        # Avisar al hilo con el primer cambio y al alcanzar el umbral
+        if dirty >= self.flush_threshold:
+            self._flusher.request(self, urgent=True)
+        elif dirty == changes:
+            self._flusher.request(self)
+
+    @property
+    def pending(self):
+        """Cambios aún no escritos"""
+        return self._dirty
+
+    @contextmanager
+    def writing(self):
+        """
+        Impedir escrituras de este documento mientras dura el bloque. flush()
+        toma este lock y después el del estado (dentro de snapshot), así que
+        quien necesite ambos debe tomarlos en el mismo orden: primero este.
+        """
+        with self._write_lock:
+            yield
+
+    def flush(self, force=False):
+        """Escribir la instantánea ahora si hay cambios (o si force=True)"""
+        with self._write_lock:
+            with self._lock:
+                pending = self._dirty
+                if not pending and not force:
+                    return False
+                self._dirty = 0
+            start = time.perf_counter()
+            try:
+                self._write(self._snapshot())
+            except Exception as e:
+                with self._lock:
+                    self._dirty += pending
+                self._flush_errors.inc()
+                print(f"Error guardando {self.path}: {e}")
+                # Reintentar tras el intervalo: mark_dirty solo avisa con el primer cambio
+                self._flusher.request(self)
+                return False
+            self._flush_seconds.observe(time.perf_counter() - start)
+            self.flush_count += 1
+            return True
+
+    def close(self):
+        """Detener el hilo propio (si lo hay) y escribir una instantánea final"""
+        if self._own_flusher:
+            self._flusher.close()
+        self.flush(force=True)
+
+    def _write(self, data):
+        """Escritura atómica: archivo temporal en el mismo directorio + rename"""
+        directory = self.path.parent
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                os.fchmod(f.fileno(), 0o644)  # mkstemp crea el archivo con 0600
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Perfilado bajo demanda para PawPlay Bot
+Durante una ventana acotada, un hilo toma muestras de las pilas de todos los
+hilos (sys._current_frames) y tracemalloc registra las asignaciones. Al
+terminar se escribe un informe con las funciones más calientes y los puntos
+de asignación, y se devuelve un resumen corto para Telegram.
+
+Se usa muestreo y no cProfile porque cProfile solo ve el hilo que lo activa
+y el bot reparte el trabajo entre varios hilos. Cuando no hay un perfil en
+curso no existe ningún hilo ni hook: el coste es cero.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_INTERVAL = 0.005   # 5 ms entre muestras
+MAX_DURATION = 300         # segundos como máximo por perfil
+TOP = 25                   # filas por sección del informe
+
+# Funciones donde un hilo está esperando, no trabajando: no cuentan como calientes
+IDLE_FUNCTIONS = {
+    ('threading.py', 'wait'), ('threading.py', 'wait_for'), ('threading.py', '_wait_for_tstate_lock'),
+    ('threading.py', 'join'), ('selectors.py', 'select'), ('socketserver.py', 'serve_forever'),
+    ('socket.py', 'readinto'), ('socket.py', 'accept'), ('queue.py', 'get'), ('thread.py', '_worker'),
+    ('base_events.py', '_run_once'), ('ssl.py', 'read'), ('profiling.py', '_profile'),
+    ('pawplay_bot.py', 'run'),  # bucle principal de telepot: time.sleep(10)
+}
+
+
+def _function_key(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def _describe(key):
+    filename, lineno, name = key
+    return f"{name} ({_short_path(filename)}:{lineno})"
+
+
+def _short_path(filename):
+    """Ruta relativa al proyecto o a la biblioteca estándar"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if filename.startswith(here):
+        return os.path.relpath(filename, here)
+    parts = Path(filename).parts
+    return os.path.join(*parts[-2:]) if len(parts) > 1 else filename
+
+
+class Profiler:
+    """Perfil de CPU por muestreo + tracemalloc durante una ventana acotada"""
+
+    def __init__(self, output_dir="profiles", interval=DEFAULT_INTERVAL, max_duration=MAX_DURATION,
+                 top=TOP):
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.max_duration = max_duration
+        self.top = top
+        self.last_report = None   # ruta del último informe
+        self.last_summary = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, duration, on_done=None):
+        """
+        Empezar un perfil de `duration` segundos (acotado a max_duration).
+        on_done(ruta_informe, resumen) se llama al terminar desde el hilo del
+        perfil (ruta None si el informe falló). Devuelve False si ya hay uno en curso.
+        """
+        duration = min(max(float(duration), 1.0), self.max_duration)
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration, on_done),
+                                            name="profiler", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        """Terminar antes de tiempo el perfil en curso (también escribe el informe)"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=10)
+
+    # =================== MUESTREO ===================
+    def _run(self, duration, on_done):
+        report = None
+        try:
+            report, summary = self._profile(duration)
+        except Exception as e:
+            print(f"❌ Error generando el perfil: {e}")
+            summary = f"❌ Error generando el perfil: {e}"
+        finally:
+            # Pase lo que pase, el perfil deja de estar en curso
+            with self._lock:
+                if report is not None:
+                    self.last_report = report
+                self.last_summary = summary
+                self._thread = None
+        if on_done is not None:
+            try:
+                on_done(report, summary)
+            except Exception as e:
+                print(f"Error enviando el resumen del perfil: {e}")
+
+    def _profile(self, duration):
+        """Tomar muestras durante `duration` segundos; devuelve (ruta del informe, resumen)"""
+        tracing_before = tracemalloc.is_tracing()
+        if not tracing_before:
+            tracemalloc.start()
+        memory_start = tracemalloc.take_snapshot()
+        own_ident = threading.get_ident()
+
+        self_samples = Counter()
+        total_samples = Counter()
+        thread_samples = Counter()
+        samples = idle = 0
+        started = time.monotonic()
+        deadline = started + duration
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    samples += 1
+                    code = frame.f_code
+                    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+                        idle += 1
+                        continue
+                    thread_samples[ident] += 1
+                    self_samples[_function_key(code)] += 1
+                    seen = set()
+                    while frame is not None:
+                        key = _function_key(frame.f_code)
+                        if key not in seen:  # la recursión cuenta una vez
+                            seen.add(key)
+                            total_samples[key] += 1
+                        frame = frame.f_back
+                self._stop.wait(self.interval)
+            elapsed = time.monotonic() - started
+
+            memory_end = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing_before:
+                tracemalloc.stop()
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        threads = Counter({names.get(ident, str(ident)): count for ident, count in thread_samples.items()})
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        allocations = memory_end.filter_traces(filters).compare_to(
+            memory_start.filter_traces(filters), 'lineno')
+
+        report = self._write_report(elapsed, samples, idle, self_samples, total_samples, threads,
+                                    allocations, current, peak)
+        return report, self._summary(elapsed, samples - idle, self_samples, allocations, report)
+
+    # =================== INFORMES ===================
+    def _write_report(self, elapsed, samples, idle, self_samples, total_samples, threads,
+                      allocations, current, peak):
+        active = max(1, samples - idle)
+        lines = [
+            f"Perfil PawPlay Bot - {datetime.now().isoformat(timespec='seconds')}",
+            f"Duración: {elapsed:.1f} s, intervalo {self.interval * 1000:.0f} ms, "
+            f"{samples} muestras ({samples - idle} activas, {idle} en espera)",
+            "",
+            "== Funciones más calientes (tiempo propio, % de muestras activas) ==",
+        ]
+        for key, count in self_samples.most_common(self.top):
+            lines.append(f"{count * 100 / active:6.2f}%  {count:7d}  {_describe(key)}")
+        lines += ["", "== Tiempo acumulado (función o las que llama) =="]
+        for key, count in total_samples.most_common(self.top):
+            lines.append(f"{count * 100 / active:6.2f}%  {count:7d}  {_describe(key)}")
+        lines += ["", "== Hilos (muestras activas) =="]
+        for name, count in threads.most_common():
+            lines.append(f"{count * 100 / active:6.2f}%  {count:7d}  {name}")
+        lines += ["", "== Memoria (tracemalloc) ==",
+                  f"Actual: {current / 1024:.1f} KiB, pico: {peak / 1024:.1f} KiB",
+                  "Cambios durante la ventana:"]
+        for stat in allocations[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:+10.1f} KiB  {stat.count_diff:+8d} bloques  "
+                         f"{_short_path(frame.filename)}:{frame.lineno}")
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def _summary(self, elapsed, active, self_samples, allocations, report):
+        lines = [f"🔬 Perfil de {elapsed:.0f} s ({active} muestras activas)", "", "🔥 Más calientes:"]
+        for key, count in self_samples.most_common(5):
+            lines.append(f"• {count * 100 / max(1, active):.1f}% {_describe(key)}")
+        if not self_samples:
+            lines.append("• (sin actividad)")
+        lines += ["", "🧠 Asignaciones:"]
+        for stat in allocations[:3]:
+            frame = stat.traceback[0]
+            lines.append(f"• {stat.size_diff / 1024:+.1f} KiB {_short_path(frame.filename)}:{frame.lineno}")
+        lines += ["", f"📄 Informe: {report}"]
+        return "\n".join(lines)
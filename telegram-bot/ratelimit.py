@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Límite de toques por cliente para la API HTTP de PawPlay Bot
+Cada cliente (X-Device-Id o IP) tiene un token bucket: `rate` toques por
+segundo con ráfagas de hasta `burst`. Además, un toque que llega antes de
+`min_interval` desde el anterior del mismo cliente es físicamente imposible
+(doble disparo del evento táctil, un bucle con errores) y se descarta. Los
+toques descartados también gastan fichas, así que un cliente que no para
+acaba recibiendo 429.
+
+Comprobar un toque es O(1): los buckets se reparten en varios OrderedDict
+con su propio lock (para que el limitador no sea un cuello de botella entre
+hilos) y cada uno guarda como mucho max_clients / shards clientes; al
+llenarse se olvida el que lleva más tiempo sin tocar, que a esas alturas
+tendría el bucket lleno de todas formas. Los rechazos se cuentan por
+limitador (en cada shard, con su lock ya tomado); el bot los suma a los de
+los procesos HTTP para /estado y /metrics.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+ALLOWED = 'allowed'
+DEBOUNCED = 'debounce'
+LIMITED = 'rate_limit'
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated', 'last_tap')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.last_tap = float('-inf')
+
+
+class _Shard:
+    __slots__ = ('lock', 'buckets', 'limited', 'debounced')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # cliente -> _Bucket, el menos reciente primero
+        self.limited = 0
+        self.debounced = 0
+
+
+class TapLimiter:
+    """Token bucket + rebote por cliente con memoria acotada"""
+
+    def __init__(self, rate=20.0, burst=40, min_interval=0.03, max_clients=4096, shards=16):
+        """
+        rate: fichas por segundo (<= 0 desactiva el límite de ritmo)
+        min_interval: segundos mínimos entre dos toques del mismo cliente (0 desactiva el rebote)
+        """
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.min_interval = min_interval
+        self.shard_size = max(1, max_clients // shards)
+        self._shards = [_Shard() for _ in range(shards)]
+
+    @property
+    def limited(self):
+        """Toques rechazados por ritmo en este limitador"""
+        return sum(shard.limited for shard in self._shards)
+
+    @property
+    def debounced(self):
+        """Toques descartados por rebote en este limitador"""
+        return sum(shard.debounced for shard in self._shards)
+
+    def __len__(self):
+        return sum(len(shard.buckets) for shard in self._shards)
+
+    def check(self, client, tap=True, now=None):
+        """
+        Decidir si se acepta una petición del cliente: (resultado, segundos de espera).
+        Con tap=False (p. ej. un lote) solo cuenta para el límite de ritmo.
+        """
+        if now is None:
+            now = time.monotonic()
+        shard = self._shards[hash(client) % len(self._shards)]
+        buckets = shard.buckets
+        with shard.lock:
+            bucket = buckets.get(client)
+            if bucket is None:
+                bucket = buckets[client] = _Bucket(self.burst, now)
+                if len(buckets) > self.shard_size:
+                    buckets.popitem(last=False)  # el cliente inactivo desde hace más tiempo
+            else:
+                buckets.move_to_end(client)
+                if self.rate > 0:
+                    bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+            if self.rate > 0:
+                if bucket.tokens < 1.0:
+                    shard.limited += 1
+                    return LIMITED, (1.0 - bucket.tokens) / self.rate
+                bucket.tokens -= 1.0
+            if tap:
+                if now - bucket.last_tap < self.min_interval:
+                    shard.debounced += 1
+                    return DEBOUNCED, 0.0
+                bucket.last_tap = now
+            return ALLOWED, 0.0
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+Partidas programadas de PawPlay Bot (/programar, /horarios, /cancelar)
+Un único hilo atiende todos los temporizadores desde un heap ordenado por
+instante: duerme hasta el siguiente (sin sondeos ni un hilo por
+temporizador), así que miles de horarios entre todos los comederos cuestan
+lo mismo que uno.
+
+- Horarios diarios o de una vez: a la hora indicada empiezan una partida en el
+  comedero y la paran tras `minutes` minutos.
+- Parada por inactividad: si una partida pasa N minutos sin toques se para.
+  Cada toque solo anota la hora (O(1), sin tocar el heap); cuando vence el
+  temporizador se comprueba el último toque y, si hubo alguno, se vuelve a
+  armar para el nuevo plazo.
+
+Los horarios, las partidas programadas en curso y los minutos de inactividad
+de cada comedero se guardan con snapshot() y se recuperan con load().
+"""
+
+import heapq
+import itertools
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+
+REPEAT_DAILY = 'daily'
+REPEAT_ONCE = 'once'
+REPEAT_ALIASES = {
+    'diario': REPEAT_DAILY, 'diaria': REPEAT_DAILY, 'daily': REPEAT_DAILY,
+    'una': REPEAT_ONCE, 'once': REPEAT_ONCE, 'hoy': REPEAT_ONCE,
+}
+STOP_SCHEDULED = 'schedule'  # fin de una partida programada
+STOP_IDLE = 'idle'           # parada por inactividad
+
+MAX_PER_FEEDER = 50     # horarios por comedero
+MAX_MINUTES = 24 * 60   # duración máxima de una partida programada
+MAX_WAIT = 60.0         # el hilo revisa el reloj al menos cada minuto (cambios de hora, suspensión)
+TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3])[:.h]([0-5]\d)$')
+
+
+def parse_time(text):
+    """'8:00', '18.30' o '7h05' -> 'HH:MM'; ValueError si no es una hora válida"""
+    match = TIME_PATTERN.match(text.strip().lower())
+    if match is None:
+        raise ValueError(f"Hora no válida: {text!r} (usa HH:MM)")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def next_occurrence(at, after, on_date=None):
+    """
+    Siguiente instante (epoch, hora local) posterior a `after` con la hora
+    'HH:MM'; con `on_date` solo ese día (None si ya pasó).
+    """
+    hour, minute = map(int, at.split(':'))
+    if on_date is not None:
+        when = datetime.combine(on_date, dtime(hour, minute)).timestamp()
+        return when if when > after else None
+    day = datetime.fromtimestamp(after).date()
+    for offset in range(3):  # hoy, mañana o (si un cambio de hora se salta esa hora) pasado
+        when = datetime.combine(day + timedelta(days=offset), dtime(hour, minute)).timestamp()
+        if when > after:
+            return when
+    return None
+
+
+# =================== TEMPORIZADORES ===================
+class Timer:
+    __slots__ = ('when', 'callback', 'args', 'active')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.active = True
+
+
+class Timers:
+    """Heap de temporizadores atendido por un único hilo"""
+
+    def __init__(self, clock=time.time, max_wait=MAX_WAIT):
+        self.clock = clock
+        self.max_wait = max_wait
+        self.fired = 0
+        self._heap = []  # (instante, orden, Timer)
+        self._order = itertools.count()
+        self._cancelled = 0  # temporizadores cancelados que siguen en el heap
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def add(self, when, callback, *args):
+        """Llamar a callback(*args) desde el hilo de temporizadores en el instante `when`"""
+        timer = Timer(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._order), timer))
+            if self._heap[0][2] is timer:
+                self._cond.notify()  # es el primero: el hilo duerme hasta otro más tardío
+        return timer
+
+    def cancel(self, timer):
+        """Cancelar un temporizador (se borra del heap más tarde; no hace nada si ya venció)"""
+        if timer is None:
+            return
+        with self._cond:
+            if not timer.active:
+                return
+            timer.active = False
+            self._cancelled += 1
+            # Sin esto, armar y cancelar sin parar haría crecer el heap
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if entry[2].active]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    while self._heap and not self._heap[0][2].active:
+                        heapq.heappop(self._heap)
+                        self._cancelled -= 1
+                    now = self.clock()
+                    if self._heap and self._heap[0][0] <= now:
+                        timer = heapq.heappop(self._heap)[2]
+                        timer.active = False
+                        break
+                    self._cond.wait(min(self._heap[0][0] - now, self.max_wait) if self._heap else None)
+            self.fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f"Error en temporizador programado: {e}")
+
+
+# =================== HORARIOS DE JUEGO ===================
+class Schedule:
+    """Partida programada de un comedero"""
+
+    __slots__ = ('id', 'feeder_id', 'chat_id', 'at', 'minutes', 'repeat', 'on_date', 'player',
+                 'ends_at', 'next_start', 'start_timer', 'stop_timer')
+
+    def __init__(self, schedule_id, feeder_id, chat_id, at, minutes, repeat, on_date=None, player=None):
+        self.id = schedule_id
+        self.feeder_id = feeder_id
+        self.chat_id = chat_id
+        self.at = at              # 'HH:MM' (hora local)
+        self.minutes = minutes
+        self.repeat = repeat
+        self.on_date = on_date    # día de un horario de una vez
+        self.player = player
+        self.ends_at = None       # fin de la partida programada en curso
+        self.next_start = None
+        self.start_timer = None
+        self.stop_timer = None
+
+    def to_dict(self):
+        return {'id': self.id, 'feeder': self.feeder_id, 'chat_id': self.chat_id, 'at': self.at,
+                'minutes': self.minutes, 'repeat': self.repeat,
+                'date': self.on_date.isoformat() if self.on_date else None,
+                'player': self.player, 'ends_at': self.ends_at}
+
+    @classmethod
+    def from_dict(cls, data):
+        on_date = data.get('date')
+        schedule = cls(int(data['id']), data['feeder'], data.get('chat_id'), parse_time(data['at']),
+                       int(data['minutes']), data.get('repeat', REPEAT_DAILY),
+                       date.fromisoformat(on_date) if on_date else None, data.get('player'))
+        schedule.ends_at = data.get('ends_at')
+        return schedule
+
+
+class _IdleWatch:
+    __slots__ = ('minutes', 'last_tap', 'timer')
+
+    def __init__(self, minutes, now):
+        self.minutes = minutes
+        self.last_tap = now
+        self.timer = None
+
+
+class PlayScheduler:
+    """Horarios de partidas y paradas por inactividad sobre un único Timers"""
+
+    def __init__(self, timers, start_game, stop_game, idle_minutes=0, on_change=None,
+                 max_per_feeder=MAX_PER_FEEDER):
+        """
+        start_game(schedule) -> True si empezó la partida (se llama desde el hilo de temporizadores)
+        stop_game(feeder_id, chat_id, reason): parar la partida (reason: STOP_SCHEDULED o STOP_IDLE)
+        idle_minutes: minutos sin toques para parar una partida (0 = nunca) si el comedero no tiene los suyos
+        on_change(): los horarios cambiaron (para persistirlos)
+        """
+        self.timers = timers
+        self.start_game = start_game
+        self.stop_game = stop_game
+        self.default_idle = idle_minutes
+        self.on_change = on_change
+        self.max_per_feeder = max_per_feeder
+        self._schedules = {}     # id -> Schedule
+        self._running = {}       # feeder_id -> Schedule con partida en curso
+        self._idle_minutes = {}  # feeder_id -> minutos (los que cambió /programar inactividad)
+        self._idle = {}          # feeder_id -> _IdleWatch de la partida en curso
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    # =================== HORARIOS ===================
+    def add(self, feeder_id, chat_id, at, minutes, repeat=REPEAT_DAILY, player=None):
+        """Programar una partida; ValueError si los datos no son válidos o hay demasiados horarios"""
+        at = parse_time(at)
+        if not 1 <= minutes <= MAX_MINUTES:
+            raise ValueError(f"La duración debe estar entre 1 y {MAX_MINUTES} minutos")
+        if repeat not in (REPEAT_DAILY, REPEAT_ONCE):
+            raise ValueError(f"Repetición no válida: {repeat!r}")
+        now = self.timers.clock()
+        on_date = None
+        if repeat == REPEAT_ONCE:
+            on_date = datetime.fromtimestamp(next_occurrence(at, now)).date()
+        with self._lock:
+            if sum(1 for s in self._schedules.values() if s.feeder_id == feeder_id) >= self.max_per_feeder:
+                raise ValueError(f"Máximo de {self.max_per_feeder} horarios por comedero")
+            schedule = Schedule(self._next_id, feeder_id, chat_id, at, minutes, repeat, on_date, player)
+            self._next_id += 1
+            self._schedules[schedule.id] = schedule
+            self._arm_start(schedule, now)
+        self._changed()
+        return schedule
+
+    def cancel(self, schedule_id):
+        """Borrar un horario (la partida en curso sigue sin parada automática); None si no existe"""
+        with self._lock:
+            schedule = self._schedules.pop(schedule_id, None)
+            if schedule is None:
+                return None
+            self.timers.cancel(schedule.start_timer)
+            self.timers.cancel(schedule.stop_timer)
+            if self._running.get(schedule.feeder_id) is schedule:
+                del self._running[schedule.feeder_id]
+        self._changed()
+        return schedule
+
+    def get(self, schedule_id):
+        return self._schedules.get(schedule_id)
+
+    def schedules(self, feeder_id=None):
+        """Horarios (de un comedero o todos) ordenados por hora"""
+        with self._lock:
+            schedules = [s for s in self._schedules.values() if feeder_id is None or s.feeder_id == feeder_id]
+        return sorted(schedules, key=lambda s: (s.at, s.id))
+
+    def __len__(self):
+        return len(self._schedules)
+
+    def _arm_start(self, schedule, now):
+        """Armar el próximo inicio (requiere self._lock); False si no habrá más"""
+        schedule.next_start = next_occurrence(schedule.at, now, schedule.on_date)
+        if schedule.next_start is None:
+            schedule.start_timer = None
+            return False
+        schedule.start_timer = self.timers.add(schedule.next_start, self._fire_start, schedule)
+        return True
+
+    def _fire_start(self, schedule):
+        with self._lock:
+            if self._schedules.get(schedule.id) is not schedule:
+                return
+            now = self.timers.clock()
+            if schedule.repeat == REPEAT_DAILY:
+                self._arm_start(schedule, now + 1)
+            else:
+                schedule.start_timer = schedule.next_start = None
+        started = self.start_game(schedule)
+        with self._lock:
+            if self._schedules.get(schedule.id) is not schedule:
+                return
+            if started:
+                schedule.ends_at = now + schedule.minutes * 60
+                schedule.stop_timer = self.timers.add(schedule.ends_at, self._fire_stop, schedule)
+                self._running[schedule.feeder_id] = schedule
+            elif schedule.repeat == REPEAT_ONCE:
+                del self._schedules[schedule.id]
+        self._changed()
+
+    def _fire_stop(self, schedule):
+        with self._lock:
+            if self._running.get(schedule.feeder_id) is not schedule:
+                return
+        # La parada llega a game_stopped(), que cierra la partida programada
+        self.stop_game(schedule.feeder_id, schedule.chat_id, STOP_SCHEDULED)
+        self._finish(schedule)
+
+    def _finish(self, schedule):
+        """La partida programada terminó (por tiempo, a mano o por inactividad)"""
+        with self._lock:
+            if self._running.get(schedule.feeder_id) is schedule:
+                del self._running[schedule.feeder_id]
+            self.timers.cancel(schedule.stop_timer)
+            schedule.stop_timer = schedule.ends_at = None
+            if schedule.repeat == REPEAT_ONCE and schedule.start_timer is None:
+                self._schedules.pop(schedule.id, None)
+        self._changed()
+
+    # =================== INACTIVIDAD ===================
+    def idle_minutes(self, feeder_id):
+        return self._idle_minutes.get(feeder_id, self.default_idle)
+
+    def set_idle_minutes(self, feeder_id, minutes):
+        """Minutos sin toques que paran las partidas del comedero (0 = nunca); se aplica en la siguiente"""
+        if not 0 <= minutes <= MAX_MINUTES:
+            raise ValueError(f"Los minutos deben estar entre 0 y {MAX_MINUTES}")
+        with self._lock:
+            self._idle_minutes[feeder_id] = minutes
+        self._changed()
+
+    def game_started(self, feeder_id):
+        """Partida iniciada (a mano o programada): armar la parada por inactividad"""
+        minutes = self.idle_minutes(feeder_id)
+        with self._lock:
+            watch = self._idle.pop(feeder_id, None)
+            if watch is not None:
+                self.timers.cancel(watch.timer)
+            if minutes > 0:
+                watch = self._idle[feeder_id] = _IdleWatch(minutes, self.timers.clock())
+                watch.timer = self.timers.add(watch.last_tap + minutes * 60, self._fire_idle, feeder_id, watch)
+
+    def game_stopped(self, feeder_id):
+        """Partida parada: desarmar la inactividad y cerrar la partida programada en curso"""
+        with self._lock:
+            watch = self._idle.pop(feeder_id, None)
+            if watch is not None:
+                self.timers.cancel(watch.timer)
+            schedule = self._running.get(feeder_id)
+        if schedule is not None:
+            self._finish(schedule)
+
+    def touch(self, feeder_id):
+        """Toque en el comedero (camino caliente: solo anota la hora)"""
+        watch = self._idle.get(feeder_id)
+        if watch is not None:
+            watch.last_tap = self.timers.clock()
+
+    def _fire_idle(self, feeder_id, watch):
+        with self._lock:
+            if self._idle.get(feeder_id) is not watch:
+                return
+            deadline = watch.last_tap + watch.minutes * 60
+            if deadline > self.timers.clock():
+                # Hubo toques: volver a armar para el plazo nuevo
+                watch.timer = self.timers.add(deadline, self._fire_idle, feeder_id, watch)
+                return
+            del self._idle[feeder_id]
+            schedule = self._running.get(feeder_id)
+        self.stop_game(feeder_id, schedule.chat_id if schedule else None, STOP_IDLE)
+
+    # =================== PERSISTENCIA ===================
+    def snapshot(self):
+        """Copia serializable de los horarios"""
+        with self._lock:
+            return {'next_id': self._next_id,
+                    'schedules': [s.to_dict() for s in sorted(self._schedules.values(), key=lambda s: s.id)],
+                    'idle_minutes': dict(self._idle_minutes)}
+
+    def load(self, data):
+        """Recuperar los horarios guardados y armar sus temporizadores"""
+        now = self.timers.clock()
+        with self._lock:
+            self._idle_minutes.update({feeder_id: int(minutes)
+                                       for feeder_id, minutes in (data.get('idle_minutes') or {}).items()})
+            for entry in data.get('schedules', []):
+                try:
+                    schedule = Schedule.from_dict(entry)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Horario ignorado ({e}): {entry}")
+                    continue
+                self._schedules[schedule.id] = schedule
+                self._next_id = max(self._next_id, schedule.id + 1)
+                if schedule.ends_at is not None:
+                    # Partida programada en curso al parar el bot: se para a su hora (o ya)
+                    self._running[schedule.feeder_id] = schedule
+                    schedule.stop_timer = self.timers.add(schedule.ends_at, self._fire_stop, schedule)
+                if not self._arm_start(schedule, now) and schedule.ends_at is None:
+                    print(f"⏰ Horario {schedule.id} ({schedule.on_date} {schedule.at}) vencido mientras el bot estaba parado")
+                    del self._schedules[schedule.id]
+            self._next_id = max(self._next_id, int(data.get('next_id', 1)))
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Marcador en vivo de PawPlay Bot
+Al empezar una partida, cada chat suscrito al comedero recibe un mensaje que
+se va editando (editMessageText) con los aciertos y fallos. Las ediciones de
+un chat se agrupan: como mucho una cada `interval` segundos, con el estado
+más reciente, y no se envían si el texto no cambió.
+
+Los toques solo marcan el marcador como pendiente (O(1), sin esperar a
+Telegram); un único hilo hace los envíos y las ediciones, con turnos del
+outbox para no saltarse su ritmo por chat y global.
+"""
+
+import threading
+import time
+
+import metrics
+from outbox import RetryAfter, SendRejected
+
+EDIT_SECONDS = metrics.histogram('pawplay_scoreboard_edit_duration_seconds',
+                                 'Duración de cada envío o edición del marcador en vivo',
+                                 buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+ERROR_BACKOFF = 10.0  # segundos antes de reintentar tras un error de red
+
+
+def _message_id(result):
+    """message_id de la respuesta de sendMessage (dict de telepot u objeto Message)"""
+    if isinstance(result, dict):
+        return result.get('message_id')
+    return getattr(result, 'message_id', None)
+
+
+class _Board:
+    """Mensaje de marcador de un chat para la partida en curso"""
+
+    __slots__ = ('chat_id', 'feeder_id', 'message_id', 'text', 'next_edit', 'final')
+
+    def __init__(self, chat_id, feeder_id):
+        self.chat_id = chat_id
+        self.feeder_id = feeder_id
+        self.message_id = None  # None hasta que se envía el primer mensaje
+        self.text = None        # último texto enviado
+        self.next_edit = 0.0
+        self.final = False      # partida terminada: una última edición y se olvida
+
+
+class LiveScoreboard:
+    """Suscripciones chat -> comedero y hilo que mantiene los marcadores al día"""
+
+    def __init__(self, transport, render, interval=3.0, pacer=None):
+        """
+        transport: send(chat_id, text) y edit(chat_id, message_id, text)
+        render(feeder_id, final) -> texto del marcador
+        pacer: OutboundQueue cuyos turnos (reserve/retry_after) se respetan
+        """
+        self.transport = transport
+        self.render = render
+        self.interval = interval
+        self.pacer = pacer
+        self.sent = 0      # mensajes de marcador creados
+        self.edits = 0     # ediciones enviadas
+        self.skipped = 0   # ediciones evitadas porque el texto no cambió
+
+        self._subscribers = {}  # feeder_id -> set(chat_id)
+        self._chat_feeder = {}  # chat_id -> feeder_id
+        self._boards = {}       # chat_id -> _Board de la partida en curso
+        self._dirty = set()     # chat_ids con cambios sin enviar
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="scoreboard", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=5.0):
+        """Detener el hilo (los marcadores pendientes se quedan con su último texto)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # =================== SUSCRIPCIONES ===================
+    def subscribe(self, chat_id, feeder_id, active=False):
+        """Suscribir un chat a un comedero; con `active` se publica ya el marcador de la partida en curso"""
+        with self._cond:
+            self._unsubscribe(chat_id)
+            self._chat_feeder[chat_id] = feeder_id
+            self._subscribers.setdefault(feeder_id, set()).add(chat_id)
+            if active:
+                self._new_board(chat_id, feeder_id)
+                self._cond.notify()
+
+    def unsubscribe(self, chat_id):
+        """Quitar la suscripción de un chat; devuelve False si no estaba suscrito"""
+        with self._cond:
+            return self._unsubscribe(chat_id)
+
+    def subscription(self, chat_id):
+        """Comedero al que está suscrito el chat (None si no lo está)"""
+        return self._chat_feeder.get(chat_id)
+
+    def subscriptions(self):
+        """Copia de las suscripciones chat -> comedero"""
+        with self._cond:
+            return dict(self._chat_feeder)
+
+    def _unsubscribe(self, chat_id):
+        feeder_id = self._chat_feeder.pop(chat_id, None)
+        if feeder_id is None:
+            return False
+        chats = self._subscribers.get(feeder_id)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self._subscribers[feeder_id]
+        self._boards.pop(chat_id, None)
+        self._dirty.discard(chat_id)
+        return True
+
+    def _new_board(self, chat_id, feeder_id):
+        # La partida anterior, si la había, conserva su mensaje con el último texto
+        self._boards[chat_id] = _Board(chat_id, feeder_id)
+        self._dirty.add(chat_id)
+
+    # =================== EVENTOS DE LOS COMEDEROS ===================
+    def game_started(self, feeder_id):
+        """Nueva partida: un mensaje nuevo en cada chat suscrito"""
+        if feeder_id not in self._subscribers:
+            return
+        with self._cond:
+            for chat_id in self._subscribers.get(feeder_id, ()):
+                self._new_board(chat_id, feeder_id)
+            self._cond.notify()
+
+    def changed(self, feeder_id):
+        """Toque u otro cambio: marcar los marcadores del comedero como pendientes"""
+        if feeder_id not in self._subscribers:
+            return  # camino de los toques: sin suscriptores no cuesta nada
+        with self._cond:
+            self._mark(feeder_id, final=False)
+
+    def game_stopped(self, feeder_id):
+        """Fin de la partida: última edición con el resultado"""
+        if feeder_id not in self._subscribers:
+            return
+        with self._cond:
+            self._mark(feeder_id, final=True)
+
+    def _mark(self, feeder_id, final):
+        """(requiere self._cond)"""
+        woke = False
+        for chat_id in self._subscribers.get(feeder_id, ()):
+            board = self._boards.get(chat_id)
+            if board is None:
+                continue
+            board.final = board.final or final
+            if chat_id not in self._dirty:
+                self._dirty.add(chat_id)
+                woke = True
+        if woke:
+            self._cond.notify()
+
+    # =================== HILO DE EDICIÓN ===================
+    def _due(self):
+        """Marcadores pendientes cuyo intervalo ya pasó y espera hasta el próximo (requiere self._cond)"""
+        now = time.monotonic()
+        due, wait = [], None
+        for chat_id in list(self._dirty):
+            board = self._boards.get(chat_id)
+            if board is None:
+                self._dirty.discard(chat_id)
+            elif board.next_edit <= now:
+                self._dirty.discard(chat_id)
+                due.append(board)
+            else:
+                remaining = board.next_edit - now
+                wait = remaining if wait is None else min(wait, remaining)
+        return due, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    due, wait = self._due()
+                    if due:
+                        break
+                    self._cond.wait(wait)
+            for board in due:
+                self._update(board)
+
+    def _update(self, board):
+        """Enviar o editar el mensaje de un marcador con el estado actual"""
+        final = board.final
+        try:
+            text = self.render(board.feeder_id, final)
+        except Exception as e:
+            print(f"Error generando el marcador de {board.feeder_id}: {e}")
+            return
+        retry_in = None
+        rejected = False
+        wait = self.pacer.chat_wait(board.chat_id) if self.pacer is not None else 0.0
+        if text == board.text:
+            self.skipped += 1
+        elif wait > 0:
+            retry_in = wait  # el chat acaba de recibir otro mensaje: editar en su próximo turno
+        else:
+            if self.pacer is not None:
+                delay = self.pacer.reserve(board.chat_id)
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.perf_counter()
+            try:
+                if board.message_id is None:
+                    board.message_id = _message_id(self.transport.send(board.chat_id, text))
+                    self.sent += 1
+                else:
+                    self.transport.edit(board.chat_id, board.message_id, text)
+                    self.edits += 1
+                board.text = text
+                EDIT_SECONDS.observe(time.perf_counter() - start)
+            except RetryAfter as e:
+                retry_in = float(e.retry_after)
+                if self.pacer is not None:
+                    self.pacer.retry_after(board.chat_id, retry_in)
+            except SendRejected as e:
+                # Chat inexistente, bot expulsado o mensaje borrado: dejar este marcador
+                print(f"Marcador en vivo de {board.chat_id} descartado: {e}")
+                rejected = True
+            except Exception as e:
+                print(f"Error actualizando el marcador de {board.chat_id}: {e}")
+                retry_in = ERROR_BACKOFF
+
+        with self._cond:
+            if self._boards.get(board.chat_id) is not board:
+                return  # nueva partida o baja mientras se editaba
+            if rejected or (final and board.chat_id not in self._dirty):
+                del self._boards[board.chat_id]
+                self._dirty.discard(board.chat_id)
+            elif retry_in is not None:
+                board.next_edit = time.monotonic() + retry_in
+                self._dirty.add(board.chat_id)
+                self._cond.notify()
+            else:
+                board.next_edit = time.monotonic() + self.interval
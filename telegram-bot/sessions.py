@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Sesiones de juego por comedero para PawPlay Bot
+Cada comedero (feeder) tiene su propio estado, lock, versión, registro de
+eventos e instantánea, así que los toques de un comedero nunca compiten
+con los de otro.
+"""
+
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from event_log import (EVENT_CATCH, EVENT_DIFFICULTY, EVENT_MISS, EVENT_START,
+                       EVENT_STOP, TAP_AGGREGATED, EventLog)
+from persistence import SnapshotStore
+from timeseries import DEFAULT_POINTS, RESOLUTIONS, TapActivity
+from wire import compress, encode_game_state
+
+DEFAULT_FEEDER = "default"
+FEEDER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+LOG_SEQ_KEY = "_log_seq"  # Último evento incluido en cada instantánea
+ACTIVITY_KEY = "_activity"  # Series de actividad guardadas junto a la instantánea
+GAME_CONTEXT_KEY = "_game_context"  # Partida en curso de cada comedero a la altura de LOG_SEQ_KEY
+
+# Timestamps del cliente fuera de esta ventana se sustituyen por la hora del servidor
+CLIENT_TS_MAX_AGE = 24 * 3600
+CLIENT_TS_MAX_SKEW = 60
+TAP_EVENTS = {"catch": EVENT_CATCH, "miss": EVENT_MISS}
+
+
+class GameSnapshot:
+    """
+    Estado del juego ya serializado para la app (inmutable, se comparte entre
+    peticiones). Las codificaciones binaria y gzip se obtienen del JSON la
+    primera vez que alguien las pide, sin tomar el lock de la sesión.
+    """
+
+    __slots__ = ('version', 'body', 'etag', '_binary', '_gzip')
+
+    def __init__(self, version, body, etag):
+        self.version = version
+        self.body = body
+        self.etag = etag
+        self._binary = None
+        self._gzip = None
+
+    @property
+    def binary(self):
+        if self._binary is None:
+            self._binary = encode_game_state(json.loads(self.body), self.version)
+        return self._binary
+
+    @property
+    def gzip(self):
+        if self._gzip is None:
+            self._gzip = compress(self.body)
+        return self._gzip
+
+
+def default_game_data():
+    """Datos por defecto de un comedero"""
+    return {
+        "difficulty": "medium",
+        "game_active": False,
+        "current_player": None,
+        "session_stats": {
+            "catches": 0,
+            "misses": 0,
+            "streak": 0,
+            "best_streak": 0,
+            "start_time": None
+        }
+    }
+
+
+def apply_game_event(game_data, kind, payload, ts):
+    """
+    Aplicar un evento a unos datos de juego. La usan las sesiones y, al
+    recuperar, las estadísticas globales para conocer el estado del comedero
+    en el momento de cada evento (jugador, inicio y mejor racha de la partida).
+    """
+    session = game_data.setdefault('session_stats', {"catches": 0, "misses": 0, "start_time": None})
+    if kind == EVENT_CATCH:
+        session['catches'] = session.get('catches', 0) + 1
+        # Racha de aciertos seguidos de la partida; los toques agregados no
+        # tienen orden, así que no la alargan (sus fallos sí la cortan)
+        if payload != TAP_AGGREGATED:
+            session['streak'] = streak = session.get('streak', 0) + 1
+            if streak > session.get('best_streak', 0):
+                session['best_streak'] = streak
+    elif kind == EVENT_MISS:
+        session['misses'] = session.get('misses', 0) + 1
+        session['streak'] = 0
+    elif kind == EVENT_DIFFICULTY:
+        game_data['difficulty'] = payload.decode('utf-8', 'ignore')
+    elif kind == EVENT_START:
+        game_data['game_active'] = True
+        game_data['current_player'] = payload.decode('utf-8', 'ignore')
+        game_data['session_stats'] = {
+            "catches": 0,
+            "misses": 0,
+            "streak": 0,
+            "best_streak": 0,
+            "start_time": datetime.fromtimestamp(ts).isoformat()
+        }
+    elif kind == EVENT_STOP:
+        game_data['game_active'] = False
+
+
+def game_context(game_data):
+    """Copia de la partida en curso (None si no hay ninguna) para documentos dependientes"""
+    return copy.deepcopy(game_data) if game_data.get('game_active', False) else None
+
+
+def is_valid_feeder_id(feeder_id):
+    """Ids de comedero: letras, números, '-' y '_' (máx. 32)"""
+    return bool(feeder_id) and FEEDER_ID_PATTERN.match(feeder_id) is not None
+
+
+class GameSession:
+    """Estado de juego de un comedero"""
+
+    def __init__(self, feeder_id, data_file, log_file, archive_file=None, log_max_bytes=1024 * 1024,
+                 flush_interval=1.0, flush_threshold=500, flusher=None, dedup_size=4096,
+                 on_event=None, on_compact=None):
+        """
+        on_event(session, seq, kind, payload, ts): llamado con self.lock tomado
+        tras aplicar cada evento (estadísticas globales, etc.)
+        on_compact(): llamado antes de vaciar el registro, para que otros
+        documentos que dependen de él escriban su instantánea
+        """
+        self.feeder_id = feeder_id
+        self.data_file = Path(data_file)
+        self.lock = threading.RLock()
+        # Versión del estado: aumenta con cada cambio y despierta a los clientes en espera
+        self.state_version = 0
+        self.state_changed = threading.Condition(self.lock)
+        self._snapshot_cache = None
+        self._boot_id = format(int(time.time() * 1000), 'x')  # distingue ETags entre reinicios
+        self._recent_event_ids = OrderedDict()  # LRU de ids de toques ya aplicados
+        self.dedup_size = dedup_size
+        self.on_event = on_event
+        self.on_compact = on_compact
+        self.activity = TapActivity()  # aciertos/fallos por minuto, hora y día (memoria fija)
+        self.game_data = self.load()
+        self.event_log = EventLog(log_file, log_max_bytes, archive_file)
+        self._compacting = False
+        self.store = SnapshotStore(self.data_file, self.snapshot, flush_interval, flush_threshold, flusher)
+
+    # =================== PERSISTENCIA ===================
+    def load(self):
+        """Cargar datos del comedero desde archivo"""
+        try:
+            if self.data_file.exists():
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.log_seq = data.pop(LOG_SEQ_KEY, 0)
+                self.activity = TapActivity.from_dict(data.pop(ACTIVITY_KEY, None))
+                return data
+        except Exception as e:
+            print(f"Error cargando datos de {self.feeder_id}: {e}")
+
+        self.log_seq = 0
+        return default_game_data()
+
+    def snapshot(self):
+        """Copia consistente de los datos del comedero para persistir"""
+        with self.lock:
+            data = copy.deepcopy(self.game_data)
+            data[LOG_SEQ_KEY] = self.event_log.last_seq
+            data[ACTIVITY_KEY] = self.activity.to_dict()
+            return data
+
+    def save(self):
+        """Guardar datos del comedero (escritura atómica inmediata)"""
+        self.store.mark_dirty()
+        self.store.flush()
+
+    def replay(self, dependent_seq=None):
+        """
+        Aplicar los eventos del registro posteriores a la instantánea.
+        Devuelve los eventos con seq > dependent_seq (los que aún no están en
+        documentos dependientes, como las estadísticas globales).
+        """
+        if dependent_seq is None:
+            dependent_seq = self.log_seq
+        with self.lock:
+            events = self.event_log.replay(min(self.log_seq, dependent_seq))
+            applied = 0
+            for seq, ts, kind, payload in events:
+                if seq > self.log_seq:
+                    self.apply_event(kind, payload, ts)
+                    applied += 1
+            # Tras una compactación el registro está vacío: no reutilizar secuencias ya guardadas
+            self.event_log.last_seq = max(self.event_log.last_seq, self.log_seq, dependent_seq)
+            if applied:
+                self.store.mark_dirty(applied)
+                print(f"📜 {self.feeder_id}: {applied} eventos recuperados del registro")
+            return [event for event in events if event[0] > dependent_seq]
+
+    def compact_event_log(self):
+        """Volcar el estado en la instantánea y vaciar el registro"""
+        try:
+            # Mismo orden de locks que el hilo de persistencia (escritura -> sesión); con
+            # el lock de la sesión tomado no entran eventos entre la instantánea y el vaciado
+            with self.store.writing(), self.lock:
+                self.store.flush(force=True)
+                if self.on_compact:
+                    self.on_compact()
+                self.event_log.compact()
+        except Exception as e:
+            print(f"Error compactando registro de eventos de {self.feeder_id}: {e}")
+        finally:
+            self._compacting = False
+
+    def close(self):
+        """Escribir la instantánea final y cerrar el registro"""
+        self.store.close()
+        self.event_log.close()
+
+    # =================== EVENTOS ===================
+    def record_event(self, kind, payload=b'', ts=None):
+        """Añadir un evento al registro y aplicarlo al estado (requiere self.lock)"""
+        if ts is None:
+            ts = time.time()
+        seq = self.event_log.append(kind, payload, ts)
+        self.apply_event(kind, payload, ts)
+        if self.on_event:
+            self.on_event(self, seq, kind, payload, ts)
+        self.notify_state_change()
+        self._check_compaction()
+
+    def record_events(self, records):
+        """Añadir varios eventos con una sola escritura en el registro (requiere self.lock)"""
+        if not records:
+            return 0
+        last_seq = self.event_log.append_many(records)
+        first_seq = last_seq - len(records) + 1
+        for offset, (kind, payload, ts) in enumerate(records):
+            self.apply_event(kind, payload, ts)
+            if self.on_event:
+                self.on_event(self, first_seq + offset, kind, payload, ts)
+        self.notify_state_change()
+        self._check_compaction()
+        return len(records)
+
+    def _check_compaction(self):
+        """Compactar en segundo plano si el registro superó su tamaño máximo"""
+        if self.event_log.needs_compaction() and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact_event_log, daemon=True).start()
+
+    def apply_event(self, kind, payload, ts):
+        """Mutación única del estado, compartida por los comandos y la recuperación"""
+        apply_game_event(self.game_data, kind, payload, ts)
+        if kind == EVENT_CATCH or kind == EVENT_MISS:
+            self.activity.record(ts, kind == EVENT_CATCH)
+
+    def notify_state_change(self):
+        """Aumentar la versión del estado y despertar a los clientes en espera"""
+        with self.state_changed:
+            self.state_version += 1
+            self.state_changed.notify_all()
+
+    def wait_for_change(self, since, timeout, cancelled=None):
+        """
+        Esperar hasta que la versión del estado sea distinta de `since`
+        (o hasta el timeout) y devolver la versión actual. Se compara con
+        "distinto" y no "mayor" porque la versión se reinicia con el bot.
+        """
+        with self.state_changed:
+            self.state_changed.wait_for(
+                lambda: self.state_version != since or (cancelled is not None and cancelled()),
+                timeout)
+            return self.state_version
+
+    def get_game_snapshot(self):
+        """
+        Estado del juego pre-serializado. Solo se vuelve a codificar cuando
+        cambia la versión; entre cambios todas las peticiones comparten los
+        mismos bytes, así que nunca ven un dict a medio actualizar.
+        """
+        snapshot = self._snapshot_cache
+        if snapshot is not None and snapshot.version == self.state_version:
+            return snapshot
+        with self.lock:
+            snapshot = self._snapshot_cache
+            if snapshot is None or snapshot.version != self.state_version:
+                version = self.state_version
+                snapshot = GameSnapshot(version, json.dumps(self.game_data).encode(),
+                                        f'"{self.feeder_id}-{self._boot_id}-{version}"')
+                self._snapshot_cache = snapshot
+            return snapshot
+
+    def get_timeseries(self, resolution='minute', points=None, now=None):
+        """Serie de actividad; ValueError si la resolución no existe"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Resolución inválida: {resolution!r} (usa {', '.join(RESOLUTIONS)})")
+        if points is None:
+            points = DEFAULT_POINTS[resolution]
+        with self.lock:
+            data = self.activity.series(resolution, points, time.time() if now is None else now)
+        data["feeder"] = self.feeder_id
+        return data
+
+    # =================== TOQUES ===================
+    def register_tap(self, kind):
+        """Registrar un acierto o fallo si el juego está activo"""
+        with self.lock:
+            if not self.game_data.get('game_active', False):
+                return False
+            self.record_event(kind)
+        # Escritura diferida: el hilo de persistencia coalesce los toques
+        self.store.mark_dirty()
+        return True
+
+    def register_batch(self, events, max_events):
+        """
+        Registrar un lote de toques [{"type", "ts", "id"}] con un solo lock,
+        una escritura en el registro de eventos y un solo paso de persistencia.
+        `ts` son milisegundos desde epoch (Date.now() en la app). Los ids ya
+        vistos recientemente se ignoran para que los reintentos no cuenten doble;
+        un id solo se recuerda cuando su toque se aplicó y quedó en el registro,
+        así que un lote rechazado (juego parado, error de disco) se puede reintentar.
+        Devuelve (aplicados, duplicados, ignorados).
+        """
+        if len(events) > max_events:
+            raise ValueError(f"Lote demasiado grande ({len(events)} > {max_events})")
+        now = time.time()
+        duplicates = ignored = 0
+        with self.lock:
+            active = self.game_data.get('game_active', False)
+            records = []
+            batch_ids = {}  # ids de este lote, en orden
+            for event in events:
+                kind = TAP_EVENTS.get(event.get('type')) if isinstance(event, dict) else None
+                if kind is None or not active:
+                    ignored += 1
+                    continue
+                event_id = event.get('id')
+                if event_id is not None:
+                    event_id = str(event_id)
+                    if event_id in self._recent_event_ids:
+                        self._recent_event_ids.move_to_end(event_id)
+                        duplicates += 1
+                        continue
+                    if event_id in batch_ids:
+                        duplicates += 1
+                        continue
+                    batch_ids[event_id] = True
+                records.append((kind, b'', client_timestamp(event.get('ts'), now)))
+            applied = self.record_events(records)
+            self._recent_event_ids.update(batch_ids)
+            while len(self._recent_event_ids) > self.dedup_size:
+                self._recent_event_ids.popitem(last=False)
+        if applied:
+            self.store.mark_dirty(applied)
+        return applied, duplicates, ignored
+
+    def register_taps(self, catches, misses, ts=None):
+        """
+        Registrar de una vez toques ya contados en otro sitio (los procesos
+        HTTP del modo multiproceso) si el juego está activo. Devuelve los aplicados.
+        No se sabe en qué orden llegaron, así que se marcan como agregados y
+        no cuentan para las rachas.
+        """
+        if ts is None:
+            ts = time.time()
+        with self.lock:
+            if not self.game_data.get('game_active', False):
+                return 0
+            applied = self.record_events([(EVENT_CATCH, TAP_AGGREGATED, ts)] * catches +
+                                         [(EVENT_MISS, TAP_AGGREGATED, ts)] * misses)
+        if applied:
+            self.store.mark_dirty(applied)
+        return applied
+
+
+def client_timestamp(ts_ms, now):
+    """Convertir el timestamp del cliente, descartando valores imposibles"""
+    try:
+        ts = float(ts_ms) / 1000.0
+    except (TypeError, ValueError):
+        return now
+    if now - CLIENT_TS_MAX_AGE <= ts <= now + CLIENT_TS_MAX_SKEW:
+        return ts
+    return now
+
+
+class SessionRegistry:
+    """Sesiones por id de comedero; la búsqueda no toma ningún lock global"""
+
+    def __init__(self, factory, max_sessions=500):
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()  # solo para crear sesiones nuevas
+
+    def get(self, feeder_id, create=True):
+        """Obtener (o crear) la sesión de un comedero"""
+        session = self._sessions.get(feeder_id)
+        if session is not None or not create:
+            return session
+        if not is_valid_feeder_id(feeder_id):
+            raise ValueError(f"Id de comedero inválido: {feeder_id!r}")
+        with self._lock:
+            session = self._sessions.get(feeder_id)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    raise OverflowError(f"Máximo de {self.max_sessions} comederos alcanzado")
+                session = self._factory(feeder_id)
+                self._sessions[feeder_id] = session
+            return session
+
+    def all(self):
+        """Todas las sesiones cargadas"""
+        return list(self._sessions.values())
+
+    def ids(self):
+        """Ids de los comederos cargados"""
+        return sorted(self._sessions)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Transporte asyncio de Telegram para PawPlay Bot (python-telegram-bot 20)
+Alternativa a telepot.message_loop (TELEGRAM_TRANSPORT=asyncio): un único
+event loop hace el long-polling de getUpdates, despacha los comandos con un
+límite de concurrencia, envía los mensajes del outbox y arranca/detiene el
+servidor HTTP.
+
+El servidor HTTP de la app NO corre en el event loop: es el mismo servidor
+de http_api.py (pool de hilos) que en el transporte telepot, y el loop solo
+lo arranca y lo detiene. Sus rutas toman locks de sesión síncronos, así que
+servirlas desde el loop lo bloquearía.
+
+Los comandos siguen siendo síncronos (locks, disco), así que se ejecutan en
+un pool de UPDATE_CONCURRENCY hilos; los de un mismo chat se procesan en orden.
+Con TELEGRAM_API_URL se puede apuntar a un servidor local (fake_bot_api.py).
+"""
+
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from outbox import RetryAfter, SendRejected
+
+POLL_TIMEOUT = 25          # segundos de long-polling de getUpdates
+SEND_TIMEOUT = 30.0        # espera máxima de un sendMessage desde el outbox
+SHUTDOWN_GRACE = 10.0      # segundos para terminar los comandos en curso al parar
+POLL_ERROR_BACKOFF = (1, 2, 5, 10, 30)
+
+
+class AsyncTelegram:
+    """Bucle de actualizaciones y transporte de envío sobre python-telegram-bot"""
+
+    def __init__(self, token, base_url=None, concurrency=8, poll_timeout=POLL_TIMEOUT):
+        from telegram import Bot
+        from telegram.request import HTTPXRequest
+
+        self.concurrency = max(1, concurrency)
+        self.poll_timeout = poll_timeout
+        options = {'base_url': base_url} if base_url else {}
+        self.bot = Bot(token,
+                       request=HTTPXRequest(connection_pool_size=self.concurrency + 4),
+                       get_updates_request=HTTPXRequest(read_timeout=poll_timeout + 10),
+                       **options)
+        self.loop = None
+        self.handled = 0   # actualizaciones procesadas
+        self._offset = None
+        self._stop = None
+        self._slots = None
+        self._tasks = set()
+        self._chat_locks = {}  # chat_id -> [asyncio.Lock, tareas que lo usan]
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="update")
+
+    # =================== CICLO DE VIDA ===================
+    def run(self, game_bot):
+        """Ejecutar el bucle hasta stop(), SIGINT o SIGTERM"""
+        try:
+            asyncio.run(self._main(game_bot))
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def stop(self):
+        """Pedir la parada desde cualquier hilo"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._stop.set)
+
+    async def _main(self, game_bot):
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency * 2)  # actualizaciones en curso o en espera
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self._stop.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Windows o hilo secundario: se para con stop() o KeyboardInterrupt
+
+        try:
+            async with self.bot:
+                game_bot.set_bot_username(self.bot.username)
+                # El servidor HTTP sigue en sus propios hilos (ver el docstring del módulo)
+                game_bot.httpd = await self.loop.run_in_executor(None, game_bot.start_http_server)
+                print(f"🟢 Bot escuchando mensajes (asyncio, concurrencia {self.concurrency})...")
+                poller = asyncio.create_task(self._poll(game_bot.handle_message))
+                stopper = asyncio.create_task(self._stop.wait())
+                await asyncio.wait({poller, stopper}, return_when=asyncio.FIRST_COMPLETED)
+                for task in (poller, stopper):
+                    task.cancel()
+                await asyncio.gather(poller, stopper, return_exceptions=True)
+
+                if self._tasks:
+                    await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_GRACE)
+                await self._confirm_offset()
+                # Con el loop aún vivo, para que el outbox pueda vaciarse
+                await self.loop.run_in_executor(None, game_bot.shutdown)
+        finally:
+            self.loop = None
+
+    async def _confirm_offset(self):
+        """Marcar como leídas las actualizaciones ya procesadas"""
+        if self._offset is None:
+            return
+        try:
+            await self.bot.get_updates(offset=self._offset, timeout=0, limit=1)
+        except Exception as e:
+            print(f"⚠️ No se pudo confirmar el offset de actualizaciones: {e}")
+
+    # =================== ACTUALIZACIONES ===================
+    async def _poll(self, handler):
+        from telegram.error import InvalidToken, TelegramError
+        from telegram.error import RetryAfter as TelegramRetryAfter
+
+        errors = 0
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=self._offset, timeout=self.poll_timeout,
+                                                     allowed_updates=['message'])
+                errors = 0
+            except InvalidToken:
+                raise
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(float(e.retry_after))
+                continue
+            except TelegramError as e:
+                delay = POLL_ERROR_BACKOFF[min(errors, len(POLL_ERROR_BACKOFF) - 1)]
+                errors += 1
+                print(f"⚠️ Error leyendo actualizaciones ({e}), reintentando en {delay}s")
+                await asyncio.sleep(delay)
+                continue
+
+            for update in updates:
+                self._offset = update.update_id + 1
+                if update.message is None:
+                    continue
+                # Con todos los huecos ocupados se deja de leer: Telegram guarda el resto
+                await self._slots.acquire()
+                task = asyncio.create_task(self._dispatch(handler, update.message.to_dict()))
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, handler, msg):
+        """Ejecutar el comando en el pool, en orden dentro de cada chat"""
+        chat_id = msg.get('chat', {}).get('id')
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self.loop.run_in_executor(self._executor, handler, msg)
+            self.handled += 1
+        except Exception as e:
+            print(f"Error procesando mensaje de {chat_id}: {e}")
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+
+    # =================== TRANSPORTE DEL OUTBOX ===================
+    def send(self, chat_id, text, **kwargs):
+        """sendMessage desde un hilo del outbox, ejecutado en el event loop"""
+        return self._call(lambda: self.bot.send_message(chat_id, text, **kwargs))
+
+    def edit(self, chat_id, message_id, text, **kwargs):
+        """editMessageText (marcador en vivo); un texto idéntico al actual no es un error"""
+        try:
+            return self._call(lambda: self.bot.edit_message_text(text, chat_id=chat_id,
+                                                                 message_id=message_id, **kwargs))
+        except SendRejected as e:
+            if 'not modified' in str(e):
+                return None
+            raise
+
+    def _call(self, make_coroutine):
+        from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken
+        from telegram.error import RetryAfter as TelegramRetryAfter
+
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            raise SendRejected("transporte asyncio detenido")
+        future = asyncio.run_coroutine_threadsafe(make_coroutine(), loop)
+        try:
+            return future.result(SEND_TIMEOUT)
+        except TelegramRetryAfter as e:
+            raise RetryAfter(float(e.retry_after))
+        except (BadRequest, Forbidden, ChatMigrated, InvalidToken) as e:
+            raise SendRejected(str(e))
+        except FutureTimeoutError:
+            future.cancel()
+            raise
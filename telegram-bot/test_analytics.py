@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la analítica offline (vectorizada y por bloques)"""
+
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from analytics import HistoryAnalyzer, accuracy, feeder_logs, histogram_percentile, write_csv
+from event_log import (EVENT_CATCH, EVENT_DIFFICULTY, EVENT_MISS, EVENT_START, EVENT_STOP, RECORD_SIZE,
+                       EventLog, encode_stop, encode_text)
+
+
+def play(log, player, difficulty, taps, ts):
+    """Escribir una partida completa; taps es una cadena de 'c' (acierto) y 'm' (fallo)"""
+    log.append(EVENT_DIFFICULTY, encode_text(difficulty), ts=ts)
+    log.append(EVENT_START, encode_text(player), ts=ts)
+    for i, tap in enumerate(taps):
+        log.append(EVENT_CATCH if tap == 'c' else EVENT_MISS, ts=ts + 1 + i * 0.5)
+    log.append(EVENT_STOP, encode_stop(taps.count('c'), taps.count('m'), difficulty), ts=ts + 60)
+    return ts + 100
+
+
+def analyze(paths, group_by=('player', 'difficulty'), **kwargs):
+    analyzer = HistoryAnalyzer(**kwargs)
+    analyzer.add_feeder("default", paths)
+    return {tuple(row[field] for field in group_by): row for row in analyzer.report(group_by)}
+
+
+@pytest.fixture
+def history(tmp_path):
+    log = EventLog(tmp_path / "game_events.log")
+    ts = 1_700_000_000.0
+    ts = play(log, "Ana", "easy", "ccmccc", ts)
+    ts = play(log, "Bea", "hard", "mmcm", ts)
+    ts = play(log, "Ana", "easy", "cccccm", ts)
+    play(log, "Ana", "hard", "cm", ts)
+    log.close()
+    return tmp_path / "game_events.log"
+
+
+def test_groups_by_player_and_difficulty(history):
+    rows = analyze([history])
+    assert set(rows) == {("Ana", "easy"), ("Bea", "hard"), ("Ana", "hard")}
+    ana = rows[("Ana", "easy")]
+    assert (ana["taps"], ana["catches"], ana["misses"], ana["games"]) == (12, 10, 2, 2)
+    assert ana["longest_streak"] == 5
+    assert ana["accuracy"] == 83.3
+    assert rows[("Bea", "hard")]["longest_streak"] == 1
+    assert rows[("Ana", "easy")]["interval_ms_p50"] == pytest.approx(500, rel=0.05)
+
+
+@pytest.mark.parametrize("chunk_records", [1, 3, 7])
+def test_chunked_reading_gives_the_same_report(history, chunk_records):
+    """Rachas, intervalos, jugador y dificultad deben continuar entre bloques"""
+    assert analyze([history], chunk_records=chunk_records) == analyze([history])
+
+
+def test_streak_does_not_continue_into_the_next_game(tmp_path):
+    log = EventLog(tmp_path / "game_events.log")
+    ts = play(log, "Ana", "easy", "mccc", 1_700_000_000.0)
+    play(log, "Ana", "easy", "ccm", ts)
+    log.close()
+    assert analyze([tmp_path / "game_events.log"], chunk_records=2)[("Ana", "easy")]["longest_streak"] == 3
+
+
+def test_since_and_until_filter_by_timestamp(history):
+    rows = analyze([history], since=1_700_000_100.0, until=1_700_000_200.0)
+    assert set(rows) == {("Bea", "hard")}
+
+
+def test_analysis_stops_at_a_corrupt_record(history, capsys):
+    data = bytearray(history.read_bytes())
+    data[5 * RECORD_SIZE + 17] = 99  # tipo de evento imposible en el sexto registro
+    history.write_bytes(bytes(data))
+    rows = analyze([history])
+    assert rows[("Ana", "easy")]["taps"] == 3
+    assert "no válido" in capsys.readouterr().out
+
+
+def test_random_history_matches_a_plain_python_count(tmp_path):
+    rng = random.Random(7)
+    log = EventLog(tmp_path / "game_events.log")
+    ts, expected = 1_700_000_000.0, {}
+    for _ in range(30):
+        player, taps = rng.choice(["Ana", "Bea"]), "".join(rng.choice("ccm") for _ in range(rng.randint(1, 40)))
+        ts = play(log, player, "medium", taps, ts)
+        best = max((len(run) for run in taps.split('m')), default=0)
+        total = expected.setdefault(player, [0, 0, 0])
+        total[0] += len(taps)
+        total[1] += taps.count('c')
+        total[2] = max(total[2], best)
+    log.close()
+    rows = analyze([tmp_path / "game_events.log"], group_by=("player",), chunk_records=64)
+    assert {player: [row["taps"], row["catches"], row["longest_streak"]]
+            for (player,), row in rows.items()} == expected
+
+
+def test_accuracy_and_histogram_percentile():
+    assert accuracy([3, 0], [1, 0]).tolist() == [75.0, 0.0]
+    counts = np.array([0, 5, 5, 0])
+    assert histogram_percentile(counts, 0.5) == 1
+    assert histogram_percentile(counts, 0.9) == 2
+    assert histogram_percentile(np.zeros(3), 0.5) is None
+
+
+def test_feeder_logs_and_csv_output(tmp_path, history):
+    (tmp_path / "sessions" / "cocina").mkdir(parents=True)
+    (tmp_path / "sessions" / "no valido").mkdir()
+    assert list(feeder_logs(tmp_path)) == ["default", "cocina"]
+
+    analyzer = HistoryAnalyzer()
+    analyzer.add_feeder("default", [history])
+    write_csv(analyzer.report(("player",)), tmp_path / "out")
+    with open(tmp_path / "out" / "groups.csv", encoding="utf-8") as f:
+        assert [row["player"] for row in csv.DictReader(f)] == ["Ana", "Bea"]
+    with open(tmp_path / "out" / "hourly.csv", encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 1 + 2 * 24
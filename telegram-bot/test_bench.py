@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del benchmark: cálculos y una pasada corta de todas las suites"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from bench import compare, percentiles
+
+BENCH = Path(__file__).with_name("bench.py")
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [i / 1000 for i in range(1, 101)]  # 1..100 ms
+    assert percentiles(samples) == {"p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0}
+    assert percentiles([])["p95_ms"] is None
+
+
+def test_compare_flags_only_regressions():
+    baseline = {"http": {"throughput_rps": 1000, "p95_ms": 10.0}}
+    assert compare({"http": {"throughput_rps": 990, "p95_ms": 9.0}}, baseline) == 0
+    assert compare({"http": {"throughput_rps": 500, "p95_ms": 30.0}}, baseline) == 2
+
+
+def test_short_run_of_every_suite(tmp_path):
+    result = subprocess.run(
+        [sys.executable, str(BENCH), "all", "--duration", "0.5", "--clients", "2", "--updates", "50",
+         "--feeders", "2", "--events", "20", "--runs", "1", "--records", "5000", "--out", "results.json"],
+        cwd=tmp_path, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    results = json.loads((tmp_path / "results.json").read_text(encoding="utf-8"))
+    assert results["http"]["errors"] == 0 and results["http"]["requests"] > 0
+    assert results["commands"]["updates"] == 50 and results["commands"]["outbox_drained"]
+    assert results["startup"]["crash_ready_ms"] > 0
+    assert results["analytics"]["records_per_second"] > 0
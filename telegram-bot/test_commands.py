@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del registro de comandos"""
+
+import pytest
+
+from commands import CommandRegistry, parse_command
+from conftest import command
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("/Iniciar", ("/iniciar", None, [])),
+    ('/iniciar@PawPlayBot "Ana María" 3', ("/iniciar", "PawPlayBot", ["Ana María", "3"])),
+    ('/iniciar "sin cerrar', ("/iniciar", None, ['"sin', 'cerrar'])),
+    ("hola", None),
+    ("", None),
+])
+def test_parse_command(text, expected):
+    assert parse_command(text) == expected
+
+
+def test_aliases_share_one_handler_and_its_stats():
+    registry = CommandRegistry(bot_username="PawPlayBot")
+    calls = []
+    registry.register(['/iniciar', '/start_game'], lambda ctx: calls.append((ctx.command, ctx.args)))
+    assert registry.dispatch(1, 'private', "Ana", "/START_GAME Bea") is True
+    assert registry.dispatch(1, 'group', "Ana", "/iniciar@pawplaybot") is True
+    assert registry.dispatch(1, 'group', "Ana", "/iniciar@OtroBot") is None
+    assert registry.dispatch(1, 'private', "Ana", "/nada") is False
+    assert calls == [("/iniciar", ["Bea"]), ("/iniciar", [])]
+    stats = registry.get('/start_game').stats
+    assert (stats.calls, stats.errors, registry.unknown) == (2, 0, 1)
+
+
+def test_failing_handler_is_counted_and_the_error_propagates():
+    registry = CommandRegistry()
+
+    def boom(ctx):
+        raise RuntimeError("fallo")
+
+    registry.register(['/roto'], boom)
+    with pytest.raises(RuntimeError):
+        registry.dispatch(1, 'private', "Ana", "/roto")
+    stats = registry.get('/roto').stats
+    assert (stats.calls, stats.errors) == (1, 1) and stats.max_time >= stats.mean_time > 0
+
+
+def test_duplicate_alias_is_rejected():
+    registry = CommandRegistry()
+    registry.register(['/parar', '/stop_game'], lambda ctx: None)
+    with pytest.raises(ValueError):
+        registry.register(['/detener', '/STOP_GAME'], lambda ctx: None)
+
+
+def test_bot_commands_in_spanish_and_english(bot):
+    assert "JUEGO INICIADO" in command(bot, "/iniciar Ana").upper()
+    assert command(bot, "/status") == command(bot, "/estado")
+    assert "JUEGO PAUSADO" in command(bot, "/stop_game").upper()
+    assert "no reconocido" in command(bot, "/volar").lower()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la configuración del bot"""
+
+from config import Config, parse_chat_ids
+from pawplay_bot import PawPlayBot
+
+
+def test_from_env_reads_and_converts_the_variables():
+    config = Config.from_env({'HTTP_WORKERS': '6', 'PERSIST_FLUSH_INTERVAL': '2.5',
+                              'ADMIN_CHAT_IDS': '12, -34 x', 'ADMIN_TOKEN': '', 'TELEGRAM_TRANSPORT': 'none'})
+    assert (config.http_workers, config.http_max_push) == (6, 3)  # long-poll: la mitad por defecto
+    assert config.persist_flush_interval == 2.5
+    assert config.admin_chat_ids == {12, -34}
+    assert config.admin_token is None and config.telegram_token is None
+    assert config.telegram_transport == 'none'
+
+
+def test_defaults_match_an_empty_environment():
+    assert Config.from_env({}) == Config()
+    assert Config(http_workers=10).http_max_push == 5
+
+
+def test_parse_chat_ids_ignores_garbage():
+    assert parse_chat_ids(None) == frozenset()
+    assert parse_chat_ids("1,2 , abc 3") == {1, 2, 3}
+
+
+def test_bot_uses_the_config_it_is_given(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TELEGRAM_TRANSPORT', 'telepot')  # ignorado: manda la Config
+    bot = PawPlayBot(Config(telegram_transport='none', sessions_dir="feeders", ranking_size=3,
+                            admin_chat_ids=frozenset({7})))
+    try:
+        assert bot.headless
+        bot.get_session("cocina")
+        assert (tmp_path / "feeders" / "cocina").is_dir()
+        assert bot.leaderboard.ranking_size == 3
+        assert bot.is_admin(7) and not bot.is_admin(8)
+    finally:
+        bot.shutdown()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del registro de eventos binario (CRC, recuperación y compactación)"""
+
+from event_log import (EVENT_CATCH, EVENT_MISS, EVENT_START, EVENT_STOP, RECORD_SIZE,
+                       EventLog, decode_stop, encode_stop, encode_text, iter_records)
+
+
+def write_events(path, count, **kwargs):
+    log = EventLog(path, **kwargs)
+    for i in range(count):
+        log.append(EVENT_CATCH if i % 2 else EVENT_MISS, ts=1000.0 + i)
+    log.close()
+    return log
+
+
+def test_append_and_replay_round_trip(tmp_path):
+    log = EventLog(tmp_path / "events.log")
+    assert log.append(EVENT_START, encode_text("Ana"), ts=1.0) == 1
+    assert log.append_many([(EVENT_CATCH, b'', 2.0), (EVENT_MISS, b'', 3.0)]) == 3
+    log.close()
+
+    replayed = EventLog(tmp_path / "events.log").replay()
+    assert replayed == [(1, 1.0, EVENT_START, b"Ana"), (2, 2.0, EVENT_CATCH, b''), (3, 3.0, EVENT_MISS, b'')]
+
+
+def test_replay_skips_events_already_in_snapshot(tmp_path):
+    write_events(tmp_path / "events.log", 10)
+    log = EventLog(tmp_path / "events.log")
+    assert [event[0] for event in log.replay(after_seq=7)] == [8, 9, 10]
+    assert log.last_seq == 10
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = tmp_path / "events.log"
+    write_events(path, 5)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * (RECORD_SIZE // 2))  # corte de luz a mitad de un registro
+    log = EventLog(path)
+    assert len(log.replay()) == 5
+    assert path.stat().st_size == 5 * RECORD_SIZE
+    assert log.append(EVENT_CATCH) == 6
+
+
+def test_corrupt_record_stops_replay(tmp_path):
+    path = tmp_path / "events.log"
+    write_events(path, 5)
+    data = bytearray(path.read_bytes())
+    data[3 * RECORD_SIZE + 10] ^= 0xFF  # cuarto registro con el CRC roto
+    path.write_bytes(bytes(data))
+    assert [event[0] for event in EventLog(path).replay()] == [1, 2, 3]
+    assert [record[0] for record in iter_records(path)] == [1, 2, 3]
+
+
+def test_compaction_moves_segment_to_archive(tmp_path):
+    path, archive = tmp_path / "events.log", tmp_path / "events.archive"
+    log = EventLog(path, max_bytes=4 * RECORD_SIZE, archive_path=archive)
+    for i in range(4):
+        log.append(EVENT_CATCH, ts=float(i))
+    assert log.needs_compaction()
+    log.compact()
+    assert log.size == 0 and path.stat().st_size == 0
+    assert log.append(EVENT_MISS) == 5  # la secuencia continúa tras compactar
+    log.close()
+    assert [record[0] for record in iter_records(archive)] == [1, 2, 3, 4]
+    assert [record[0] for record in iter_records(path)] == [5]
+
+
+def test_stop_payload_round_trip():
+    payload = encode_stop(12, 3, "medium")
+    assert len(payload) <= 26
+    assert decode_stop(payload) == (12, 3, "medium")
+
+
+def test_encode_text_does_not_split_characters():
+    text = encode_text("ñ" * 20)  # 40 bytes en UTF-8
+    assert len(text) <= 26
+    assert text.decode('utf-8') == "ñ" * 13
+
+
+def test_stop_event_kind_is_stable(tmp_path):
+    # Los registros ya escritos en disco dependen de estos valores
+    assert (EVENT_CATCH, EVENT_MISS, EVENT_START, EVENT_STOP) == (1, 2, 3, 4)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del historial SQLite de partidas"""
+
+from event_log import EVENT_CATCH, EVENT_START, EVENT_STOP, EventLog, encode_stop, encode_text
+from history_store import HistoryStore
+from test_persistence import wait_until
+
+
+def test_writer_thread_batches_games_and_queries_filter_them(tmp_path):
+    store = HistoryStore(tmp_path / "history.db", batch_interval=0.05)
+    store.start()
+    store.record_session("default", 10, "Ana", "easy", 12, 3, 1000.0, 1100.0)
+    store.record_session("default", 20, "Bea", "hard", 5, 5, 2000.0, 2100.0)
+    store.record_session("cocina", 7, "Ana", "hard", 8, 0, 3000.0, 3100.0)
+    assert wait_until(lambda: store.count() == 3)
+
+    ana = store.query(player="Ana")
+    assert (ana["games"], ana["catches"], ana["misses"], ana["best"]) == (2, 20, 3, 12)
+    assert set(ana["by_difficulty"]) == {"easy", "hard"}
+    assert store.query(feeder="cocina")["games"] == 1
+    assert store.query(since=1500.0, until=3000.0)["games"] == 1
+    assert store.query(player="Nadie")["games"] == 0
+    store.close()
+
+
+def test_the_same_game_is_stored_once(tmp_path):
+    store = HistoryStore(tmp_path / "history.db")
+    for _ in range(2):  # p. ej. recuperada del registro tras una caída
+        store.record_session("default", 10, "Ana", "easy", 12, 3, 1000.0, 1100.0)
+    store.close()
+    assert HistoryStore(tmp_path / "history.db").count() == 1
+
+
+def test_import_event_log_pairs_each_start_with_its_stop(tmp_path):
+    log = EventLog(tmp_path / "game_events.log")
+    log.append(EVENT_START, encode_text("Ana"), ts=100.0)
+    log.append(EVENT_CATCH, ts=101.0)
+    log.append(EVENT_STOP, encode_stop(1, 0, "easy"), ts=160.0)
+    log.append(EVENT_START, encode_text("Bea"), ts=200.0)
+    log.append(EVENT_STOP, encode_stop(0, 2, "hard"), ts=230.0)
+    log.close()
+
+    store = HistoryStore(tmp_path / "history.db")
+    paths = [tmp_path / "game_events.archive", tmp_path / "game_events.log"]
+    assert store.import_event_log("default", paths) == 2
+    assert store.import_event_log("default", paths) == 0  # idempotente
+    assert store.query(player="Bea")["misses"] == 2
+    store.close()
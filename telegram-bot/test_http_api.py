@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del servidor HTTP (pool de hilos, keep-alive y rutas de la app)"""
+
+import gzip
+import http.client
+import json
+import re
+import socket
+import threading
+import time
+
+import pytest
+
+import wire
+from conftest import command
+from http_api import create_http_server, etag_matches
+from test_persistence import wait_until
+
+
+@pytest.fixture
+def serve(bot):
+    """serve(**options) -> (servidor arrancado, función que abre una conexión keep-alive)"""
+    servers = []
+
+    def start(**options):
+        server = create_http_server(bot, "127.0.0.1", 0, **options)
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        servers.append(server)
+        port = server.server_address[1]
+        return server, lambda: http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_idle_keep_alive_connections_do_not_hold_workers(serve):
+    """Regresión: cada app que sondeaba ocupaba un hilo y la 3ª conexión esperaba (o recibía 503)"""
+    server, connect = serve(workers=2, backlog=1, keepalive_timeout=5.0)
+    clients = [connect() for _ in range(8)]
+    for _ in range(3):  # tres rondas de sondeo por las mismas conexiones
+        for conn in clients:
+            response, _ = get(conn, "/game-data")
+            assert response.status == 200
+    # Todas esperan en el selector y ningún hilo queda ocupado
+    assert wait_until(lambda: server.idle_connections == len(clients) and server.connections == 0)
+    for conn in clients:
+        conn.close()
+
+
+def test_idle_connections_are_closed_after_keepalive_timeout(serve):
+    server, connect = serve(workers=2, keepalive_timeout=0.2)
+    conn = connect()
+    assert get(conn, "/game-data")[0].status == 200
+    assert wait_until(lambda: server.idle_connections == 1)
+    assert wait_until(lambda: server.idle_connections == 0, timeout=2.0)
+    conn.sock.settimeout(2)
+    assert conn.sock.recv(1) == b''  # el servidor cerró la conexión
+
+
+def test_pipelined_requests_are_served_in_order(serve):
+    server, _ = serve(workers=1)
+    sock = socket.create_connection(server.server_address, timeout=5)
+    sock.sendall(b"GET /game-data HTTP/1.1\r\nHost: x\r\n\r\n"
+                 b"GET /missing HTTP/1.1\r\nHost: x\r\n\r\n")
+    data = b''
+    while data.count(b'HTTP/1.1 ') < 2:
+        chunk = sock.recv(65536)
+        assert chunk, "el servidor cerró la conexión antes de responder las dos peticiones"
+        data += chunk
+    assert re.findall(rb'HTTP/1\.1 (\d+)', data) == [b'200', b'404']
+    sock.close()
+
+
+def test_client_close_while_idle_releases_the_connection(serve):
+    server, connect = serve(workers=1)
+    conn = connect()
+    assert get(conn, "/game-data")[0].status == 200
+    assert wait_until(lambda: server.idle_connections == 1)
+    conn.close()
+    assert wait_until(lambda: server.idle_connections == 0)
+    assert get(connect(), "/game-data")[0].status == 200
+
+
+def test_long_poll_answers_at_once_when_the_client_is_behind(serve, bot):
+    _, connect = serve()
+    command(bot, "/iniciar")
+    version = bot.get_session("default").state_version
+    response, body = get(connect(), "/game-data/poll?since=0&timeout=5")
+    assert response.status == 200
+    assert int(response.getheader("X-State-Version")) == version
+    assert json.loads(body)["game_active"] is True
+
+
+def test_long_poll_times_out_with_204(serve, bot):
+    _, connect = serve()
+    version = bot.get_session("default").state_version
+    start = time.monotonic()
+    response, body = get(connect(), f"/game-data/poll?since={version}&timeout=0.2")
+    assert (response.status, body) == (204, b'')
+    assert time.monotonic() - start >= 0.2
+
+
+def test_long_poll_wakes_up_on_a_tap(serve, bot):
+    _, connect = serve()
+    command(bot, "/iniciar")
+    version = bot.get_session("default").state_version
+    threading.Timer(0.1, bot.register_catch).start()
+    response, body = get(connect(), f"/game-data/poll?since={version}&timeout=10")
+    assert response.status == 200
+    assert int(response.getheader("X-State-Version")) > version
+    assert json.loads(body)["session_stats"]["catches"] == 1
+
+
+def test_stream_sends_the_state_and_each_change(serve, bot):
+    _, connect = serve()
+    command(bot, "/iniciar")
+    conn = connect()
+    conn.request("GET", "/game-data/stream")
+    response = conn.getresponse()
+    assert response.getheader("Content-type") == "text/event-stream"
+
+    def next_event():
+        lines = []
+        while not lines or lines[-1] != b'\n':
+            lines.append(response.fp.readline())
+        return b''.join(lines)
+
+    assert next_event() == b'retry: 3000\n\n'
+    assert b'event: state' in next_event()
+    bot.register_catch()
+    event = next_event()
+    assert b'"catches": 1' in event and event.startswith(b'id: ')
+    conn.close()
+
+
+def test_unchanged_game_data_answers_304(serve, bot):
+    _, connect = serve()
+    conn = connect()
+    response, body = get(conn, "/game-data")
+    etag = response.getheader("ETag")
+    assert response.status == 200 and body
+
+    response, body = get(conn, "/game-data", {"If-None-Match": etag})
+    assert (response.status, body) == (304, b'')
+    assert response.getheader("ETag") == etag
+
+    command(bot, "/iniciar")
+    response, body = get(conn, "/game-data", {"If-None-Match": etag})
+    assert response.status == 200 and response.getheader("ETag") != etag
+
+
+def test_etag_matches_lists_and_wildcard():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('*', '"b"')
+    assert not etag_matches(None, '"b"')
+    assert not etag_matches('"a"', '"b"')
+
+
+def test_binary_format_is_negotiated_with_accept(serve, bot):
+    _, connect = serve()
+    command(bot, "/iniciar Ana")
+    conn = connect()
+    response, body = get(conn, "/game-data", {"Accept": wire.CONTENT_TYPE})
+    assert response.getheader("Content-type") == wire.CONTENT_TYPE
+    version, game_data = wire.decode_game_state(body)
+    assert version == int(response.getheader("X-State-Version"))
+    assert game_data["current_player"] == "Ana" and game_data["game_active"]
+    response, body = get(conn, "/game-data", {"Accept": "*/*"})
+    assert response.getheader("Content-type") == "application/json"
+
+
+def test_binary_batch_gets_a_binary_result(serve, bot):
+    _, connect = serve()
+    command(bot, "/iniciar")
+    conn = connect()
+    events = [{"type": "catch", "id": 1}, {"type": "miss", "id": 2}, {"type": "catch", "id": 1}]
+    conn.request("POST", "/register-batch", body=wire.encode_batch(events),
+                 headers={"Content-Type": wire.CONTENT_TYPE, "Accept": wire.CONTENT_TYPE})
+    response = conn.getresponse()
+    applied, duplicates, ignored, version = wire.decode_batch_result(response.read())
+    assert (response.status, applied, duplicates, ignored) == (200, 2, 1, 0)
+    assert version == bot.get_session("default").state_version
+
+
+def test_large_bodies_are_gzipped_only_when_accepted(serve):
+    _, connect = serve()
+    conn = connect()
+    plain, plain_body = get(conn, "/metrics")
+    assert plain.getheader("Content-Encoding") is None and len(plain_body) >= wire.GZIP_MIN_BYTES
+    response, body = get(conn, "/metrics", {"Accept-Encoding": "gzip"})
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert gzip.decompress(body).startswith(b"# HELP")
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de los rankings top-K, los agregados por jugador y los cuantiles de duración"""
+
+import json
+import random
+
+from leaderboard import ALL_DIFFICULTIES, RANKING_CATCHES, RANKING_STREAK, Leaderboard, QuantileSketch, TopK
+
+
+def test_topk_keeps_the_best_value_per_player():
+    top = TopK(3)
+    for player, value in [("Ana", 5), ("Bea", 7), ("Caro", 1), ("Dani", 6), ("Ana", 4), ("Caro", 9)]:
+        top.update(player, value)
+    assert top.top() == [("Caro", 9), ("Bea", 7), ("Dani", 6)]
+    assert top.top(1) == [("Caro", 9)] and len(top) == 3
+
+
+def test_topk_breaks_ties_by_name():
+    top = TopK(2)
+    for player in ("Bea", "Ana", "Caro"):
+        top.update(player, 5)
+    assert top.top() == [("Ana", 5), ("Bea", 5)]
+
+
+def test_topk_matches_sorting_everything():
+    rng = random.Random(3)
+    top, best = TopK(10), {}
+    for _ in range(2000):
+        player, value = f"p{rng.randrange(50)}", rng.randrange(1000)
+        best[player] = max(best.get(player, 0), value)
+        top.update(player, best[player])
+    expected = sorted(best.items(), key=lambda item: (-item[1], item[0]))[:10]
+    assert top.top() == expected
+
+
+def test_quantile_sketch_relative_error():
+    rng = random.Random(5)
+    values = sorted(rng.uniform(1, 3600) for _ in range(5000))
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.021 * exact
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_record_game_updates_players_difficulties_and_rankings():
+    leaderboard = Leaderboard(ranking_size=2)
+    leaderboard.record_game("Ana", "easy", 10, 2, best_streak=4, duration=60, ts=1000.0)
+    leaderboard.record_game("Ana", "hard", 3, 5, best_streak=2, duration=120)
+    leaderboard.record_game("Bea", "easy", 12, 0, best_streak=12, duration=90)
+    leaderboard.record_game(None, "easy", 1, 1)  # sin jugador: solo cuenta en la dificultad
+
+    name, ana = leaderboard.player("ana")
+    assert name == "Ana"
+    assert (ana["games"], ana["catches"], ana["best_streak"], ana["last_played"]) == (2, 13, 4, 1000.0)
+    assert leaderboard.difficulties["easy"]["games"] == 3
+    assert leaderboard.ranking("easy").top() == [("Bea", 12), ("Ana", 10)]
+    assert leaderboard.ranking(RANKING_CATCHES).top() == [("Ana", 13), ("Bea", 12)]
+    assert leaderboard.ranking(RANKING_STREAK).top() == [("Bea", 12), ("Ana", 4)]
+    assert set(leaderboard.duration_percentiles()) == {0.5, 0.9, 0.99}
+    assert leaderboard.duration_percentiles("medium") == {}
+
+
+def test_round_trip_through_json_rebuilds_the_rankings():
+    leaderboard = Leaderboard()
+    for i, player in enumerate(("Ana", "Bea", "Caro")):
+        leaderboard.record_game(player, "medium", 5 + i, 1, best_streak=i, duration=30 * (i + 1))
+    restored = Leaderboard.from_dict(json.loads(json.dumps(leaderboard.to_dict())))
+    assert restored.to_dict() == leaderboard.to_dict()
+    for name in ("medium", RANKING_CATCHES, RANKING_STREAK):
+        assert restored.ranking(name).top() == leaderboard.ranking(name).top()
+    assert restored.duration_percentiles(ALL_DIFFICULTIES) == leaderboard.duration_percentiles(ALL_DIFFICULTIES)
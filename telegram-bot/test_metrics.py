@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de las métricas sin lock por hilo y del formato de Prometheus"""
+
+import threading
+
+from metrics import MetricsRegistry
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counter_sums_every_thread():
+    registry = MetricsRegistry()
+    counter = registry.counter('taps_total', 'Toques')
+    run_threads(lambda: [counter.inc() for _ in range(1000)], 8)
+    counter.inc(5)
+    assert counter._default.value == 8005
+
+
+def test_shards_of_finished_threads_are_released():
+    """Regresión: cada hilo corto (p. ej. una compactación) dejaba su fragmento para siempre"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram('compaction_seconds', 'Compactaciones', buckets=(0.1, 1.0))
+    for _ in range(50):
+        run_threads(lambda: histogram.observe(0.5), 1)
+    child = histogram._default
+    assert len(child._shards) <= 1
+    assert child.snapshot() == ([0, 50, 50], 50, 25.0)
+
+
+def test_render_uses_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter('http_requests_total', 'Peticiones', ('route',))
+    requests.labels('/game-data').inc(3)
+    latency = registry.histogram('latency_seconds', 'Latencia', buckets=(0.01, 0.1))
+    latency.observe(0.005)
+    latency.observe(0.05)
+    registry.gauge('sessions', 'Sesiones', lambda: 2)
+    text = registry.render().decode()
+    assert 'http_requests_total{route="/game-data"} 3\n' in text
+    assert 'latency_seconds_bucket{le="0.01"} 1\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2\n' in text
+    assert 'latency_seconds_count 2\n' in text
+    assert '# TYPE sessions gauge\nsessions 2\n' in text
+
+
+def test_gauge_is_replaced_and_counter_is_reused():
+    registry = MetricsRegistry()
+    assert registry.counter('c', 'doc') is registry.counter('c', 'doc')
+    registry.gauge('g', 'doc', lambda: 1)
+    registry.gauge('g', 'doc', lambda: 2)
+    assert 'g 2\n' in registry.render().decode()
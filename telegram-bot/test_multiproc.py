@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la memoria compartida del modo multiproceso y de los toques agregados"""
+
+import json
+
+import pytest
+
+from analytics import HistoryAnalyzer
+from conftest import command
+from event_log import EVENT_CATCH, EVENT_MISS
+from multiproc import SharedGameState, WorkerPool
+from test_sessions import make_session, start_game
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = make_session(tmp_path)
+    session.replay()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def shared():
+    shared = SharedGameState(max_feeders=4, processes=2)
+    yield shared
+    shared.close(unlink=True)
+
+
+def test_workers_count_taps_and_the_owner_collects_the_difference(shared, session):
+    shared.register(session)
+    worker = SharedGameState(4, 2, name=shared.name)
+    assert worker.feeder_count() == 1 and worker.feeder_id(0) == "default"
+    for kind in (EVENT_CATCH, EVENT_CATCH, EVENT_MISS):
+        worker.add_tap(0, 1, kind)
+    assert shared.collect() == [(session, 2, 1)]
+    assert shared.collect() == []  # ya sumados
+    assert shared.worker_stats(1)[1] == 3
+    worker.close()
+
+
+def test_published_state_is_read_back_by_the_workers(shared, session):
+    shared.register(session)
+    worker = SharedGameState(4, 2, name=shared.name)
+    start_game(session)
+    assert shared.publish_changes() == 1
+    assert shared.publish_changes() == 0  # sin cambios no se vuelve a escribir
+    version, active, etag, body = worker.read(0)
+    snapshot = session.get_game_snapshot()
+    assert (version, active, etag, body) == (snapshot.version, True, snapshot.etag, snapshot.body)
+    assert json.loads(body)["current_player"] == "Ana"
+    worker.close()
+
+
+def test_attaching_with_another_layout_fails(shared):
+    with pytest.raises(ValueError):
+        SharedGameState(4, 3, name=shared.name)
+
+
+def test_aggregated_taps_do_not_extend_streaks(tmp_path, session):
+    """Regresión: los toques sumados se aplicaban como todos los aciertos y luego todos los fallos"""
+    start_game(session)
+    session.register_tap(EVENT_CATCH)
+    assert session.register_taps(5, 0) == 5
+    session.register_tap(EVENT_CATCH)
+    stats = session.game_data['session_stats']
+    assert (stats['catches'], stats['streak'], stats['best_streak']) == (7, 2, 2)
+    session.register_taps(3, 1)  # un fallo sin orden conocido corta la racha
+    assert (stats['catches'], stats['misses'], stats['streak']) == (10, 1, 0)
+    session.event_log.close()
+
+    recovered = make_session(tmp_path)
+    recovered.replay()
+    assert recovered.game_data['session_stats'] == stats
+    recovered.close()
+
+    analyzer = HistoryAnalyzer()
+    analyzer.add_feeder("default", [tmp_path / "game_events.log"])
+    [row] = analyzer.report(("feeder",))
+    assert (row["catches"], row["longest_streak"]) == (10, 2)
+
+
+def test_pending_worker_taps_are_applied_before_stop_and_start(make_bot):
+    """Regresión: los toques confirmados en el último intervalo se perdían al parar o pasaban a la siguiente partida"""
+    bot = make_bot(HTTP_PROCESSES=2, MAX_SESSIONS=4)
+    pool = WorkerPool(bot.shared, None, "127.0.0.1", 0)  # sin procesos: los toques se simulan abajo
+    bot.worker_pool = pool
+    worker = SharedGameState(4, 2, name=bot.shared.name)
+    try:
+        command(bot, "/iniciar")
+        for kind in (EVENT_CATCH, EVENT_CATCH, EVENT_MISS):
+            worker.add_tap(0, 1, kind)
+        assert "Aciertos: 2" in command(bot, "/parar")
+
+        worker.add_tap(0, 1, EVENT_CATCH)  # confirmado con la partida ya parada
+        command(bot, "/iniciar")
+        assert bot.get_session("default").game_data['session_stats']['catches'] == 0
+        assert pool.applied == 3
+    finally:
+        worker.close()
+        pool.socket.close()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de los avisos de eventos (reparto, resúmenes, esperas y bajas)"""
+
+import threading
+import time
+
+from notifications import ALL_FEEDERS, KIND_GAMES, KIND_RECORDS, Notifier
+from outbox import OutboundQueue, RetryAfter, SendRejected
+from test_persistence import wait_until
+
+
+class FakeTransport:
+    """Transporte local: registra los envíos y falla según `errors` (chat_id -> excepciones)"""
+
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+        self.lock = threading.Lock()
+
+    def send(self, chat_id, text):
+        with self.lock:
+            pending = self.errors.get(chat_id)
+            if pending:
+                raise pending.pop(0)
+            self.sent.append((chat_id, text))
+
+
+def make_notifier(transport, **kwargs):
+    options = dict(digest_seconds=0.05, rate=0, backoff_base=0.01)
+    options.update(kwargs)
+    notifier = Notifier(transport, **options)
+    notifier.start()
+    return notifier
+
+
+def test_events_reach_only_the_interested_chats():
+    transport = FakeTransport()
+    notifier = make_notifier(transport)
+    notifier.subscribe(1, "cocina")
+    notifier.subscribe(2, ALL_FEEDERS, [KIND_RECORDS])
+    notifier.subscribe(3, "salon")
+    notifier.publish("cocina", KIND_GAMES, "Empieza Ana")
+    notifier.publish("cocina", KIND_RECORDS, "Récord de Ana")
+    assert wait_until(lambda: notifier.delivered == 2)
+    notifier.close()
+    texts = dict(transport.sent)
+    assert set(texts) == {1, 2}
+    assert "Empieza Ana" in texts[1] and "Récord de Ana" in texts[1]
+    assert texts[2] == "Récord de Ana"
+
+
+def test_bursts_are_coalesced_into_one_digest_per_chat():
+    transport = FakeTransport()
+    notifier = make_notifier(transport, digest_seconds=0.2)
+    notifier.subscribe(1, "cocina")
+    for i in range(30):
+        notifier.publish("cocina", KIND_GAMES, f"aviso {i}")
+    assert wait_until(lambda: notifier.delivered == 1)
+    notifier.close()
+    [(chat_id, text)] = transport.sent
+    assert text.startswith("🔔") and "• aviso 0" in text
+    assert "… y 10 avisos más" in text
+
+
+def test_retry_after_keeps_the_pending_lines():
+    transport = FakeTransport({1: [RetryAfter(0.05)]})
+    notifier = make_notifier(transport)
+    notifier.subscribe(1, "cocina")
+    notifier.publish("cocina", KIND_GAMES, "uno")
+    assert wait_until(lambda: not transport.errors[1])
+    notifier.publish("cocina", KIND_GAMES, "dos")
+    assert wait_until(lambda: notifier.delivered == 1)
+    notifier.close()
+    assert "• uno\n• dos" in transport.sent[0][1]  # las líneas reintentadas van delante
+
+
+def test_chats_that_keep_rejecting_are_unsubscribed():
+    transport = FakeTransport({1: [SendRejected("blocked") for _ in range(3)]})
+    removed = []
+    notifier = make_notifier(transport, max_failures=3, on_unsubscribe=removed.append)
+    notifier.subscribe(1, "cocina")
+    for i in range(3):
+        notifier.publish("cocina", KIND_GAMES, f"aviso {i}")
+        assert wait_until(lambda: notifier.failed == i + 1)
+    assert wait_until(lambda: removed == [1])
+    notifier.close()
+    assert len(notifier) == 0 and transport.sent == []
+
+
+def test_publish_without_subscribers_is_a_no_op():
+    notifier = Notifier(FakeTransport())
+    notifier.publish("cocina", KIND_GAMES, "nadie escucha")
+    assert notifier.published == 0
+
+
+def test_digests_share_the_outbox_pacing():
+    """Regresión: los resúmenes salían con su propio ritmo, sumado al del outbox"""
+    pacer = OutboundQueue(FakeTransport(), chat_interval=0.3, group_interval=0.3, global_rate=0)
+    transport = FakeTransport()
+    notifier = make_notifier(transport, pacer=pacer)
+    notifier.subscribe(1, "cocina")
+    pacer.reserve(1)  # una respuesta a un comando acaba de salir hacia el chat
+    start = time.monotonic()
+    notifier.publish("cocina", KIND_GAMES, "Empieza Ana")
+    assert wait_until(lambda: notifier.delivered == 1)
+    assert time.monotonic() - start >= 0.25
+    assert pacer.chat_wait(1) > 0  # el resumen también ocupó turno
+    notifier.publish("cocina", KIND_GAMES, "Termina Ana")
+    assert wait_until(lambda: notifier.delivered == 2)
+    notifier.close()
+    assert [text for _, text in transport.sent] == ["Empieza Ana", "Termina Ana"]
+
+
+def test_retry_after_on_a_digest_also_delays_the_outbox():
+    pacer = OutboundQueue(FakeTransport(), chat_interval=0, global_rate=0)
+    notifier = make_notifier(FakeTransport({1: [RetryAfter(1.0)]}), pacer=pacer)
+    notifier.subscribe(1, "cocina")
+    notifier.publish("cocina", KIND_GAMES, "uno")
+    assert wait_until(lambda: pacer.chat_wait(1) > 0.5)
+    notifier.close()
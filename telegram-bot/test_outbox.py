@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la cola de mensajes salientes"""
+
+import threading
+import time
+
+from outbox import OutboundQueue, RetryAfter, SendRejected
+
+
+class FakeTransport:
+    """Transporte local: registra los envíos y falla según `errors` (chat_id -> excepciones)"""
+
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+        self.lock = threading.Lock()
+
+    def send(self, chat_id, text, **kwargs):
+        with self.lock:
+            pending = self.errors.get(chat_id)
+            if pending:
+                raise pending.pop(0)
+            self.sent.append((chat_id, text))
+
+
+def make_queue(transport, **kwargs):
+    options = dict(chat_interval=0, group_interval=0, global_rate=0, backoff_base=0.001)
+    options.update(kwargs)
+    queue = OutboundQueue(transport, **options)
+    queue.start()
+    return queue
+
+
+def test_consecutive_messages_to_a_chat_are_merged():
+    transport = FakeTransport()
+    queue = OutboundQueue(transport, chat_interval=0, global_rate=0)
+    for text in ("uno", "dos", "tres"):
+        queue.send(1, text)
+    queue.start()
+    assert queue.wait_idle(timeout=5)
+    queue.close()
+    assert transport.sent == [(1, "uno\n\ndos\n\ntres")]
+    assert (queue.sent, queue.merged) == (1, 2)
+
+
+def test_retry_after_and_errors_are_retried_then_dropped():
+    transport = FakeTransport({1: [RetryAfter(0), ConnectionError("red")],
+                               2: [SendRejected("bot bloqueado")],
+                               3: [ConnectionError("red")] * 3})
+    queue = make_queue(transport, max_retries=2)
+    for chat_id in (1, 2, 3):
+        queue.send(chat_id, f"hola {chat_id}")
+    assert queue.wait_idle(timeout=5)
+    queue.close()
+    assert transport.sent == [(1, "hola 1")]
+    assert (queue.sent, queue.retries, queue.failed) == (1, 4, 2)
+
+
+def test_counters_are_exact_with_several_workers():
+    """Regresión: los hilos de envío sumaban sin lock y se perdían incrementos"""
+    transport = FakeTransport({chat_id: [ConnectionError("red")] for chat_id in range(200)})
+    queue = make_queue(transport, workers=8)
+    for chat_id in range(200):
+        for i in range(5):
+            queue.send(chat_id, f"mensaje {i}", parse_mode=None if i % 2 else 'Markdown')
+    assert queue.wait_idle(timeout=10)
+    queue.close()
+    assert queue.sent == len(transport.sent) == 1000
+    assert queue.retries == 200 and queue.failed == 0 and queue.pending == 0
+
+
+def test_turns_reserved_outside_the_queue_delay_queued_messages():
+    transport = FakeTransport()
+    queue = make_queue(transport, chat_interval=0.3)
+    start = time.monotonic()
+    assert queue.reserve(1) == 0  # el marcador en vivo toma el turno del chat
+    assert queue.reserve(1) > 0.25
+    queue.send(1, "hola")
+    assert queue.wait_idle(timeout=5)
+    queue.close()
+    assert time.monotonic() - start >= 0.55
+    assert transport.sent == [(1, "hola")]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de PawPlayBot de extremo a extremo (headless, sin Telegram)"""
+
+import json
+
+from conftest import command
+from leaderboard import RANKING_STREAK
+from test_persistence import wait_until
+
+
+def test_taps_are_written_behind_and_coalesced(make_bot):
+    bot = make_bot(PERSIST_FLUSH_INTERVAL=60, PERSIST_FLUSH_THRESHOLD=100_000)
+    command(bot, "/iniciar Ana")
+    writes = bot.flush_count()
+    for _ in range(500):
+        bot.register_catch()
+    bot.register_miss()
+    assert bot.flush_count() == writes  # ningún toque espera al disco
+    bot.shutdown()
+
+    data = json.load(open("game_data.json", encoding="utf-8"))
+    assert data["session_stats"]["catches"] == 500
+    assert data["session_stats"]["misses"] == 1
+    assert bot.flush_count() - writes <= 5  # una instantánea final por documento, no una por toque
+
+
+def test_taps_outside_a_game_are_ignored(bot):
+    assert bot.register_catch() is False
+    command(bot, "/iniciar")
+    assert bot.register_catch() is True
+    command(bot, "/parar")
+    assert bot.register_miss() is False
+    assert bot.stats["total_catches"] == 1
+
+
+def crash_before_saving_stats(bot, monkeypatch):
+    """Simular una caída entre la instantánea del comedero y la de las estadísticas"""
+    monkeypatch.setattr(bot, 'save_stats', lambda: None)
+
+
+def test_replayed_games_keep_their_own_player(make_bot, monkeypatch):
+    """Regresión: al recuperar, todas las partidas se atribuían al último jugador"""
+    bot = make_bot(PERSIST_FLUSH_INTERVAL=60)
+    crash_before_saving_stats(bot, monkeypatch)
+    command(bot, "/iniciar Ana")
+    for _ in range(3):
+        bot.register_catch()
+    command(bot, "/parar")
+    command(bot, "/iniciar Bea")
+    bot.register_catch()
+    bot.register_miss()
+    command(bot, "/parar")
+
+    restarted = make_bot(HISTORY_BACKEND="sqlite")
+    assert restarted.stats["total_games"] == 2
+    assert restarted.stats["best_players"]["medium"] == "Ana"
+    assert wait_until(lambda: restarted.history.count() == 2)
+    ana, bea = restarted.history.query(player="Ana"), restarted.history.query(player="Bea")
+    assert (ana["games"], ana["catches"], ana["misses"]) == (1, 3, 0)
+    assert (bea["games"], bea["catches"], bea["misses"]) == (1, 1, 1)
+
+
+def test_replayed_games_rank_each_player_with_their_own_streak_and_duration(make_bot, monkeypatch):
+    """Regresión: el ranking usaba la racha y el inicio de la última partida para todas"""
+    bot = make_bot(PERSIST_FLUSH_INTERVAL=60)
+    crash_before_saving_stats(bot, monkeypatch)
+    command(bot, "/iniciar Ana")
+    for _ in range(3):
+        bot.register_catch()
+    command(bot, "/parar")
+    command(bot, "/iniciar Bea")
+    bot.register_catch()
+    bot.register_miss()
+    command(bot, "/parar")
+
+    leaderboard = make_bot().leaderboard
+    assert leaderboard.ranking(RANKING_STREAK).top() == [("Ana", 3), ("Bea", 1)]
+    assert leaderboard.durations["all"].count == 2  # con el inicio de Bea, la de Ana salía negativa
+
+
+def test_replay_resumes_a_game_started_before_the_last_stats_snapshot(make_bot, monkeypatch):
+    bot = make_bot(PERSIST_FLUSH_INTERVAL=60)
+    command(bot, "/iniciar Ana")
+    bot.register_catch()
+    bot.stats_store.flush(force=True)  # las estadísticas guardan la partida en curso de Ana
+    crash_before_saving_stats(bot, monkeypatch)
+    bot.register_catch()
+    command(bot, "/parar")
+    command(bot, "/iniciar Bea")  # la instantánea del comedero ya es de la partida de Bea
+
+    restarted = make_bot(HISTORY_BACKEND="sqlite")
+    assert restarted.stats["best_players"]["medium"] == "Ana"
+    assert wait_until(lambda: restarted.history.count() == 1)
+    assert restarted.history.query(player="Ana")["catches"] == 2
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la persistencia write-behind (SnapshotStore / SnapshotFlusher)"""
+
+import json
+import time
+
+from persistence import SnapshotFlusher, SnapshotStore
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_changes_are_coalesced_into_one_write(tmp_path):
+    state = {"catches": 0}
+    store = SnapshotStore(tmp_path / "data.json", lambda: dict(state), flush_interval=0.2,
+                          flush_threshold=10_000)
+    store.start()
+    try:
+        for _ in range(1000):
+            state["catches"] += 1
+            store.mark_dirty()
+        assert not (tmp_path / "data.json").exists()  # mark_dirty no toca disco
+        assert wait_until(lambda: store.flush_count == 1)
+        assert json.loads((tmp_path / "data.json").read_text()) == {"catches": 1000}
+        assert store.pending == 0
+    finally:
+        store.close()
+
+
+def test_threshold_forces_an_early_write(tmp_path):
+    store = SnapshotStore(tmp_path / "data.json", lambda: {"ok": True}, flush_interval=60,
+                          flush_threshold=5)
+    store.start()
+    try:
+        store.mark_dirty(5)
+        assert wait_until(lambda: store.flush_count == 1, timeout=2.0)
+    finally:
+        store.close()
+
+
+def test_flush_without_changes_does_nothing_unless_forced(tmp_path):
+    store = SnapshotStore(tmp_path / "data.json", lambda: {}, flusher=SnapshotFlusher())
+    assert store.flush() is False
+    assert store.flush(force=True) is True
+    assert store.flush_count == 1
+
+
+def test_failed_snapshot_keeps_changes_pending(tmp_path):
+    calls = []
+
+    def snapshot():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disco lleno")
+        return {"value": len(calls)}
+
+    store = SnapshotStore(tmp_path / "data.json", snapshot, flusher=SnapshotFlusher())
+    store.mark_dirty(3)
+    assert store.flush() is False
+    assert store.pending == 3
+    assert store.flush() is True
+    assert json.loads((tmp_path / "data.json").read_text()) == {"value": 2}
+
+
+def test_write_is_atomic_and_leaves_no_temporary_files(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('{"old": true}')
+    store = SnapshotStore(path, lambda: {"unserializable": object()}, flusher=SnapshotFlusher())
+    store.mark_dirty()
+    assert store.flush() is False
+    assert json.loads(path.read_text()) == {"old": True}  # el archivo anterior sigue intacto
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_shared_flusher_serves_several_documents(tmp_path):
+    flusher = SnapshotFlusher(flush_interval=0.05)
+    stores = [SnapshotStore(tmp_path / f"feeder{i}.json", lambda i=i: {"feeder": i}, flusher=flusher)
+              for i in range(3)]
+    flusher.start()
+    try:
+        for store in stores:
+            store.mark_dirty()
+        assert wait_until(lambda: all(store.flush_count == 1 for store in stores))
+    finally:
+        flusher.close()
+    for i in range(3):
+        assert json.loads((tmp_path / f"feeder{i}.json").read_text()) == {"feeder": i}
+
+
+def test_close_writes_final_snapshot(tmp_path):
+    state = {"n": 1}
+    store = SnapshotStore(tmp_path / "data.json", lambda: dict(state), flush_interval=60,
+                          flush_threshold=10_000)
+    store.start()
+    state["n"] = 2
+    store.mark_dirty()
+    store.close()
+    assert json.loads((tmp_path / "data.json").read_text()) == {"n": 2}
+
+
+def test_failed_write_is_retried_without_new_changes(tmp_path):
+    """Regresión: tras un fallo nadie volvía a pedir la escritura hasta llegar al umbral"""
+    calls = []
+
+    def snapshot():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disco lleno")
+        return {"value": len(calls)}
+
+    store = SnapshotStore(tmp_path / "data.json", snapshot, flush_interval=0.05, flush_threshold=10_000)
+    store.start()
+    try:
+        store.mark_dirty()
+        assert wait_until(lambda: len(calls) == 1)
+        assert wait_until(lambda: store.flush_count == 1)
+        assert store.pending == 0
+        assert json.loads((tmp_path / "data.json").read_text()) == {"value": 2}
+    finally:
+        store.close()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del perfilado bajo demanda"""
+
+import threading
+import time
+
+from profiling import Profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_profile_writes_a_report_and_summary(tmp_path):
+    profiler = Profiler(tmp_path / "profiles", interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="ocupado")
+    worker.start()
+    done = []
+    try:
+        assert profiler.start(1, lambda report, summary: done.append((report, summary)))
+        assert not profiler.start(1)  # solo un perfil a la vez
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    assert not profiler.running
+    (report, summary), = done
+    text = report.read_text(encoding="utf-8")
+    assert "busy_loop" in text and "ocupado" in text
+    assert summary.startswith("🔬 Perfil") and profiler.last_report == report
+
+
+def test_failed_report_does_not_leave_the_profiler_running(tmp_path, monkeypatch):
+    """Regresión: si el informe fallaba, `running` seguía a True y no se podía volver a perfilar"""
+    profiler = Profiler(tmp_path / "profiles", interval=0.001)
+
+    def disk_full(*args):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(profiler, '_write_report', disk_full)
+    done = []
+    assert profiler.start(1, lambda report, summary: done.append((report, summary)))
+    profiler.stop()
+    assert not profiler.running
+    assert done == [(None, "❌ Error generando el perfil: disco lleno")]
+    monkeypatch.undo()
+    assert profiler.start(1)
+    profiler.stop()
+    assert profiler.last_report is not None
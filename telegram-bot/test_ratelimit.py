@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del límite de toques por cliente"""
+
+import threading
+
+import metrics
+
+from ratelimit import ALLOWED, DEBOUNCED, LIMITED, TapLimiter
+
+
+def test_burst_then_rate_limit_with_retry_after():
+    limiter = TapLimiter(rate=10, burst=3, min_interval=0)
+    assert [limiter.check("a", now=0.0)[0] for _ in range(3)] == [ALLOWED] * 3
+    verdict, wait = limiter.check("a", now=0.0)
+    assert verdict == LIMITED and abs(wait - 0.1) < 1e-9
+    assert limiter.check("a", now=0.1)[0] == ALLOWED  # una ficha nueva cada 1/rate s
+    assert limiter.check("b", now=0.1)[0] == ALLOWED  # cada cliente tiene su bucket
+
+
+def test_taps_faster_than_min_interval_are_debounced():
+    limiter = TapLimiter(rate=0, min_interval=0.03)
+    assert limiter.check("a", now=1.0) == (ALLOWED, 0.0)
+    assert limiter.check("a", now=1.01) == (DEBOUNCED, 0.0)
+    assert limiter.check("a", now=1.01, tap=False)[0] == ALLOWED  # un lote no cuenta para el rebote
+    assert limiter.check("a", now=1.05)[0] == ALLOWED
+
+
+def test_least_recently_seen_clients_are_forgotten():
+    limiter = TapLimiter(rate=1, burst=1, min_interval=0, max_clients=2, shards=1)
+    limiter.check("a", now=0.0)
+    limiter.check("b", now=0.0)
+    limiter.check("a", now=0.0)  # "a" vuelve a ser reciente
+    limiter.check("c", now=0.0)
+    assert len(limiter) == 2
+    assert limiter.check("a", now=0.0)[0] == LIMITED  # sigue recordado
+    assert limiter.check("b", now=0.0)[0] == ALLOWED  # olvidado: bucket lleno
+
+
+def test_rejections_are_counted_per_limiter():
+    """Regresión: los contadores eran globales del módulo y se mezclaban entre limitadores"""
+    first, second = TapLimiter(rate=1, burst=1, min_interval=0), TapLimiter(rate=0, min_interval=1)
+    for _ in range(3):
+        first.check("a", now=0.0)
+        second.check("a", now=0.0)
+    assert (first.limited, first.debounced) == (2, 0)
+    assert (second.limited, second.debounced) == (0, 2)
+
+
+def test_concurrent_checks_count_every_rejection():
+    limiter = TapLimiter(rate=1e-9, burst=1, min_interval=0)
+    threads = [threading.Thread(target=lambda: [limiter.check(i % 5, now=0.0) for i in range(1000)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limiter.limited == 4 * 1000 - 5
+
+
+def test_bot_metrics_report_its_limiter(make_bot):
+    bot = make_bot(TAP_RATE_LIMIT=1, TAP_BURST=1)
+    for _ in range(3):
+        bot.tap_limiter.check("app", now=0.0)
+    text = metrics.REGISTRY.render().decode()
+    assert 'pawplay_taps_rejected_total{reason="rate_limit"} 2' in text
+    assert bot.rejected_taps() == (2, 0)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de los temporizadores, los horarios de juego y la parada por inactividad"""
+
+from datetime import datetime
+
+import pytest
+
+from scheduler import (REPEAT_ONCE, STOP_IDLE, STOP_SCHEDULED, PlayScheduler, Timers,
+                       next_occurrence, parse_time)
+from test_persistence import wait_until
+
+
+class FakeClock:
+    """Reloj que solo avanza con advance(); el hilo de Timers lo revisa cada max_wait"""
+
+    def __init__(self, when):
+        self.now = when
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(datetime(2024, 5, 1, 7, 59).timestamp())
+
+
+@pytest.fixture
+def timers(clock):
+    timers = Timers(clock=clock, max_wait=0.005)
+    timers.start()
+    yield timers
+    timers.close()
+
+
+def make_scheduler(timers, idle_minutes=0, start_result=True):
+    calls = []
+
+    def start_game(schedule):
+        calls.append(('start', schedule.feeder_id))
+        return start_result
+
+    def stop_game(feeder_id, chat_id, reason):
+        calls.append(('stop', feeder_id, reason))
+
+    return PlayScheduler(timers, start_game, stop_game, idle_minutes), calls
+
+
+def test_parse_time_accepts_common_formats():
+    assert [parse_time(t) for t in ("8:00", "18.30", "7h05")] == ["08:00", "18:30", "07:05"]
+    with pytest.raises(ValueError):
+        parse_time("25:00")
+
+
+def test_next_occurrence_rolls_over_to_tomorrow(clock):
+    today_8 = datetime(2024, 5, 1, 8, 0).timestamp()
+    assert next_occurrence("08:00", clock()) == today_8
+    assert next_occurrence("07:00", clock()) == datetime(2024, 5, 2, 7, 0).timestamp()
+    assert next_occurrence("07:00", clock(), on_date=datetime(2024, 5, 1).date()) is None
+
+
+def test_timers_fire_in_time_order_and_skip_cancelled(timers, clock):
+    fired = []
+    timers.add(clock() + 30, fired.append, "c")
+    timers.add(clock() + 10, fired.append, "a")
+    cancelled = timers.add(clock() + 20, fired.append, "x")
+    timers.add(clock() + 20, fired.append, "b")
+    timers.cancel(cancelled)
+    assert len(timers) == 3
+    clock.advance(60)
+    assert wait_until(lambda: len(fired) == 3)
+    assert fired == ["a", "b", "c"] and len(timers) == 0
+
+
+def test_cancelled_timers_do_not_pile_up(timers, clock):
+    for _ in range(1000):
+        timers.cancel(timers.add(clock() + 3600, print))
+    assert len(timers._heap) <= 130
+
+
+def test_daily_schedule_starts_stops_and_rearms(timers, clock):
+    scheduler, calls = make_scheduler(timers)
+    schedule = scheduler.add("cocina", 1, "8:00", 30)
+    clock.advance(60)
+    assert wait_until(lambda: calls == [('start', 'cocina')])
+    assert schedule.next_start == datetime(2024, 5, 2, 8, 0).timestamp()
+    clock.advance(30 * 60)
+    assert wait_until(lambda: len(calls) == 2)
+    assert calls[1] == ('stop', 'cocina', STOP_SCHEDULED)
+    assert schedule.ends_at is None and scheduler.get(schedule.id) is schedule
+
+
+def test_one_off_schedule_is_removed_when_it_ends(timers, clock):
+    scheduler, calls = make_scheduler(timers)
+    schedule = scheduler.add("cocina", 1, "8:00", 5, repeat=REPEAT_ONCE)
+    clock.advance(60)
+    assert wait_until(lambda: calls == [('start', 'cocina')])
+    clock.advance(5 * 60)
+    assert wait_until(lambda: scheduler.get(schedule.id) is None)
+    assert calls == [('start', 'cocina'), ('stop', 'cocina', STOP_SCHEDULED)]
+
+
+def test_idle_stop_waits_for_the_last_tap(timers, clock):
+    scheduler, calls = make_scheduler(timers, idle_minutes=2)
+    scheduler.game_started("cocina")
+    clock.advance(90)
+    scheduler.touch("cocina")  # el plazo vuelve a empezar
+    clock.advance(90)
+    assert wait_until(lambda: timers.fired == 1)  # venció el plazo viejo y se rearmó
+    assert calls == []
+    clock.advance(60)
+    assert wait_until(lambda: calls == [('stop', 'cocina', STOP_IDLE)])
+
+
+def test_game_stopped_by_hand_disarms_the_idle_stop(timers, clock):
+    scheduler, calls = make_scheduler(timers, idle_minutes=1)
+    scheduler.game_started("cocina")
+    scheduler.game_stopped("cocina")
+    clock.advance(120)
+    assert len(timers) == 0 and calls == []
+
+
+def test_snapshot_and_load_round_trip(timers, clock):
+    scheduler, _ = make_scheduler(timers)
+    scheduler.add("cocina", 1, "8:00", 30, player="Ana")
+    scheduler.add("salon", 2, "21:15", 10, repeat=REPEAT_ONCE)
+    scheduler.set_idle_minutes("salon", 5)
+    data = scheduler.snapshot()
+
+    restored, _ = make_scheduler(timers)
+    restored.load(data)
+    assert restored.snapshot() == data
+    assert restored.idle_minutes("salon") == 5 and restored.idle_minutes("cocina") == 0
+    assert [s.player for s in restored.schedules("cocina")] == ["Ana"]
+
+
+def test_one_off_schedule_missed_while_stopped_is_dropped(timers, clock):
+    scheduler, _ = make_scheduler(timers)
+    scheduler.add("cocina", 1, "8:00", 30, repeat=REPEAT_ONCE)
+    data = scheduler.snapshot()
+    clock.advance(24 * 3600)  # el bot estuvo parado un día
+    restored, _ = make_scheduler(timers)
+    restored.load(data)
+    assert len(restored) == 0
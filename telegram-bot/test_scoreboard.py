@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del marcador en vivo (agrupación de ediciones, fin de partida y errores)"""
+
+import threading
+import time
+
+from outbox import OutboundQueue, RetryAfter, SendRejected
+from scoreboard import LiveScoreboard
+from test_persistence import wait_until
+
+
+class FakeTransport:
+    """Apunta cada envío y edición; `fail` lanza esa excepción en la próxima llamada"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = None
+        self.lock = threading.Lock()
+
+    def _call(self, *call):
+        with self.lock:
+            failure, self.fail = self.fail, None
+            if failure is not None:
+                raise failure
+            self.calls.append(call)
+
+    def send(self, chat_id, text):
+        self._call('send', chat_id, text)
+        return {'message_id': 100 + chat_id}
+
+    def edit(self, chat_id, message_id, text):
+        self._call('edit', chat_id, message_id, text)
+
+
+class Game:
+    def __init__(self):
+        self.catches = 0
+
+    def render(self, feeder_id, final):
+        return f"{feeder_id}: {self.catches}" + (" (fin)" if final else "")
+
+
+def make_board(interval=0.05, pacer=None):
+    transport, game = FakeTransport(), Game()
+    board = LiveScoreboard(transport, game.render, interval=interval, pacer=pacer)
+    board.start()
+    return board, transport, game
+
+
+def test_each_subscribed_chat_gets_a_message_that_is_then_edited():
+    board, transport, game = make_board()
+    board.subscribe(1, "cocina")
+    board.subscribe(2, "cocina")
+    board.subscribe(3, "salon")
+    board.game_started("cocina")
+    assert wait_until(lambda: board.sent == 2)
+    game.catches = 1
+    board.changed("cocina")
+    assert wait_until(lambda: board.edits == 2)
+    board.close()
+    assert sorted(call[:2] for call in transport.calls) == [('edit', 1), ('edit', 2), ('send', 1), ('send', 2)]
+    assert ('edit', 1, 101, "cocina: 1") in transport.calls
+
+
+def test_taps_within_the_interval_are_coalesced_into_one_edit():
+    board, transport, game = make_board(interval=0.3)
+    board.subscribe(1, "cocina")
+    board.game_started("cocina")
+    assert wait_until(lambda: board.sent == 1)
+    for _ in range(50):
+        game.catches += 1
+        board.changed("cocina")
+    assert wait_until(lambda: board.edits == 1)
+    board.close()
+    assert transport.calls[-1] == ('edit', 1, 101, "cocina: 50")
+
+
+def test_unchanged_text_is_not_edited():
+    board, transport, _ = make_board()
+    board.subscribe(1, "cocina")
+    board.game_started("cocina")
+    assert wait_until(lambda: board.sent == 1)
+    board.changed("cocina")
+    assert wait_until(lambda: board.skipped == 1)
+    board.close()
+    assert board.edits == 0
+
+
+def test_final_edit_forgets_the_board():
+    board, transport, _ = make_board()
+    board.subscribe(1, "cocina", active=True)
+    assert wait_until(lambda: board.sent == 1)
+    board.game_stopped("cocina")
+    assert wait_until(lambda: board.edits == 1)
+    assert wait_until(lambda: not board._boards)
+    board.changed("cocina")  # sin partida: no hay nada que editar
+    board.close()
+    assert transport.calls[-1] == ('edit', 1, 101, "cocina: 0 (fin)")
+    assert board.subscription(1) == "cocina"
+
+
+def test_retry_after_delays_the_edit_and_rejected_chats_are_dropped():
+    board, transport, _ = make_board()
+    board.subscribe(1, "cocina")
+    board.subscribe(2, "salon")
+    transport.fail = RetryAfter(0.1)
+    board.game_started("cocina")
+    assert wait_until(lambda: board.sent == 1)  # reintentado tras la espera
+
+    transport.fail = SendRejected("chat not found")
+    board.game_started("salon")
+    assert wait_until(lambda: 2 not in board._boards)
+    board.close()
+    assert [call[:2] for call in transport.calls] == [('send', 1)]
+
+
+def test_unsubscribe_stops_updates():
+    board, transport, _ = make_board()
+    board.subscribe(1, "cocina")
+    assert board.unsubscribe(1) is True
+    assert board.unsubscribe(1) is False
+    board.game_started("cocina")
+    board.close()
+    assert transport.calls == [] and board.subscriptions() == {}
+
+
+def test_edits_wait_for_the_outbox_turn_of_the_chat():
+    """Regresión: el marcador llamaba a Telegram sin contar con el ritmo del outbox"""
+    pacer = OutboundQueue(FakeTransport(), chat_interval=0.4, group_interval=0.4, global_rate=0)
+    board, transport, game = make_board(pacer=pacer)
+    board.subscribe(1, "cocina")
+    pacer.reserve(1)  # una respuesta a un comando acaba de salir hacia el chat
+    start = time.monotonic()
+    board.game_started("cocina")
+    assert wait_until(lambda: board.sent == 1)
+    assert time.monotonic() - start >= 0.35
+    assert pacer.chat_wait(1) > 0  # el envío del marcador también ocupa turno
+    board.close()
+
+
+def test_retry_after_on_an_edit_also_delays_the_outbox():
+    pacer = OutboundQueue(FakeTransport(), chat_interval=0, global_rate=0)
+    board, transport, _ = make_board(pacer=pacer)
+    board.subscribe(1, "cocina")
+    transport.fail = RetryAfter(1.0)
+    board.game_started("cocina")
+    assert wait_until(lambda: pacer.chat_wait(1) > 0.5)
+    board.close()
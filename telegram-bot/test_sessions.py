@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de GameSession: toques, recuperación del registro y compactación"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from event_log import EVENT_CATCH, EVENT_MISS, EVENT_START, RECORD_SIZE, encode_text, iter_records
+from persistence import SnapshotFlusher
+from sessions import GameSession, SessionRegistry
+
+
+def make_session(tmp_path, flusher=None, **kwargs):
+    return GameSession("default", tmp_path / "game_data.json", tmp_path / "game_events.log",
+                       tmp_path / "game_events.archive", flusher=flusher or SnapshotFlusher(), **kwargs)
+
+
+def start_game(session, player="Ana"):
+    with session.lock:
+        session.record_event(EVENT_START, encode_text(player))
+
+
+def test_replay_restores_taps_after_a_crash(tmp_path):
+    session = make_session(tmp_path)
+    session.replay()
+    start_game(session)
+    for kind in (EVENT_CATCH, EVENT_CATCH, EVENT_MISS):
+        session.register_tap(kind)
+    session.event_log.close()  # caída: sin instantánea final
+
+    recovered = make_session(tmp_path)
+    recovered.replay()
+    stats = recovered.game_data['session_stats']
+    assert (stats['catches'], stats['misses']) == (2, 1)
+    assert recovered.game_data['current_player'] == "Ana"
+    recovered.close()
+
+
+def test_snapshot_and_log_tail_are_not_applied_twice(tmp_path):
+    session = make_session(tmp_path)
+    session.replay()
+    start_game(session)
+    session.register_tap(EVENT_CATCH)
+    session.save()
+    session.register_tap(EVENT_CATCH)
+    session.event_log.close()
+
+    recovered = make_session(tmp_path)
+    recovered.replay()
+    assert recovered.game_data['session_stats']['catches'] == 2
+    recovered.close()
+
+
+def test_concurrent_taps_during_compaction_do_not_deadlock(tmp_path):
+    """Regresión: la compactación y el hilo de persistencia tomaban los locks en orden inverso"""
+    flusher = SnapshotFlusher(flush_interval=0.001)
+    session = make_session(tmp_path, flusher=flusher, log_max_bytes=20 * RECORD_SIZE,
+                           flush_interval=0.001, flush_threshold=1)
+    session.replay()
+    flusher.start()
+    start_game(session)
+    taps_per_thread = 1500
+
+    def tap():
+        for i in range(taps_per_thread):
+            session.register_tap(EVENT_CATCH if i % 3 else EVENT_MISS)
+
+    threads = [threading.Thread(target=tap, daemon=True) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads), "deadlock entre compactación y persistencia"
+
+    deadline = time.monotonic() + 30
+    while session._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not session._compacting, "la compactación no terminó"
+    flusher.close()
+    session.close()
+    stats = session.game_data['session_stats']
+    assert stats['catches'] + stats['misses'] == 4 * taps_per_thread
+    # Nada se pierde entre el histórico y el registro activo
+    taps = [r for path in ("game_events.archive", "game_events.log")
+            for r in iter_records(tmp_path / path) if r[2] in (EVENT_CATCH, EVENT_MISS)]
+    assert len(taps) == 4 * taps_per_thread
+
+    recovered = make_session(tmp_path)
+    recovered.replay()
+    assert recovered.game_data['session_stats'] == stats
+    recovered.close()
+
+
+def test_snapshot_is_serialized_once_per_version(tmp_path):
+    session = make_session(tmp_path)
+    session.replay()
+    first = session.get_game_snapshot()
+    assert session.get_game_snapshot() is first  # sin cambios: mismos bytes, sin volver a codificar
+    start_game(session)
+    second = session.get_game_snapshot()
+    assert second.version > first.version and second.etag != first.etag
+    assert json.loads(second.body) == session.game_data
+    session.close()
+
+
+def test_batch_ids_are_deduplicated(tmp_path):
+    session = make_session(tmp_path)
+    session.replay()
+    start_game(session)
+    batch = [{"type": "catch", "id": "a"}, {"type": "miss", "id": "b"}, {"type": "catch", "id": "a"},
+             {"type": "jump", "id": "c"}]
+    assert session.register_batch(batch, 100) == (2, 1, 1)
+    assert session.register_batch(batch[:2], 100) == (0, 2, 0)  # reintento de la app
+    assert session.game_data['session_stats']['catches'] == 1
+    session.close()
+
+
+def test_batch_rejected_while_stopped_can_be_retried(tmp_path):
+    """Regresión: los ids se recordaban aunque el lote no se aplicara"""
+    session = make_session(tmp_path)
+    session.replay()
+    batch = [{"type": "catch", "id": "a"}, {"type": "catch", "id": "b"}]
+    assert session.register_batch(batch, 100) == (0, 0, 2)
+    start_game(session)
+    assert session.register_batch(batch, 100) == (2, 0, 0)
+    session.close()
+
+
+def test_batch_ids_are_forgotten_if_the_log_write_fails(tmp_path, monkeypatch):
+    session = make_session(tmp_path)
+    session.replay()
+    start_game(session)
+
+    def disk_full(records):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(session.event_log, 'append_many', disk_full)
+    with pytest.raises(OSError):
+        session.register_batch([{"type": "catch", "id": "a"}], 100)
+    monkeypatch.undo()
+    assert session.register_batch([{"type": "catch", "id": "a"}], 100) == (1, 0, 0)
+    session.close()
+
+
+def test_dedup_window_is_bounded(tmp_path):
+    session = make_session(tmp_path, dedup_size=3)
+    session.replay()
+    start_game(session)
+    session.register_batch([{"type": "catch", "id": str(i)} for i in range(5)], 100)
+    assert list(session._recent_event_ids) == ["2", "3", "4"]
+    session.close()
+
+
+def test_registry_creates_each_feeder_once():
+    created = []
+    registry = SessionRegistry(lambda feeder_id: created.append(feeder_id) or feeder_id, max_sessions=2)
+    barrier = threading.Barrier(8)
+
+    def get():
+        barrier.wait()
+        registry.get("cocina")
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert created == ["cocina"]
+    assert registry.get("salon") == "salon"
+    assert registry.ids() == ["cocina", "salon"]
+    with pytest.raises(OverflowError):
+        registry.get("patio")
+    assert registry.get("patio", create=False) is None
+
+
+@pytest.mark.parametrize("feeder_id", ["", "../etc", "a" * 33, "con espacio"])
+def test_registry_rejects_invalid_feeder_ids(feeder_id):
+    registry = SessionRegistry(lambda feeder_id: feeder_id)
+    with pytest.raises(ValueError):
+        registry.get(feeder_id)
+    assert len(registry) == 0
+
+
+def test_feeders_keep_independent_state_across_restarts(make_bot):
+    bot = make_bot()
+    for feeder_id in ("cocina", "salon"):
+        session = bot.get_session(feeder_id)
+        with session.lock:
+            session.record_event(EVENT_START, encode_text("Ana"))
+    bot.get_session("cocina").register_tap(EVENT_CATCH)
+    assert bot.get_session("cocina").game_data['session_stats']['catches'] == 1
+    assert bot.get_session("salon").game_data['session_stats']['catches'] == 0
+    assert bot.get_session("default").game_data['game_active'] is False
+    bot.shutdown()
+
+    restarted = make_bot()
+    assert "cocina" in restarted.sessions.ids()  # cargado al arrancar
+    assert restarted.get_session("cocina").game_data['session_stats']['catches'] == 1
+
+
+def test_activity_survives_a_restart_after_compaction(tmp_path):
+    """Regresión: las series solo vivían en memoria y el registro compactado ya no las tenía"""
+    session = make_session(tmp_path)
+    session.replay()
+    start_game(session)
+    for kind in (EVENT_CATCH, EVENT_CATCH, EVENT_MISS):
+        session.register_tap(kind)
+    session.compact_event_log()
+    session.register_tap(EVENT_CATCH)  # queda solo en el registro
+    session.event_log.close()
+
+    recovered = make_session(tmp_path)
+    recovered.replay()
+    assert recovered.activity.totals('day', 1, time.time()) == (3, 1)
+    assert '_activity' not in recovered.game_data
+    recovered.close()
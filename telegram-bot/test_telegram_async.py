@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del transporte asyncio contra la Bot API local de fake_bot_api.py"""
+
+import http.client
+import json
+import threading
+
+import pytest
+
+import pawplay_bot
+from fake_bot_api import FakeBotAPI
+
+
+@pytest.fixture
+def api():
+    api = FakeBotAPI().start()
+    yield api
+    api.close()
+
+
+def test_commands_and_http_run_alongside_the_event_loop(api, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, value in {'TELEGRAM_BOT_TOKEN': '123456:fake', 'TELEGRAM_TRANSPORT': 'asyncio',
+                        'TELEGRAM_API_URL': api.base_url, 'HTTP_PORT': '0',
+                        'TELEGRAM_CHAT_INTERVAL': '0'}.items():
+        monkeypatch.setenv(name, value)
+    bot = pawplay_bot.PawPlayBot()
+    runner = threading.Thread(target=bot.run)
+    runner.start()
+    try:
+        api.push_message(5, "/iniciar Ana")
+        assert api.wait_for_messages(1, timeout=10)
+        assert api.sent[0]["chat"]["id"] == 5
+
+        # El servidor HTTP (en sus propios hilos) ve el estado que cambió el comando
+        while bot.httpd is None and runner.is_alive():
+            runner.join(0.01)
+        conn = http.client.HTTPConnection("127.0.0.1", bot.httpd.server_address[1], timeout=5)
+        conn.request("GET", "/game-data")
+        assert json.loads(conn.getresponse().read())["current_player"] == "Ana"
+        conn.close()
+    finally:
+        bot.telegram.stop()
+        runner.join(30)
+    assert not runner.is_alive()
+    assert bot.telegram.handled == 1
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de las series de actividad en buffers circulares"""
+
+from timeseries import RingSeries, TapActivity, sparkline
+
+
+def test_ring_counts_taps_per_bucket():
+    ring = RingSeries(60, 10)
+    for ts, catch in ((0, True), (30, True), (59, False), (60, True), (600, False)):
+        ring.add(ts, catch)
+    start, catches, misses = ring.series(11, now=600)
+    assert start == 60  # como mucho `size` buckets
+    assert catches == [1] + [0] * 9
+    assert misses == [0] * 9 + [1]
+
+
+def test_ring_drops_expired_and_too_old_buckets():
+    ring = RingSeries(60, 10)
+    ring.add(0, True)
+    ring.add(600, True)  # misma posición, 10 buckets después
+    ring.add(0, True)    # ya no cabe: se descarta
+    assert ring.series(10, now=600)[1] == [0] * 9 + [1]
+
+
+def test_activity_round_trip_through_json_dict():
+    activity = TapActivity()
+    for ts in (1000, 1010, 5000, 90_000):
+        activity.record(ts, ts != 5000)
+    restored = TapActivity.from_dict(activity.to_dict())
+    for resolution in ('minute', 'hour', 'day'):
+        assert restored.series(resolution, 100, 90_000) == activity.series(resolution, 100, 90_000)
+
+
+def test_activity_ignores_unknown_or_malformed_entries():
+    activity = TapActivity.from_dict({"week": [[1, 2, 3]], "hour": [["x", 1, 1]],
+                                      "minute": [[16, 2, 1]]})
+    assert activity.totals('minute', 1, 16 * 60) == (2, 1)
+    assert activity.totals('hour', 1000, 16 * 60) == (0, 0)
+
+
+def test_sparkline_scales_to_the_peak():
+    assert sparkline([0, 1, 8]) == "▁▂█"
+    assert sparkline([0, 0]) == "▁▁"
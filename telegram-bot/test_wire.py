@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del formato binario de la API y de la negociación de cabeceras"""
+
+import gzip
+
+import pytest
+
+import wire
+
+
+def test_game_state_round_trip():
+    game_data = {"game_active": True, "difficulty": "hard", "current_player": "Ñandú",
+                 "session_stats": {"catches": 12, "misses": 3, "start_time": "2024-05-01T10:30:00"}}
+    version, decoded = wire.decode_game_state(wire.encode_game_state(game_data, 42))
+    assert version == 42
+    assert decoded == game_data
+
+
+def test_game_state_without_game():
+    version, decoded = wire.decode_game_state(wire.encode_game_state({}, 1))
+    assert decoded["game_active"] is False and decoded["difficulty"] is None
+    assert decoded["current_player"] is None and decoded["session_stats"]["start_time"] is None
+
+
+@pytest.mark.parametrize("data", [b'', b'XX' + b'\x00' * 40])
+def test_invalid_game_state_is_rejected(data):
+    with pytest.raises(ValueError):
+        wire.decode_game_state(data)
+
+
+def test_batch_round_trip():
+    events = [{"type": "catch", "ts": 1000, "id": 7}, {"type": "miss", "ts": None, "id": None}]
+    assert wire.decode_batch(wire.encode_batch(events)) == events
+
+
+def test_truncated_batch_is_rejected():
+    data = wire.encode_batch([{"type": "catch", "id": 1}])
+    with pytest.raises(ValueError):
+        wire.decode_batch(data[:-1])
+
+
+def test_batch_result_round_trip():
+    assert wire.decode_batch_result(wire.encode_batch_result(3, 1, 0, 99)) == (3, 1, 0, 99)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("application/x-pawplay", True),
+    ("application/json, application/x-pawplay;q=0.5", True),
+    ("application/x-pawplay; q=0", False),
+    ("*/*", False),
+    (None, False),
+])
+def test_accepts_needs_an_explicit_token(header, expected):
+    assert wire.accepts(header, wire.CONTENT_TYPE) is expected
+
+
+def test_compress_is_deterministic():
+    body = b'{"catches": 1}' * 200
+    assert wire.compress(body) == wire.compress(body)
+    assert gzip.decompress(wire.compress(body)) == body
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Series temporales de actividad para PawPlay Bot
+Aciertos y fallos por minuto, hora y día en buffers circulares de tamaño
+fijo (array de la biblioteca estándar): registrar un toque es O(1) y la
+memoria no crece por mucho tiempo que funcione el bot. Los buckets con
+actividad se guardan con la instantánea del comedero para sobrevivir a
+los reinicios.
+"""
+
+from array import array
+
+# resolución -> (segundos por bucket, buckets guardados)
+RESOLUTIONS = {
+    'minute': (60, 24 * 60),     # último día
+    'hour': (3600, 31 * 24),     # último mes
+    'day': (86400, 365),         # último año
+}
+DEFAULT_POINTS = {'minute': 60, 'hour': 24, 'day': 30}
+
+
+class RingSeries:
+    """Contadores de aciertos/fallos en un buffer circular de buckets"""
+
+    def __init__(self, bucket_seconds, size):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        # Número de bucket que ocupa cada posición (-1: vacía); detecta posiciones caducadas
+        self.buckets = array('q', [-1]) * size
+        self.catches = array('L', [0]) * size
+        self.misses = array('L', [0]) * size
+
+    def add(self, ts, catch):
+        """Sumar un toque en el bucket de `ts` (O(1))"""
+        bucket = int(ts // self.bucket_seconds)
+        slot = bucket % self.size
+        current = self.buckets[slot]
+        if current != bucket:
+            if current > bucket:
+                return  # más antiguo que lo que cabe en el buffer
+            self.buckets[slot] = bucket
+            self.catches[slot] = 0
+            self.misses[slot] = 0
+        if catch:
+            self.catches[slot] += 1
+        else:
+            self.misses[slot] += 1
+
+    def to_list(self):
+        """Buckets con actividad como [[bucket, aciertos, fallos], ...] para JSON"""
+        return [[bucket, catches, misses]
+                for bucket, catches, misses in zip(self.buckets, self.catches, self.misses)
+                if bucket >= 0]
+
+    def load(self, entries):
+        """Restaurar buckets guardados con to_list (se ignoran los que no encajan)"""
+        for bucket, catches, misses in entries:
+            slot = bucket % self.size
+            if bucket > self.buckets[slot]:
+                self.buckets[slot] = bucket
+                self.catches[slot] = catches
+                self.misses[slot] = misses
+
+    def series(self, points, now):
+        """
+        Últimos `points` buckets hasta `now` (incluido el actual).
+        Devuelve (inicio del primer bucket, aciertos, fallos).
+        """
+        points = max(1, min(points, self.size))
+        last = int(now // self.bucket_seconds)
+        first = last - points + 1
+        catches, misses = [], []
+        for bucket in range(first, last + 1):
+            slot = bucket % self.size
+            if self.buckets[slot] == bucket:
+                catches.append(self.catches[slot])
+                misses.append(self.misses[slot])
+            else:
+                catches.append(0)
+                misses.append(0)
+        return first * self.bucket_seconds, catches, misses
+
+
+class TapActivity:
+    """
+    Rollup minuto -> hora -> día de los toques de un comedero. Cada toque se
+    suma a la vez en los tres buffers, así que las resoluciones gruesas están
+    siempre al día sin un paso de agregación diferido.
+    """
+
+    def __init__(self):
+        self.rings = {name: RingSeries(seconds, size)
+                      for name, (seconds, size) in RESOLUTIONS.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Series guardadas con to_dict; las entradas mal formadas se descartan"""
+        activity = cls()
+        for name, entries in (data or {}).items():
+            ring = activity.rings.get(name)
+            if ring is None:
+                continue
+            try:
+                ring.load((int(bucket), int(catches), int(misses)) for bucket, catches, misses in entries)
+            except (TypeError, ValueError, OverflowError) as e:
+                print(f"Serie de actividad '{name}' descartada: {e}")
+        return activity
+
+    def to_dict(self):
+        """Buckets con actividad de cada resolución, listo para JSON"""
+        return {name: ring.to_list() for name, ring in self.rings.items()}
+
+    def record(self, ts, catch):
+        """Registrar un acierto (catch=True) o fallo"""
+        for ring in self.rings.values():
+            ring.add(ts, catch)
+
+    def series(self, resolution, points, now):
+        """Serie de una resolución como dict listo para JSON"""
+        ring = self.rings[resolution]
+        start, catches, misses = ring.series(points, now)
+        return {
+            "resolution": resolution,
+            "bucket_seconds": ring.bucket_seconds,
+            "start": start,
+            "catches": catches,
+            "misses": misses,
+        }
+
+    def totals(self, resolution, points, now):
+        """(aciertos, fallos) de los últimos `points` buckets"""
+        _, catches, misses = self.rings[resolution].series(points, now)
+        return sum(catches), sum(misses)
+
+
+def sparkline(values):
+    """Mini gráfico de barras en texto para Telegram"""
+    bars = "▁▂▃▄▅▆▇█"
+    peak = max(values) if values else 0
+    if not peak:
+        return bars[0] * len(values)
+    # Redondeo hacia arriba: cualquier actividad se ve por encima de la barra vacía
+    return "".join(bars[-(-value * (len(bars) - 1) // peak)] for value in values)
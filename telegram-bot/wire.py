@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Formato binario compacto de la API de la app (application/x-pawplay)
+JSON sigue siendo el formato por defecto; los clientes que envían
+`Accept: application/x-pawplay` reciben el estado del juego y las respuestas
+de /register-batch empaquetados con struct (little-endian), y pueden mandar
+los lotes de toques con `Content-Type: application/x-pawplay`.
+
+Estado del juego (25 bytes + nombre del jugador):
+    'PS' | formato u8 | flags u8 (bit 0: partida activa) | versión u32 |
+    dificultad u8 (0 easy, 1 medium, 2 hard, 255 otra) | aciertos u32 |
+    fallos u32 | inicio i64 (ms desde epoch, -1 si no hay) |
+    long. del jugador u8 | jugador (UTF-8)
+
+Lote de toques (5 bytes + 17 por toque):
+    'PB' | formato u8 | número de toques u16 |
+    por toque: tipo u8 (1 catch, 2 miss) | ts u64 (ms, 0 = hora del servidor) |
+    id u64 (0 = sin id)
+
+Resultado de un lote (19 bytes):
+    'PR' | formato u8 | aplicados u32 | duplicados u32 | ignorados u32 | versión u32
+
+Además, las respuestas JSON grandes se comprimen con gzip cuando la cabecera
+Accept-Encoding del cliente lo permite.
+"""
+
+import gzip
+import struct
+from datetime import datetime
+
+CONTENT_TYPE = 'application/x-pawplay'
+FORMAT_VERSION = 1
+
+GZIP_MIN_BYTES = 1024  # por debajo de esto gzip apenas ahorra y cuesta CPU
+GZIP_LEVEL = 6
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+UNKNOWN_DIFFICULTY = 255
+TAP_TYPES = {'catch': 1, 'miss': 2}
+TAP_NAMES = {code: name for name, code in TAP_TYPES.items()}
+
+STATE = struct.Struct('<2sBBIBIIqB')
+BATCH_HEADER = struct.Struct('<2sBH')
+BATCH_EVENT = struct.Struct('<BQQ')
+BATCH_RESULT = struct.Struct('<2sBIIII')
+
+_STATE_MAGIC = b'PS'
+_BATCH_MAGIC = b'PB'
+_RESULT_MAGIC = b'PR'
+_FLAG_ACTIVE = 0x01
+_U32_MAX = 0xFFFFFFFF
+
+
+def accepts(header, token):
+    """
+    ¿Acepta la cabecera Accept/Accept-Encoding el valor `token` (con q > 0)?
+    Solo cuenta si aparece explícitamente: */* no pide el formato binario.
+    """
+    if not header:
+        return False
+    for part in header.split(','):
+        value, _, params = part.partition(';')
+        if value.strip().lower() != token:
+            continue
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def compress(body):
+    """gzip determinista (sin fecha en la cabecera) para poder cachear el resultado"""
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+# =================== ESTADO DEL JUEGO ===================
+def encode_game_state(game_data, version):
+    """Empaquetar el estado de un comedero"""
+    stats = game_data.get('session_stats') or {}
+    difficulty = game_data.get('difficulty')
+    difficulty = DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES else UNKNOWN_DIFFICULTY
+    start_time = stats.get('start_time')
+    try:
+        start_ms = int(datetime.fromisoformat(start_time).timestamp() * 1000) if start_time else -1
+    except (TypeError, ValueError):
+        start_ms = -1
+    player = (game_data.get('current_player') or '').encode('utf-8')[:255]
+    return STATE.pack(_STATE_MAGIC, FORMAT_VERSION,
+                      _FLAG_ACTIVE if game_data.get('game_active') else 0,
+                      version & _U32_MAX, difficulty,
+                      min(stats.get('catches', 0), _U32_MAX), min(stats.get('misses', 0), _U32_MAX),
+                      start_ms, len(player)) + player
+
+
+def decode_game_state(data):
+    """Desempaquetar el estado; devuelve (versión, game_data). ValueError si no es válido"""
+    if len(data) < STATE.size:
+        raise ValueError("Estado binario incompleto")
+    magic, fmt, flags, version, difficulty, catches, misses, start_ms, length = STATE.unpack_from(data)
+    if magic != _STATE_MAGIC or fmt != FORMAT_VERSION or len(data) < STATE.size + length:
+        raise ValueError("Estado binario no válido")
+    player = data[STATE.size:STATE.size + length].decode('utf-8', 'ignore')
+    return version, {
+        "difficulty": DIFFICULTIES[difficulty] if difficulty < len(DIFFICULTIES) else None,
+        "game_active": bool(flags & _FLAG_ACTIVE),
+        "current_player": player or None,
+        "session_stats": {
+            "catches": catches,
+            "misses": misses,
+            "start_time": datetime.fromtimestamp(start_ms / 1000).isoformat() if start_ms >= 0 else None,
+        },
+    }
+
+
+# =================== LOTES DE TOQUES ===================
+def encode_batch(events):
+    """Empaquetar [{"type", "ts", "id"}]; los ids deben ser enteros (o faltar)"""
+    parts = [BATCH_HEADER.pack(_BATCH_MAGIC, FORMAT_VERSION, len(events))]
+    for event in events:
+        parts.append(BATCH_EVENT.pack(TAP_TYPES[event['type']], int(event.get('ts') or 0),
+                                      int(event.get('id') or 0)))
+    return b''.join(parts)
+
+
+def decode_batch(data):
+    """
+    Desempaquetar un lote a la misma forma que el JSON de /register-batch.
+    Los tipos desconocidos se conservan como None para contarlos como ignorados.
+    """
+    if len(data) < BATCH_HEADER.size:
+        raise ValueError("Lote binario incompleto")
+    magic, fmt, count = BATCH_HEADER.unpack_from(data)
+    if magic != _BATCH_MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Lote binario no válido")
+    if len(data) != BATCH_HEADER.size + count * BATCH_EVENT.size:
+        raise ValueError(f"Lote binario de {len(data)} bytes para {count} toques")
+    return [{"type": TAP_NAMES.get(kind), "ts": ts or None, "id": event_id or None}
+            for kind, ts, event_id in BATCH_EVENT.iter_unpack(data[BATCH_HEADER.size:])]
+
+
+def encode_batch_result(applied, duplicates, ignored, version):
+    return BATCH_RESULT.pack(_RESULT_MAGIC, FORMAT_VERSION, applied, duplicates, ignored,
+                             version & _U32_MAX)
+
+
+def decode_batch_result(data):
+    """(aplicados, duplicados, ignorados, versión)"""
+    magic, fmt, applied, duplicates, ignored, version = BATCH_RESULT.unpack(data)
+    if magic != _RESULT_MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Resultado binario no válido")
+    return applied, duplicates, ignored, version